@@ -1,7 +1,11 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
+import re
+import json
+import gzip
+import hashlib
 from dotenv import load_dotenv
 
 # 加载.env文件中的环境变量
@@ -15,12 +19,28 @@ except ImportError:
     HAS_PANDAS = False
     pd = None
     print("[警告] pandas未安装，高级数据处理功能将不可用")
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
 import datetime as dt
-from models.database import db, TableData, TableSchema, UploadHistory
+from models.database import db, TableData, TableSchema, TableGroup, UploadHistory, RowCodec, GroupFileStats, upgrade_schema, enable_incremental_vacuum
 from models.excel_processor import UniversalExcelProcessor
 from models.deepseek_api import DeepSeekAPIClient
 from models.api_manager import APIManager
 from models.config_storage import get_config_storage
+from models.maintenance import MaintenanceWorker
+from models.cold_storage import ColdStorage
+from models.snapshots import GroupSnapshots
+from models.group_query import GroupDataQuery
+from models.arrow_export import ArrowExport, HAS_PYARROW
+from models.response_cache import ResponseCache
+from models.search_cache import SearchResultCache
+from models.workspace_index import WorkspaceIndex
+from models.search_index import SearchIndex
+from models.global_search import GlobalSearch
+from models.fuzzy_search import FuzzySearch
 from config import config
 
 app = Flask(__name__)
@@ -32,11 +52,247 @@ app.config.from_object(config[config_name])
 CORS(app)
 db.init_app(app)
 
+maintenance_worker = MaintenanceWorker(
+    app,
+    interval=app.config.get('MAINTENANCE_INTERVAL', 60),
+    lease_seconds=app.config.get('MAINTENANCE_LEASE_SECONDS', 3600)
+)
+maintenance_worker.register('compact_deleted_columns', UniversalExcelProcessor.compact_deleted_columns)
+maintenance_worker.register('purge_deleted_data', UniversalExcelProcessor.purge_deleted_data)
+maintenance_worker.register('expire_snapshots', lambda: GroupSnapshots.expire(app.config.get('SNAPSHOT_RETENTION_DAYS', 7)))
+maintenance_worker.register('archive_idle_groups', lambda: ColdStorage.archive_idle_groups(app.config.get('ARCHIVE_IDLE_DAYS', 30)))
+maintenance_worker.register('build_search_index', SearchIndex.build_pending)
+
+response_cache = ResponseCache(max_bytes=app.config.get('RESPONSE_CACHE_BYTES', 64 * 1024 * 1024))
+search_cache = SearchResultCache(
+    max_entries=app.config.get('SEARCH_CACHE_ENTRIES', 64),
+    max_records=app.config.get('SEARCH_CACHE_RECORDS', 200000)
+)
+
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def get_page_args():
+    """解析分页参数 limit 和 cursor，未传 limit 时返回全部数据"""
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor') or None
+    if limit is not None:
+        limit = max(1, min(limit, app.config.get('MAX_PAGE_SIZE', 5000)))
+    return limit, cursor
+
+def group_cursor(group_id, cursor):
+    """带分组ID的分页游标 "分组ID:行游标"，用于读取的分组在翻页之间可能改变的接口（分组为空时记为 0）"""
+    return f"{group_id or 0}:{cursor}" if cursor else None
+
+def row_cursor(group_id, cursor):
+    """校验带分组ID的分页游标属于 group_id，返回其中的行游标
+
+    Raises:
+        ValueError: 游标属于其他分组
+    """
+    if not cursor:
+        return None
+    cursor_group, _, cursor = str(cursor).partition(':')
+    if cursor_group != str(group_id or 0):
+        raise ValueError('数据已变化，分页游标不属于当前表格，请从第一页重新加载')
+    return cursor
+
+def page_info(total, next_cursor):
+    """分页响应字段"""
+    return {
+        'total': total,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    }
+
+def wants_columnar():
+    """请求是否要求列式响应（format=columnar）"""
+    return request.args.get('format') == 'columnar'
+
+def rows_payload(rows):
+    """行数据响应字段：默认为行对象数组 {'data': [...]}，format=columnar 时为列式结构
+    
+    列式结构只写一次列名，每列一个取值数组；不同取值不超过行数一半的列编码为
+    {'values': 不同取值列表, 'codes': 每行取值在列表中的下标，空值为 null}。
+    """
+    if not wants_columnar():
+        return {'data': rows}
+    
+    names = list(dict.fromkeys(name for row in rows for name in row))
+    columns = {}
+    for name in names:
+        values = [row.get(name) for row in rows]
+        codes = {}
+        for value in values:
+            if value is not None and value not in codes:
+                codes[value] = len(codes)
+                if len(codes) * 2 > len(values):
+                    break
+        if len(codes) * 2 <= len(values):
+            columns[name] = {
+                'values': list(codes),
+                'codes': [None if value is None else codes[value] for value in values]
+            }
+        else:
+            columns[name] = values
+    return {'format': 'columnar', 'row_count': len(rows), 'columns': columns}
+
+STREAM_BATCH_SIZE = 1000
+
+def get_query_args():
+    """解析分组数据的列投影、过滤和排序参数，返回 (列名列表, 过滤条件列表, 排序列表)
+    
+    columns=列1,列2
+    filters=[{"column": "部门", "op": "eq", "value": "研发部"}, {"column": "金额", "op": "range", "min": 1000}]
+    sort=金额:desc,部门
+    """
+    columns = [column.strip() for column in request.args.get('columns', '').split(',') if column.strip()]
+    
+    filters = []
+    if request.args.get('filters'):
+        try:
+            filters = json.loads(request.args['filters'])
+        except ValueError:
+            raise ValueError('过滤条件格式错误')
+        if not isinstance(filters, list) or not all(isinstance(condition, dict) for condition in filters):
+            raise ValueError('过滤条件格式错误')
+    
+    sort = []
+    for item in request.args.get('sort', '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        column, _, direction = item.rpartition(':')
+        if direction.lower() not in ('asc', 'desc'):
+            column, direction = item, 'asc'
+        sort.append((column, direction.lower()))
+    
+    return columns, filters, sort
+
+def response_etag(version_tag):
+    """响应的强 ETag：数据版本标识加上请求路径和影响响应内容的请求参数
+    
+    同一分组的不同端点（如 /data 与 /rows）版本标识相同，路径须计入，否则会共用服务端缓存条目。
+    """
+    params = sorted(request.args.items(multi=True))
+    digest = hashlib.sha1(
+        json.dumps([request.path, params, wants_stream()], ensure_ascii=False).encode('utf-8')
+    ).hexdigest()[:16]
+    return f"{version_tag}-{digest}"
+
+def conditional_response(etag):
+    """客户端缓存仍有效时返回 304，服务端缓存命中时返回缓存的响应，否则返回 None
+    
+    压缩后的响应 ETag 带有编码后缀（见 compress_response），客户端持有任一编码的版本均视为有效。
+    """
+    matched = next((etag + suffix for suffix in ('', '-gzip', '-br')
+                    if request.if_none_match.contains(etag + suffix)), None)
+    if matched is not None:
+        response = Response(status=304)
+        response.set_etag(matched)
+    else:
+        cached = response_cache.get(etag)
+        if cached is None:
+            return None
+        body, mimetype = cached
+        response = Response(body, mimetype=mimetype)
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def cacheable_response(response, etag):
+    """为新生成的响应设置 ETag，非流式的成功响应写入服务端缓存"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    if not response.is_streamed and response.status_code == 200:
+        response_cache.put(etag, response.get_data(), response.mimetype)
+    return response
+
+COMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', ArrowExport.MIME_TYPE}
+
+@app.after_request
+def compress_response(response):
+    """按 Accept-Encoding 压缩 JSON 响应，已安装 brotli 时优先使用 br，否则使用 gzip
+    
+    压缩后的 ETag 加上编码后缀，不同编码的响应内容不同，强 ETag 不能相同。流式响应不压缩。
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers):
+        return response
+    
+    accepted = request.accept_encodings
+    if HAS_BROTLI and accepted['br']:
+        encoding = 'br'
+    elif accepted['gzip']:
+        encoding = 'gzip'
+    else:
+        return response
+    
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        body = brotli.compress(body, quality=5)
+    else:
+        body = gzip.compress(body, compresslevel=6)
+    
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+def wants_stream():
+    """请求是否要求流式返回（format=ndjson 或 Accept: application/x-ndjson）"""
+    return (request.args.get('format') == 'ndjson'
+            or 'application/x-ndjson' in request.headers.get('Accept', ''))
+
+def iter_records(query, codec_for, limit=None):
+    """通过服务端游标（yield_per）分批读取记录并逐条转为字典，codec_for(record) 返回解码用的 RowCodec"""
+    if limit:
+        query = query.limit(limit)
+    for record in query.yield_per(STREAM_BATCH_SIZE):
+        yield record.to_dict(codec_for(record))
+
+def stream_records(header, rows):
+    """以 NDJSON 流式返回记录：首行为元信息，之后每行一条记录
+    
+    rows 为逐条产生行数据的迭代器，内存占用与数据量无关，元信息行立即发送。
+    """
+    def generate():
+        yield json.dumps(header, ensure_ascii=False) + '\n'
+        lines = []
+        count = 0
+        try:
+            for row in rows:
+                lines.append(json.dumps(row, ensure_ascii=False))
+                count += 1
+                if len(lines) >= STREAM_BATCH_SIZE:
+                    yield '\n'.join(lines) + '\n'
+                    lines = []
+            if lines:
+                yield '\n'.join(lines) + '\n'
+            print(f"[系统] 流式返回 {count} 条记录")
+        except Exception as e:
+            print(f"[错误] 流式返回数据时出错: {str(e)}")
+            yield json.dumps({'success': False, 'message': str(e)}, ensure_ascii=False) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def group_codecs():
+    """按分组缓存 RowCodec，用于解码来自多个分组的记录"""
+    codecs = {}
+    def codec_for(record):
+        if record.table_group_id not in codecs:
+            codecs[record.table_group_id] = RowCodec.for_group(record.table_group_id)
+        return codecs[record.table_group_id]
+    return codec_for
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -65,6 +321,8 @@ def clear_cache():
     """清理系统缓存"""
     try:
         UniversalExcelProcessor.clear_cache()
+        response_cache.clear()
+        search_cache.clear()
         return jsonify({
             'success': True,
             'message': '缓存已清理'
@@ -152,31 +410,44 @@ def get_data():
         all_data = []
         all_schema = set()
         
-        groups = TableGroup.query.order_by(TableGroup.updated_at.desc()).all()
+        limit, cursor = get_page_args()
+        
+        # 计算统计信息
+        stats = UniversalExcelProcessor.get_data_stats()
+        
+        groups = TableGroup.live().order_by(TableGroup.updated_at.desc()).all()
         if groups:
             # 如果有分组，获取最新更新的分组数据
             latest_group = groups[0]  # 最近更新的分组
-            data_records = TableData.query.filter_by(table_group_id=latest_group.id).order_by(TableData.created_at.asc()).all()
-            all_data = [record.to_dict() for record in data_records]
+            # 翻页之间最近更新的分组可能改变，游标带上分组ID，不属于该分组时拒绝
+            data_records, next_cursor = TableData.keyset_page(
+                TableData.live_in_group(latest_group.id), limit, row_cursor(latest_group.id, cursor)
+            )
+            next_cursor = group_cursor(latest_group.id, next_cursor)
+            codec = RowCodec.for_group(latest_group.id)
+            all_data = [record.to_dict(codec) for record in data_records]
+            total = latest_group.record_count or 0
             
             # 获取分组的表结构
             schemas = TableSchema.query.filter_by(table_group_id=latest_group.id, is_active=True).order_by(TableSchema.column_order).all()
             schema = [s.column_name for s in schemas]
         else:
             # 兼容旧数据：如果没有分组，使用原来的方式
-            data = UniversalExcelProcessor.get_all_data()
+            ColdStorage.restore_all()
+            data_records, next_cursor = TableData.keyset_page(TableData.live(), limit, row_cursor(None, cursor))
+            next_cursor = group_cursor(None, next_cursor)
+            codecs = RowCodec.for_records(data_records)
+            all_data = [record.to_dict(codecs[record.table_group_id]) for record in data_records]
             schema = UniversalExcelProcessor.get_current_schema()
-            all_data = data
-        
-        # 计算统计信息
-        stats = UniversalExcelProcessor.get_data_stats()
+            total = stats['total_records']
         
-        print(f"[系统] 返回 {len(all_data)} 条记录，{len(schema)} 个列")
+        print(f"[系统] 返回 {len(all_data)}/{total} 条记录，{len(schema)} 个列")
         return jsonify({
             'success': True,
-            'data': all_data,
+            **rows_payload(all_data),
             'stats': stats,
-            'schema': schema
+            'schema': schema,
+            **page_info(total, next_cursor)
         })
     except Exception as e:
         print(f"[错误] 获取数据时出错: {str(e)}")
@@ -467,7 +738,7 @@ def export_all_groups():
         from models.database import TableGroup
         
         # 获取所有表格分组
-        groups = TableGroup.query.order_by(TableGroup.created_at.asc()).all()
+        groups = TableGroup.live().order_by(TableGroup.created_at.asc()).all()
         
         if not groups:
             return jsonify({'success': False, 'message': '没有表格分组可导出'})
@@ -489,7 +760,7 @@ def export_all_groups():
         
         for group in groups:
             # 获取该分组的数据
-            data_records = TableData.query.filter_by(table_group_id=group.id).order_by(TableData.created_at.asc()).all()
+            data_records = TableData.live_in_group(group.id, touch=False).order_by(*TableData.ordering()).all()
             
             if not data_records:
                 continue
@@ -505,13 +776,15 @@ def export_all_groups():
                 continue
             
             # 准备数据
+            codec = RowCodec.for_group(group.id)
             rows = []
             for record in data_records:
                 row = {}
                 has_data = False
+                record_data = record.get_data(codec)
                 
                 for col in business_columns:
-                    value = getattr(record, col, '') if hasattr(record, col) else record.to_dict().get(col, '')
+                    value = record_data.get(col, '')
                     
                     # 清理数据
                     if value is not None:
@@ -608,7 +881,7 @@ def get_uploaded_files():
             file_data = file_record.to_dict()
             
             # 统计该文件的数据记录数
-            data_count = TableData.query.filter_by(source_file=file_record.filename).count()
+            data_count = GroupFileStats.count_for_file(file_record.filename)
             file_data['current_records'] = data_count
             
             # 检查文件是否还有关联的数据（可能被部分删除了）
@@ -632,14 +905,40 @@ def get_file_data(filename):
     try:
         print(f"[系统] 获取文件 {filename} 的数据")
         
-        # 获取该文件的所有数据记录
-        data_records = TableData.query.filter_by(source_file=filename).order_by(TableData.created_at.asc()).all()
+        limit, cursor = get_page_args()
         
-        if not data_records:
+        # 获取该文件的数据记录
+        ColdStorage.ensure_file_online(filename)
+        records_query = TableData.live().filter_by(source_file=filename)
+        
+        if wants_stream():
+            codec_for = group_codecs()
+            first_record = TableData.keyset_query(records_query, cursor).first()
+            if first_record is None and not cursor:
+                return jsonify({'success': False, 'message': '文件数据不存在或已被删除'})
+            schema = list(first_record.get_data(codec_for(first_record)).keys()) if first_record else []
+            total = GroupFileStats.count_for_file(filename)
+            return stream_records({
+                'success': True,
+                'schema': schema,
+                'stats': {
+                    'total_records': total,
+                    'source_file': filename,
+                    'total_columns': len(schema),
+                    'upload_time': first_record.created_at.strftime('%Y-%m-%d %H:%M:%S') if first_record else None
+                },
+                'total': total
+            }, iter_records(TableData.keyset_query(records_query, cursor), codec_for, limit))
+        
+        data_records, next_cursor = TableData.keyset_page(records_query, limit, cursor)
+        
+        if not data_records and not cursor:
             return jsonify({'success': False, 'message': '文件数据不存在或已被删除'})
+        total = GroupFileStats.count_for_file(filename)
         
         # 获取数据
-        data = [record.to_dict() for record in data_records]
+        codecs = RowCodec.for_records(data_records)
+        data = [record.to_dict(codecs[record.table_group_id]) for record in data_records]
         
         # 从第一条记录获取schema（所有记录应该有相同的结构）
         if data:
@@ -652,18 +951,19 @@ def get_file_data(filename):
         
         # 统计信息
         stats = {
-            'total_records': len(data),
+            'total_records': total,
             'source_file': filename,
             'total_columns': len(schema),
             'upload_time': data_records[0].created_at.strftime('%Y-%m-%d %H:%M:%S') if data_records else None
         }
         
-        print(f"[系统] 返回文件 {filename} 的 {len(data)} 条记录")
+        print(f"[系统] 返回文件 {filename} 的 {len(data)}/{total} 条记录")
         return jsonify({
             'success': True,
-            'data': data,
+            **rows_payload(data),
             'schema': schema,
-            'stats': stats
+            'stats': stats,
+            **page_info(total, next_cursor)
         })
     except Exception as e:
         print(f"[错误] 获取文件数据时出错: {str(e)}")
@@ -676,13 +976,15 @@ def export_file_data(filename):
         print(f"[系统] 开始导出文件 {filename}")
         
         # 获取该文件的所有数据记录
-        data_records = TableData.query.filter_by(source_file=filename).order_by(TableData.created_at.asc()).all()
+        ColdStorage.ensure_file_online(filename)
+        data_records = TableData.live().filter_by(source_file=filename).order_by(*TableData.ordering()).all()
         
         if not data_records:
             return jsonify({'success': False, 'message': '文件数据不存在或已被删除'})
         
         # 准备数据
-        data = [record.to_dict() for record in data_records]
+        codecs = RowCodec.for_records(data_records)
+        data = [record.to_dict(codecs[record.table_group_id]) for record in data_records]
         
         if not data:
             return jsonify({'success': False, 'message': '没有数据可导出'})
@@ -772,7 +1074,7 @@ def delete_file_data(filename):
         print(f"[系统] 开始删除文件 {filename} 的数据库记录（物理文件保留）")
         
         # 删除该文件的所有数据记录
-        deleted_count = TableData.query.filter_by(source_file=filename).delete()
+        deleted_count = UniversalExcelProcessor.delete_source_file_records(filename)
         
         # 删除上传历史记录
         UploadHistory.query.filter_by(filename=filename).delete()
@@ -798,13 +1100,14 @@ def add_column():
         data = request.get_json()
         column_name = data.get('column_name', '').strip()
         insert_position = data.get('insert_position')  # 新增位置参数
+        table_group_id = data.get('table_group_id')
         
         if not column_name:
             return jsonify({'success': False, 'message': '列名不能为空'})
         
         print(f"[系统] 添加新列: {column_name}, 位置: {insert_position}")
         
-        success, message = UniversalExcelProcessor.add_column(column_name, insert_position)
+        success, message = UniversalExcelProcessor.add_column(column_name, insert_position, table_group_id)
         
         return jsonify({'success': success, 'message': message})
         
@@ -817,13 +1120,14 @@ def delete_column():
     try:
         data = request.get_json()
         column_name = data.get('column_name', '').strip()
+        table_group_id = data.get('table_group_id')
         
         if not column_name:
             return jsonify({'success': False, 'message': '列名不能为空'})
         
         print(f"[系统] 删除列: {column_name}")
         
-        success, message = UniversalExcelProcessor.delete_column(column_name)
+        success, message = UniversalExcelProcessor.delete_column(column_name, table_group_id)
         
         return jsonify({'success': success, 'message': message})
         
@@ -837,6 +1141,7 @@ def rename_column():
         data = request.get_json()
         old_name = data.get('old_name', '').strip()
         new_name = data.get('new_name', '').strip()
+        table_group_id = data.get('table_group_id')
         
         if not old_name or not new_name:
             return jsonify({'success': False, 'message': '列名不能为空'})
@@ -846,7 +1151,7 @@ def rename_column():
         
         print(f"[系统] 重命名列: {old_name} -> {new_name}")
         
-        success, message = UniversalExcelProcessor.rename_column(old_name, new_name)
+        success, message = UniversalExcelProcessor.rename_column(old_name, new_name, table_group_id)
         
         return jsonify({'success': success, 'message': message})
         
@@ -860,11 +1165,12 @@ def add_row():
         data = request.get_json()
         insert_after_id = data.get('insert_after_id') if data else None
         insert_position = data.get('insert_position', -1) if data else -1
+        table_group_id = data.get('table_group_id') if data else None
         
         print(f"[系统] 添加新行，插入在ID {insert_after_id} 之后，位置: {insert_position}")
         
         # 使用更新后的add_row方法
-        success, message, row_id = UniversalExcelProcessor.add_row(insert_after_id)
+        success, message, row_id = UniversalExcelProcessor.add_row(insert_after_id, table_group_id=table_group_id)
         
         if success:
             return jsonify({'success': True, 'message': message, 'id': row_id})
@@ -882,39 +1188,52 @@ def get_table_groups():
     """获取所有表格分组"""
     try:
         from models.database import TableGroup, TableSchema
-        groups = TableGroup.query.order_by(TableGroup.updated_at.desc()).all()
+        
+        # 分组列表的版本：所有未删除分组的ID、创建时间、数据版本和更新时间
+        versions = db.session.query(
+            TableGroup.id, TableGroup.created_at, TableGroup.version, TableGroup.updated_at
+        ).filter(TableGroup.deleted_at.is_(None)).order_by(TableGroup.id).all()
+        list_tag = hashlib.sha1(repr([tuple(row) for row in versions]).encode('utf-8')).hexdigest()[:16]
+        etag = response_etag(f"groups.{list_tag}")
+        cached = conditional_response(etag)
+        if cached is not None:
+            return cached
+        
+        from models.database import ColumnMapping
+        groups = TableGroup.live().order_by(TableGroup.updated_at.desc()).all()
+        live_group_ids = db.session.query(TableGroup.id).filter(TableGroup.deleted_at.is_(None))
+        
+        # 列映射数：按分组聚合计数，一次查询
+        mapping_counts = dict(db.session.query(
+            ColumnMapping.table_group_id, db.func.count(ColumnMapping.id)
+        ).filter(
+            ColumnMapping.table_group_id.in_(live_group_ids)
+        ).group_by(ColumnMapping.table_group_id).all())
+        
+        # 字段信息用于搜索：所有分组的列名一次读出，按分组去重
+        system_fields = {'id', 'source_file', 'created_at', 'updated_at', 'table_group_id'}
+        group_fields = {}
+        for group_id, column_name in db.session.query(TableSchema.table_group_id, TableSchema.column_name).filter(
+            TableSchema.table_group_id.in_(live_group_ids)
+        ).all():
+            field = (column_name or '').strip()
+            if field and field not in system_fields:
+                group_fields.setdefault(group_id, set()).add(field)
         
         groups_data = []
         for group in groups:
             group_dict = group.to_dict()
-            
-            # 获取列映射信息
-            from models.database import ColumnMapping
-            mappings = ColumnMapping.query.filter_by(table_group_id=group.id).all()
-            group_dict['has_mappings'] = len(mappings) > 0
-            group_dict['mapping_count'] = len(mappings)
-            
-            # 获取字段信息用于搜索
-            schema_records = TableSchema.query.filter_by(table_group_id=group.id).all()
-            if schema_records:
-                # 获取所有字段名，去重
-                all_fields = set()
-                for schema_record in schema_records:
-                    if schema_record.column_name:
-                        field = schema_record.column_name.strip()
-                        if field and field not in ['id', 'source_file', 'created_at', 'updated_at', 'table_group_id']:
-                            all_fields.add(field)
-                group_dict['fields'] = list(all_fields)
-            else:
-                group_dict['fields'] = []
-            
+            mapping_count = mapping_counts.get(group.id, 0)
+            group_dict['has_mappings'] = mapping_count > 0
+            group_dict['mapping_count'] = mapping_count
+            group_dict['fields'] = list(group_fields.get(group.id, ()))
             groups_data.append(group_dict)
         
-        return jsonify({
+        return cacheable_response(jsonify({
             'success': True,
             'groups': groups_data,
             'total_groups': len(groups_data)
-        })
+        }), etag)
         
     except Exception as e:
         print(f"[错误] 获取表格分组时出错: {str(e)}")
@@ -926,10 +1245,18 @@ def get_group_data(group_id):
     try:
         from models.database import TableGroup, TableData, TableSchema
         
-        # 验证分组是否存在
-        group = TableGroup.query.get(group_id)
-        if not group:
+        # 已归档的分组先恢复（恢复会递增数据版本），再取版本标识并验证分组是否存在；
+        # 数据未变化时只需这两次主键查询
+        ColdStorage.ensure_online(group_id)
+        version_tag = TableGroup.version_tag(group_id)
+        if version_tag is None:
             return jsonify({'success': False, 'message': '分组不存在'})
+        etag = response_etag(version_tag)
+        cached = conditional_response(etag)
+        if cached is not None:
+            return cached
+        
+        group = TableGroup.get_live(group_id)
         
         # 获取分组的表结构
         schemas = TableSchema.query.filter_by(
@@ -938,33 +1265,126 @@ def get_group_data(group_id):
         ).order_by(TableSchema.column_order).all()
         schema_columns = [s.column_name for s in schemas]
         
-        # 获取分组的数据
-        data_records = TableData.query.filter_by(
-            table_group_id=group_id
-        ).order_by(TableData.created_at.asc()).all()
-        
-        data = [record.to_dict() for record in data_records]
-        
         # 统计信息
         stats = {
-            'total_records': len(data),
-            'source_files': len(set(record.source_file for record in data_records if record.source_file)),
+            'total_records': group.record_count or 0,
+            'source_files': group.source_file_count or 0,
             'total_columns': len(schema_columns),
             'last_update': group.updated_at.strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        return jsonify({
+        # 获取分组的数据
+        limit, cursor = get_page_args()
+        columns, filters, sort = get_query_args()
+        
+        if columns or filters or sort:
+            # 列投影、过滤和排序在数据库中完成；有过滤条件时总数为过滤后的行数，只在第一页计算
+            query = GroupDataQuery(group_id, columns, filters, sort)
+            total = group.record_count or 0
+            if filters:
+                total = query.count() if not cursor else None
+            header = {
+                'success': True,
+                'schema': query.columns,
+                'stats': stats,
+                'group_info': group.to_dict()
+            }
+            if wants_stream():
+                return cacheable_response(stream_records(
+                    {**header, 'total': total}, query.iter_rows(cursor, limit, STREAM_BATCH_SIZE)
+                ), etag)
+            data, next_cursor = query.page(limit, cursor)
+            return cacheable_response(jsonify({**header, **rows_payload(data), **page_info(total, next_cursor)}), etag)
+        
+        codec = RowCodec.for_group(group_id)
+        
+        if wants_stream():
+            return cacheable_response(stream_records({
+                'success': True,
+                'schema': schema_columns,
+                'stats': stats,
+                'group_info': group.to_dict(),
+                'total': group.record_count or 0
+            }, iter_records(TableData.keyset_query(TableData.live_in_group(group_id), cursor), lambda record: codec, limit)), etag)
+        
+        data_records, next_cursor = TableData.keyset_page(TableData.live_in_group(group_id), limit, cursor)
+        data = [record.to_dict(codec) for record in data_records]
+        
+        return cacheable_response(jsonify({
             'success': True,
-            'data': data,
+            **rows_payload(data),
             'schema': schema_columns,
             'stats': stats,
-            'group_info': group.to_dict()
-        })
+            'group_info': group.to_dict(),
+            **page_info(group.record_count or 0, next_cursor)
+        }), etag)
         
     except Exception as e:
         print(f"[错误] 获取分组数据时出错: {str(e)}")
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/table-groups/<int:group_id>/rows')
+def get_group_rows(group_id):
+    """按行号范围获取分组数据 - 虚拟滚动表格只读取可视区域附近的行
+    
+    offset 为起始行号，limit 为行数；列投影、过滤和排序参数与 /table-groups/<id>/data 相同，
+    行号按同样的排序与过滤条件计算。
+    """
+    try:
+        # 已归档的分组先恢复，恢复会递增数据版本
+        ColdStorage.ensure_online(group_id)
+        version_tag = TableGroup.version_tag(group_id)
+        if version_tag is None:
+            return jsonify({'success': False, 'message': '分组不存在'})
+        etag = response_etag(version_tag)
+        cached = conditional_response(etag)
+        if cached is not None:
+            return cached
+        
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit, _ = get_page_args()
+        columns, filters, sort = get_query_args()
+        
+        query = GroupDataQuery(group_id, columns, filters, sort)
+        data = query.range_rows(offset, limit or app.config.get('MAX_PAGE_SIZE', 5000))
+        return cacheable_response(jsonify({
+            'success': True,
+            'offset': offset,
+            **rows_payload(data)
+        }), etag)
+        
+    except Exception as e:
+        print(f"[错误] 获取分组数据范围时出错: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)})
+
+@app.route('/table-groups/<int:group_id>/arrow')
+def get_group_arrow(group_id):
+    """以 Arrow IPC 流返回分组数据（带类型的列），供 pandas / pyarrow 等分析客户端直接加载
+    
+    列投影、过滤和排序参数与 /table-groups/<id>/data 相同。需要安装 pyarrow。
+    """
+    if not HAS_PYARROW:
+        return jsonify({'success': False, 'message': 'Arrow 导出需要安装 pyarrow'})
+    try:
+        # 已归档的分组先恢复，恢复会递增数据版本
+        ColdStorage.ensure_online(group_id)
+        version_tag = TableGroup.version_tag(group_id)
+        if version_tag is None:
+            return jsonify({'success': False, 'message': '分组不存在'})
+        etag = response_etag(version_tag)
+        cached = conditional_response(etag)
+        if cached is not None:
+            return cached
+        
+        columns, filters, sort = get_query_args()
+        query = GroupDataQuery(group_id, columns, filters, sort)
+        body = ArrowExport.write_stream(query, {'table_group_id': group_id, 'version': version_tag})
+        return cacheable_response(Response(body, mimetype=ArrowExport.MIME_TYPE), etag)
+        
+    except Exception as e:
+        print(f"[错误] 导出分组 Arrow 数据时出错: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)})
+
 @app.route('/table-groups/<int:group_id>/mappings')
 def get_group_mappings(group_id):
     """获取指定分组的列映射关系"""
@@ -1028,12 +1448,12 @@ def rename_table_group():
             return jsonify({'success': False, 'message': '参数不完整'})
         
         # 查找表格分组
-        table_group = TableGroup.query.get(group_id)
+        table_group = TableGroup.get_live(group_id)
         if not table_group:
             return jsonify({'success': False, 'message': '表格分组不存在'})
         
         # 检查名称是否已存在（同一分组名称应该是唯一的）
-        existing_group = TableGroup.query.filter(
+        existing_group = TableGroup.live().filter(
             TableGroup.group_name == new_name,
             TableGroup.id != group_id
         ).first()
@@ -1044,6 +1464,7 @@ def rename_table_group():
         # 更新表格名称
         old_name = table_group.group_name
         table_group.group_name = new_name
+        table_group.version = (table_group.version or 0) + 1
         
         db.session.commit()
         
@@ -1061,30 +1482,22 @@ def rename_table_group():
 def delete_table_group(group_id):
     """删除指定的表格分组"""
     try:
-        from models.database import TableGroup, ColumnMapping
+        from models.database import TableGroup
         
         # 查找表格分组
-        table_group = TableGroup.query.get(group_id)
+        table_group = TableGroup.get_live(group_id)
         if not table_group:
             return jsonify({'success': False, 'message': '表格不存在'})
         
-        print(f"[系统] 开始删除表格分组: {table_group.group_name}")
+        group_name = table_group.group_name
+        print(f"[系统] 开始删除表格分组: {group_name}")
         
-        # 删除关联的数据记录
-        TableData.query.filter_by(table_group_id=group_id).delete()
-        
-        # 删除关联的表格结构
-        TableSchema.query.filter_by(table_group_id=group_id).delete()
-        
-        # 删除关联的列映射
-        ColumnMapping.query.filter_by(table_group_id=group_id).delete()
-        
-        # 删除表格分组本身
-        db.session.delete(table_group)
+        # 删除关联的数据记录、表格结构、列映射以及分组本身
+        UniversalExcelProcessor.delete_table_group(group_id)
         
         db.session.commit()
         
-        print(f"[系统] 表格分组删除成功: {table_group.group_name}")
+        print(f"[系统] 表格分组删除成功: {group_name}")
         return jsonify({'success': True, 'message': '表格删除成功'})
         
     except Exception as e:
@@ -1092,6 +1505,133 @@ def delete_table_group(group_id):
         print(f"[错误] 删除表格分组时出错: {str(e)}")
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/table-groups/<int:group_id>/archive', methods=['POST'])
+def archive_table_group(group_id):
+    """将指定的表格分组归档到冷存储，再次读取时自动恢复"""
+    try:
+        table_group = TableGroup.get_live(group_id)
+        if not table_group:
+            return jsonify({'success': False, 'message': '表格不存在'})
+        
+        archived_count = ColdStorage.archive_group(group_id)
+        print(f"[系统] 表格分组 {table_group.group_name} 已归档 {archived_count} 条记录")
+        return jsonify({
+            'success': True,
+            'message': f'表格归档成功，共归档 {archived_count} 条记录',
+            'archived_records': archived_count
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"[错误] 归档表格分组时出错: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)})
+
+@app.route('/table-groups/<int:group_id>/snapshots', methods=['POST'])
+def create_group_snapshot(group_id):
+    """为指定的表格分组创建快照"""
+    try:
+        data = request.get_json(silent=True) or {}
+        snapshot = GroupSnapshots.create(group_id, (data.get('name') or '').strip() or None)
+        if not snapshot:
+            return jsonify({'success': False, 'message': '表格不存在'})
+        
+        return jsonify({
+            'success': True,
+            'message': f'快照创建成功: {snapshot.name}',
+            'snapshot': snapshot.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"[错误] 创建快照时出错: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)})
+
+@app.route('/snapshots')
+def list_snapshots():
+    """获取快照列表，可按 table_group_id 过滤（包括已删除分组的快照）"""
+    try:
+        from models.database import GroupSnapshot
+        
+        query = GroupSnapshot.query
+        group_id = request.args.get('table_group_id', type=int)
+        if group_id is not None:
+            query = query.filter_by(table_group_id=group_id)
+        snapshots = query.order_by(GroupSnapshot.created_at.desc()).all()
+        
+        deleted_group_ids = {group_id for (group_id,) in db.session.query(TableGroup.id).filter(
+            TableGroup.deleted_at.isnot(None)
+        ).all()}
+        snapshots_data = []
+        for snapshot in snapshots:
+            snapshot_data = snapshot.to_dict()
+            snapshot_data['group_deleted'] = snapshot.table_group_id in deleted_group_ids
+            snapshots_data.append(snapshot_data)
+        
+        return jsonify({'success': True, 'snapshots': snapshots_data, 'total': len(snapshots_data)})
+        
+    except Exception as e:
+        print(f"[错误] 获取快照列表时出错: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)})
+
+@app.route('/snapshots/<int:snapshot_id>/data')
+def get_snapshot_data(snapshot_id):
+    """按快照读取分组数据"""
+    try:
+        result = GroupSnapshots.read_as_of(snapshot_id)
+        if not result:
+            return jsonify({'success': False, 'message': '快照不存在'})
+        
+        snapshot, schema_columns, data = result
+        stats = {
+            'total_records': len(data),
+            'total_columns': len(schema_columns),
+            'last_update': snapshot.checkpoint_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'schema': schema_columns,
+            'stats': stats,
+            'snapshot': snapshot.to_dict()
+        })
+        
+    except Exception as e:
+        print(f"[错误] 读取快照数据时出错: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)})
+
+@app.route('/snapshots/<int:snapshot_id>/restore', methods=['POST'])
+def restore_snapshot(snapshot_id):
+    """将分组恢复到快照时的状态"""
+    try:
+        snapshot = GroupSnapshots.restore(snapshot_id)
+        if not snapshot:
+            return jsonify({'success': False, 'message': '快照或表格不存在'})
+        
+        return jsonify({
+            'success': True,
+            'message': f'已恢复到快照: {snapshot.name}',
+            'table_group_id': snapshot.table_group_id
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"[错误] 恢复快照时出错: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)})
+
+@app.route('/snapshots/<int:snapshot_id>/delete', methods=['DELETE'])
+def delete_snapshot(snapshot_id):
+    """删除快照"""
+    try:
+        if not GroupSnapshots.delete(snapshot_id):
+            return jsonify({'success': False, 'message': '快照不存在'})
+        return jsonify({'success': True, 'message': '快照删除成功'})
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"[错误] 删除快照时出错: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)})
+
 @app.route('/table-groups/<int:group_id>/export')
 def export_single_group(group_id):
     """导出指定表格分组"""
@@ -1099,14 +1639,14 @@ def export_single_group(group_id):
         from models.database import TableGroup
         
         # 验证分组是否存在
-        group = TableGroup.query.get(group_id)
+        group = TableGroup.get_live(group_id)
         if not group:
             return jsonify({'success': False, 'message': '表格不存在'})
         
         print(f"[系统] 开始导出表格分组: {group.group_name}")
         
         # 获取该分组的数据
-        data_records = TableData.query.filter_by(table_group_id=group_id).order_by(TableData.created_at.asc()).all()
+        data_records = TableData.live_in_group(group_id).order_by(*TableData.ordering()).all()
         
         if not data_records:
             return jsonify({'success': False, 'message': '表格中没有数据'})
@@ -1125,13 +1665,15 @@ def export_single_group(group_id):
             return jsonify({'success': False, 'message': '没有可导出的数据列'})
         
         # 准备数据
+        codec = RowCodec.for_group(group_id)
         rows = []
         for record in data_records:
             row = {}
             has_data = False
+            record_data = record.get_data(codec)
             
             for col in business_columns:
-                value = getattr(record, col, '') if hasattr(record, col) else record.to_dict().get(col, '')
+                value = record_data.get(col, '')
                 
                 # 清理数据
                 if value is not None:
@@ -1200,26 +1742,12 @@ def export_single_group(group_id):
 def clear_all_data():
     """清空所有数据和表格分组"""
     try:
-        from models.database import TableGroup, ColumnMapping
+        from models.database import TableGroup
         
         print("[系统] 开始清空所有数据...")
         
-        # 删除所有数据记录
-        TableData.query.delete()
-        
-        # 删除所有表格结构
-        TableSchema.query.delete()
-        
-        # 删除所有表格分组
-        TableGroup.query.delete()
-        
-        # 删除所有列映射
-        ColumnMapping.query.delete()
-        
-        # 删除所有上传历史
-        UploadHistory.query.delete()
-        
-        db.session.commit()
+        # 删除所有数据记录、表格结构、表格分组、列映射和上传历史
+        UniversalExcelProcessor.clear_all_data()
         
         print("[系统] 所有数据已清空")
         return jsonify({'success': True, 'message': '所有数据已清空'})
@@ -1244,7 +1772,7 @@ def ai_rename_table():
             return jsonify({'success': False, 'message': '表格分组ID不能为空'})
         
         # 获取表格分组
-        table_group = TableGroup.query.get(group_id)
+        table_group = TableGroup.get_live(group_id)
         if not table_group:
             return jsonify({'success': False, 'message': '表格分组不存在'})
         
@@ -1262,11 +1790,12 @@ def ai_rename_table():
         column_names = [s.column_name for s in schemas]
         
         # 获取一些样本数据帮助AI理解表格内容
-        sample_records = TableData.query.filter_by(table_group_id=group_id).limit(3).all()
+        sample_records = TableData.live_in_group(group_id).limit(3).all()
         sample_data = []
+        codec = RowCodec.for_group(group_id)
         
         for record in sample_records:
-            record_dict = record.to_dict()
+            record_dict = record.to_dict(codec)
             # 只保留业务数据，排除系统字段
             clean_dict = {k: v for k, v in record_dict.items() 
                          if k not in ['id', 'source_file', 'created_at', 'updated_at', 'table_group_id']}
@@ -1284,7 +1813,7 @@ def ai_rename_table():
             original_new_name = new_name
             counter = 1
             while True:
-                existing = TableGroup.query.filter(
+                existing = TableGroup.live().filter(
                     TableGroup.group_name == new_name,
                     TableGroup.id != group_id
                 ).first()
@@ -1302,6 +1831,7 @@ def ai_rename_table():
             # 更新表格名称
             old_name = table_group.group_name
             table_group.group_name = new_name
+            table_group.version = (table_group.version or 0) + 1
             db.session.commit()
             
             print(f"[AI命名] 表格重命名成功: {old_name} -> {new_name}")
@@ -1506,79 +2036,11 @@ def get_available_models():
 
 @app.route('/api/workspace/files')
 def get_workspace_files():
-    """获取工作台文件列表 - 扫描物理文件夹"""
+    """获取工作台文件列表 - 读取按修改时间增量刷新的文件索引"""
     try:
-        import glob
-        
-        # 定义要扫描的文件夹
-        file_folders = [
-            'test_files',
-            'test_files_v2',
-            'user_files'  # 用户上传的文件夹
-        ]
-        
-        files_data = []
-        
-        for folder in file_folders:
-            if not os.path.exists(folder):
-                continue
-                
-            # 扫描Excel文件
-            excel_files = glob.glob(os.path.join(folder, '*.xlsx')) + glob.glob(os.path.join(folder, '*.xls'))
-            
-            for file_path in excel_files:
-                try:
-                    # 重新导入os模块以防冲突
-                    import os as os_module
-                    # 获取文件信息
-                    file_name = os_module.path.basename(file_path)
-                    file_stat = os_module.stat(file_path)
-                    file_size = file_stat.st_size
-                    created_time = dt.datetime.fromtimestamp(file_stat.st_ctime)
-                    modified_time = dt.datetime.fromtimestamp(file_stat.st_mtime)
-                    
-                    # 查询数据库中该文件的记录数
-                    records_count = TableData.query.filter_by(source_file=file_name).count()
-                    
-                    # 获取该文件的列信息
-                    if records_count > 0:
-                        # 从第一条记录获取列信息
-                        first_record = TableData.query.filter_by(source_file=file_name).first()
-                        if first_record:
-                            data = first_record.get_data()
-                            # 排除系统字段
-                            system_fields = {'id', 'source_file', 'created_at', 'updated_at', 'table_group_id'}
-                            columns = [key for key in data.keys() if key not in system_fields]
-                            columns_count = len(columns)
-                        else:
-                            columns_count = 0
-                    else:
-                        columns_count = 0
-                    
-                    # 工作台文件显示逻辑：
-                    # 已导入：文件数据已存在于数据库中（在数据合并的文件管理中可见）
-                    # 已存在：文件物理存在但没有数据库记录（仅在后台存在）
-                    has_data_status = records_count > 0
-                    
-                    files_data.append({
-                        'name': file_name,
-                        'path': file_path,
-                        'folder': folder,
-                        'size': file_size,
-                        'size_formatted': format_file_size(file_size),
-                        'records': records_count,
-                        'columns': columns_count,
-                        'created_at': created_time.strftime('%Y-%m-%d %H:%M:%S'),
-                        'updated_at': modified_time.strftime('%Y-%m-%d %H:%M:%S'),
-                        'has_data': has_data_status
-                    })
-                    
-                except Exception as e:
-                    print(f"[警告] 处理文件 {file_path} 时出错: {str(e)}")
-                    continue
-        
-        # 按修改时间倒序排列
-        files_data.sort(key=lambda x: x['updated_at'], reverse=True)
+        files_data = WorkspaceIndex.list_files()
+        for file_data in files_data:
+            file_data['size_formatted'] = format_file_size(file_data['size'])
         
         return jsonify({
             'success': True,
@@ -1587,6 +2049,7 @@ def get_workspace_files():
         })
         
     except Exception as e:
+        db.session.rollback()
         print(f"[错误] 扫描文件时出错: {str(e)}")
         return jsonify({'success': False, 'message': str(e)})
 
@@ -1621,12 +2084,38 @@ def get_workspace_file_data(filename):
             return jsonify({'success': False, 'message': '文件不存在'})
         
         # 获取该文件在数据库中的数据
-        data_records = TableData.query.filter_by(source_file=filename).order_by(TableData.created_at.asc()).all()
+        limit, cursor = get_page_args()
+        ColdStorage.ensure_file_online(filename)
+        records_query = TableData.live().filter_by(source_file=filename)
+        file_info = {
+            'name': filename,
+            'path': file_path
+        }
+        
+        if wants_stream():
+            codec_for = group_codecs()
+            first_record = TableData.keyset_query(records_query, cursor).first()
+            schema_columns = list(first_record.get_data(codec_for(first_record)).keys()) if first_record else []
+            total = GroupFileStats.count_for_file(filename)
+            return stream_records({
+                'success': True,
+                'schema': schema_columns,
+                'stats': {
+                    'total_records': total,
+                    'total_columns': len(schema_columns),
+                    'file_size': format_file_size(os.path.getsize(file_path)),
+                    'last_update': dt.datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
+                },
+                'file_info': {**file_info, 'has_data': total > 0},
+                'total': total
+            }, iter_records(TableData.keyset_query(records_query, cursor), codec_for, limit))
+        
+        data_records, next_cursor = TableData.keyset_page(records_query, limit, cursor)
         
         if not data_records:
             return jsonify({
                 'success': True,
-                'data': [],
+                **rows_payload([]),
                 'schema': [],
                 'stats': {
                     'total_records': 0,
@@ -1634,24 +2123,23 @@ def get_workspace_file_data(filename):
                     'file_size': format_file_size(os.path.getsize(file_path)),
                     'last_update': dt.datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
                 },
-                'file_info': {
-                    'name': filename,
-                    'path': file_path,
-                    'has_data': False
-                }
+                'file_info': {**file_info, 'has_data': False},
+                **page_info(0, None)
             })
         
         # 转换数据
-        data = [record.to_dict() for record in data_records]
+        codecs = RowCodec.for_records(data_records)
+        data = [record.to_dict(codecs[record.table_group_id]) for record in data_records]
         
         # 获取Schema（从第一条记录）
-        first_record_data = data_records[0].get_data()
+        first_record_data = data_records[0].get_data(codecs[data_records[0].table_group_id])
         system_fields = {'id', 'source_file', 'created_at', 'updated_at', 'table_group_id'}
         schema_columns = [key for key in first_record_data.keys() if key not in system_fields]
         
         # 统计信息
+        total = GroupFileStats.count_for_file(filename)
         stats = {
-            'total_records': len(data),
+            'total_records': total,
             'total_columns': len(schema_columns),
             'file_size': format_file_size(os.path.getsize(file_path)),
             'last_update': dt.datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
@@ -1659,14 +2147,11 @@ def get_workspace_file_data(filename):
         
         return jsonify({
             'success': True,
-            'data': data,
+            **rows_payload(data),
             'schema': schema_columns,
             'stats': stats,
-            'file_info': {
-                'name': filename,
-                'path': file_path,
-                'has_data': True
-            }
+            'file_info': {**file_info, 'has_data': True},
+            **page_info(total, next_cursor)
         })
         
     except Exception as e:
@@ -1677,18 +2162,17 @@ def get_workspace_file_data(filename):
 def get_workspace_file_group(filename):
     """获取工作台文件对应的表格分组"""
     try:
-        from models.database import TableGroup, TableData
+        from models.database import TableGroup
         
-        # 查找包含此文件数据的表格分组
-        # 先通过文件名查找TableData记录
-        table_data = TableData.query.filter_by(source_file=filename).first()
+        # 查找包含此文件数据的表格分组（按来源文件统计，分组归档时无需恢复）
+        group_ids = GroupFileStats.group_ids_for_file(filename)
         
-        if table_data and table_data.table_group_id:
+        if group_ids:
             # 获取对应的表格分组
-            group = TableGroup.query.get(table_data.table_group_id)
+            group = TableGroup.get_live(group_ids[0])
             if group:
-                # 统计该分组的记录数
-                total_records = TableData.query.filter_by(table_group_id=group.id).count()
+                # 分组的记录数由写入操作同步维护
+                total_records = group.record_count or 0
                 
                 return jsonify({
                     'success': True,
@@ -1790,9 +2274,7 @@ def rename_workspace_file(filename):
         os.rename(old_file_path, new_file_path)
         
         # 更新数据库中的source_file字段
-        affected_records = TableData.query.filter_by(source_file=filename).all()
-        for record in affected_records:
-            record.source_file = new_name
+        affected_records = UniversalExcelProcessor.rename_source_file(filename, new_name)
         
         db.session.commit()
         
@@ -1802,7 +2284,7 @@ def rename_workspace_file(filename):
             'message': '文件重命名成功',
             'old_name': filename,
             'new_name': new_name,
-            'affected_records': len(affected_records)
+            'affected_records': affected_records
         })
         
     except Exception as e:
@@ -1828,7 +2310,7 @@ def delete_workspace_file(filename):
             return jsonify({'success': False, 'message': '文件不存在'})
         
         # 删除数据库中的相关记录
-        deleted_records = TableData.query.filter_by(source_file=filename).delete()
+        deleted_records = UniversalExcelProcessor.delete_source_file_records(filename)
         
         # 删除物理文件（只在工作台删除物理文件）
         # 检查文件是否在用户文件夹中，只删除用户上传的文件，保留测试文件
@@ -1869,7 +2351,7 @@ def import_workspace_file():
             return jsonify({'success': False, 'message': '文件不存在'})
         
         # 检查是否已经导入过
-        existing_records = TableData.query.filter_by(source_file=file_name).count()
+        existing_records = GroupFileStats.count_for_file(file_name)
         if existing_records > 0:
             return jsonify({'success': False, 'message': f'文件已导入，包含 {existing_records} 条记录'})
         
@@ -1903,89 +2385,67 @@ def import_workspace_file():
         print(f"[错误] 导入工作台文件时出错: {str(e)}")
         return jsonify({'success': False, 'message': str(e)})
 
-@app.route('/api/global-search', methods=['POST'])
-def global_search():
-    """全局搜索所有表格数据并返回整合结果"""
-    try:
-        data = request.get_json()
-        search_term = data.get('search_term', '').strip()
-        
-        if not search_term:
-            return jsonify({'success': False, 'message': '搜索关键词不能为空'})
-        
-        print(f"[系统] 开始全局搜索: '{search_term}'")
-        
-        from models.database import TableGroup
-        
-        # 获取所有表格分组
-        groups = TableGroup.query.order_by(TableGroup.updated_at.desc()).all()
-        
-        if not groups:
-            return jsonify({
-                'success': True,
-                'data': [],
-                'schema': [],
-                'search_term': search_term,
-                'total_matches': 0,
-                'matched_groups': 0,
-                'message': '没有可搜索的表格数据'
-            })
-        
-        # 存储搜索结果
-        all_matched_data = []
-        all_columns = set()
-        search_term_lower = search_term.lower()
-        matched_groups_count = 0
-        total_matches = 0
+def global_search_payload(search, limit=None, cursor=None, offset=0, timeout=None):
+    """全局搜索的响应内容，传入 limit 时为分页结果，否则为全部结果
+    
+    结果按规范化的查询和分页参数缓存，并记录搜索开始时各分组的版本；分组被写入后缓存失效、重新搜索。
+    全部结果按 SEARCH_WORKERS 并行搜索，超过 timeout 秒时返回已完成部分，partial 为 True（不缓存）。
+    result_handle 为本次搜索的结果句柄（查询及搜索时的分组版本），导出时凭句柄在服务端读取全部结果。
+    """
+    cache_key = (search.query.key, limit, cursor, offset)
+    versions = search.versions
+    payload = search_cache.get(cache_key, versions)
+    if payload is not None:
+        print(f"[系统] 全局搜索命中结果缓存: '{search.search_term}'")
+        return dict(payload, search_term=search.search_term,
+                    result_handle=SearchResultCache.handle(search.search_term, versions))
+    
+    if limit is not None:
+        records, columns, next_cursor = search.page(limit, cursor, offset)
+        group_counts = search.group_counts()
+        
+        # 只有一页时命中数即为本页记录数，否则按索引估算（有未索引的分组时无法估算）
+        if next_cursor is None and not cursor and not offset:
+            total = len(records)
+        elif any(item['hits'] is None for item in group_counts):
+            total = None
+        else:
+            total = sum(item['hits'] for item in group_counts)
         
-        # 系统字段列表（不参与搜索和显示）
-        system_fields = {'id', 'source_file', 'created_at', 'updated_at', 'table_group_id'}
+        # 只按本页涉及的列补全字段
+        page_schema = sorted(columns) + ['_source_table', '_source_file']
+        for record in records:
+            for col in page_schema:
+                if col not in record:
+                    record[col] = ''
         
-        for group in groups:
-            try:
-                # 获取该分组的数据
-                data_records = TableData.query.filter_by(table_group_id=group.id).order_by(TableData.created_at.asc()).all()
-                
-                if not data_records:
-                    continue
-                
-                # 获取该分组的表格结构
-                schemas = TableSchema.query.filter_by(table_group_id=group.id, is_active=True).order_by(TableSchema.column_order).all()
-                group_columns = [s.column_name for s in schemas if s.column_name not in system_fields]
-                
-                # 搜索匹配的记录
-                group_matches = []
-                for record in data_records:
-                    record_data = record.to_dict()
-                    is_match = False
-                    
-                    # 在所有业务字段中搜索
-                    for col in group_columns:
-                        value = record_data.get(col, '')
-                        if value and str(value).lower().find(search_term_lower) != -1:
-                            is_match = True
-                            break
-                    
-                    if is_match:
-                        # 添加来源信息到匹配记录
-                        matched_record = {}
-                        for col in group_columns:
-                            matched_record[col] = record_data.get(col, '')
-                        matched_record['_source_table'] = group.group_name  # 添加来源表格信息
-                        matched_record['_source_file'] = record_data.get('source_file', '')  # 添加来源文件信息
-                        
-                        group_matches.append(matched_record)
-                        all_columns.update(group_columns)
-                
-                if group_matches:
-                    all_matched_data.extend(group_matches)
-                    matched_groups_count += 1
-                    total_matches += len(group_matches)
-                    print(f"[系统] 在表格组 '{group.group_name}' 中找到 {len(group_matches)} 条匹配记录")
-                    
-            except Exception as e:
-                print(f"[警告] 搜索表格组 {group.group_name} 时出错: {str(e)}")
-                continue
+        print(f"[系统] 全局搜索分页完成: 本页 {len(records)} 条记录")
+        payload = {
+            'success': True,
+            'data': records,
+            'schema': page_schema,
+            'search_term': search.search_term,
+            'total_matches': total,
+            'matched_groups': len(group_counts),
+            'group_counts': group_counts,
+            **page_info(total, next_cursor),
+            'stats': {
+                'total_records': total,
+                'source_tables': len(group_counts),
+                'total_columns': len(page_schema) - 2,  # 排除来源信息列
+                'is_global_search': True
+            }
+        }
+    else:
+        workers = app.config.get('SEARCH_WORKERS', 4)
+        if workers > 1:
+            all_matched_data, all_columns, matched_groups_count, unfinished_groups = search.run_parallel(
+                app, workers, timeout
+            )
+        else:
+            all_matched_data, all_columns, matched_groups_count = search.run()
+            unfinished_groups = []
+        total_matches = len(all_matched_data)
         
         # 构建统一的表格结构
         # 优先显示最常见的列，并在末尾添加来源信息
@@ -1999,21 +2459,125 @@ def global_search():
                     record[col] = ''
         
         print(f"[系统] 全局搜索完成: 在 {matched_groups_count} 个表格中找到 {total_matches} 条匹配记录")
-        
-        return jsonify({
+        payload = {
             'success': True,
             'data': all_matched_data,
             'schema': final_schema,
-            'search_term': search_term,
+            'search_term': search.search_term,
             'total_matches': total_matches,
             'matched_groups': matched_groups_count,
+            'partial': bool(unfinished_groups),
+            'unfinished_groups': unfinished_groups,
             'stats': {
                 'total_records': total_matches,
                 'source_tables': matched_groups_count,
                 'total_columns': len(final_schema) - 2,  # 排除来源信息列
                 'is_global_search': True
             }
-        })
+        }
+    
+    # 搜索中恢复已归档的分组会改变其版本，句柄和缓存条目按搜索完成后的版本记录
+    versions = search.versions
+    payload['result_handle'] = SearchResultCache.handle(search.search_term, versions)
+    if not payload.get('partial'):
+        search_cache.put(cache_key, versions, payload, len(payload['data']))
+    return payload
+
+def fuzzy_search_payload(search, limit=None):
+    """模糊搜索的响应内容，按相似度排序，最多 FuzzySearch.MAX_RESULTS 条，结果缓存方式与全局搜索相同
+    
+    result_handle 与全局搜索相同，另外记录最大编辑距离，导出时按同样的条件重新执行模糊搜索。
+    """
+    cache_key = ('fuzzy', search.key, search.max_distance, limit)
+    versions = search.versions
+    payload = search_cache.get(cache_key, versions)
+    if payload is not None:
+        print(f"[系统] 模糊搜索命中结果缓存: '{search.search_term}'")
+        return dict(payload, search_term=search.search_term,
+                    result_handle=SearchResultCache.handle(search.search_term, versions, search.max_distance))
+    
+    records, columns, matched_groups_count, matched_values = search.run(limit)
+    schema = sorted(columns) + ['_source_table', '_source_file']
+    for record in records:
+        for col in schema:
+            if col not in record:
+                record[col] = ''
+    
+    print(f"[系统] 模糊搜索完成: 编辑距离不超过 {search.max_distance}，{len(matched_values)} 个相似取值，{len(records)} 条记录")
+    payload = {
+        'success': True,
+        'data': records,
+        'schema': schema,
+        'search_term': search.search_term,
+        'total_matches': len(records),
+        'matched_groups': matched_groups_count,
+        'fuzzy': {
+            'max_distance': search.max_distance,
+            'matched_values': matched_values,
+            'incomplete': search.incomplete,
+            'unindexed_groups': search.unindexed_groups
+        },
+        **page_info(len(records), None),
+        'stats': {
+            'total_records': len(records),
+            'source_tables': matched_groups_count,
+            'total_columns': len(schema) - 2,  # 排除来源信息列
+            'is_global_search': True
+        }
+    }
+    # 与全局搜索相同，句柄和缓存条目按搜索完成后的版本记录
+    versions = search.versions
+    payload['result_handle'] = SearchResultCache.handle(search.search_term, versions, search.max_distance)
+    search_cache.put(cache_key, versions, payload, len(records))
+    return payload
+
+@app.route('/api/global-search', methods=['POST'])
+def global_search():
+    """全局搜索所有表格数据并返回整合结果
+    
+    请求体传入 limit 时分页返回：从 cursor（上一页的 next_cursor）之后开始、跳过 offset 条，
+    取满一页即停止搜索；group_counts 为按索引估算的各分组命中数。未传 limit 时返回全部结果。
+    fuzzy 为 true 时模糊搜索（可传 max_distance），一次返回按相似度排序的结果（最多 limit 条）。
+    """
+    try:
+        data = request.get_json()
+        search_term = data.get('search_term', '').strip()
+        
+        if not search_term:
+            return jsonify({'success': False, 'message': '搜索关键词不能为空'})
+        
+        print(f"[系统] 开始全局搜索: '{search_term}'")
+        
+        if not TableGroup.live().first():
+            return jsonify({
+                'success': True,
+                'data': [],
+                'schema': [],
+                'search_term': search_term,
+                'total_matches': 0,
+                'matched_groups': 0,
+                'message': '没有可搜索的表格数据'
+            })
+        
+        if data.get('fuzzy'):
+            max_distance = data.get('max_distance')
+            search = FuzzySearch(search_term, int(max_distance) if max_distance is not None else None)
+            limit = data.get('limit')
+            return jsonify(fuzzy_search_payload(search, max(1, int(limit)) if limit is not None else None))
+        
+        # 已索引的分组只校验索引给出的候选行，未索引的分组逐行扫描；
+        # 查询语言（如 部门:研发 金额>10000）按分组编译为数据库条件
+        search = GlobalSearch(search_term)
+        
+        if data.get('limit') is not None:
+            limit = max(1, min(int(data['limit']), app.config.get('MAX_PAGE_SIZE', 5000)))
+            offset = max(int(data.get('offset') or 0), 0)
+            cursor = data.get('cursor') or None
+            return jsonify(global_search_payload(search, limit, cursor, offset))
+        
+        # 全部结果：超过时限时返回已完成部分，partial 为 True，unfinished_groups 为未搜索完成的分组
+        timeout = app.config.get('SEARCH_TIMEOUT_SECONDS', 30) or None
+        return jsonify(global_search_payload(search, timeout=timeout))
         
     except Exception as e:
         print(f"[错误] 全局搜索时出错: {str(e)}")
@@ -2021,103 +2585,198 @@ def global_search():
         traceback.print_exc()
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/api/global-search/cache-stats')
+def global_search_cache_stats():
+    """全局搜索结果缓存的状态和命中、未命中、淘汰、失效计数"""
+    try:
+        return jsonify({'success': True, 'stats': search_cache.stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取搜索缓存状态失败: {str(e)}'})
+
+EXPORT_WIDTH_SAMPLE = 200
+
+def save_search_results_workbook(export_path, sheet_title, columns, records):
+    """以只写模式逐行写入搜索结果工作簿，返回写入的记录数
+    
+    records 可以是迭代器，已写出的行不保留在内存中。样式与 apply_enhanced_excel_styling 一致，
+    来源信息列使用浅蓝背景；只写模式下列宽须在写入前确定，按表头和前 EXPORT_WIDTH_SAMPLE 条记录估算。
+    """
+    from itertools import chain, islice
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+    from openpyxl.utils import get_column_letter
+    
+    header_font = Font(bold=True, color="ffffff", name="Microsoft YaHei", size=13)
+    header_fill = PatternFill(start_color="4f46e5", end_color="3730a3", fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    header_border = Border(
+        left=Side(border_style="medium", color="1e293b"),
+        right=Side(border_style="medium", color="1e293b"),
+        top=Side(border_style="thick", color="1e293b"),
+        bottom=Side(border_style="thick", color="1e293b")
+    )
+    data_font = Font(color="374151", name="Microsoft YaHei", size=11)
+    data_alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
+    number_alignment = Alignment(horizontal="right", vertical="center", wrap_text=False)
+    thin_border = Border(
+        left=Side(border_style="thin", color="d1d5db"),
+        right=Side(border_style="thin", color="d1d5db"),
+        top=Side(border_style="thin", color="d1d5db"),
+        bottom=Side(border_style="thin", color="d1d5db")
+    )
+    even_fill = PatternFill(start_color="f8fafc", end_color="f8fafc", fill_type="solid")
+    odd_fill = PatternFill(start_color="ffffff", end_color="ffffff", fill_type="solid")
+    source_fill = PatternFill(start_color="e6f3ff", end_color="e6f3ff", fill_type="solid")
+    source_columns = [col.startswith('_source_') for col in columns]
+    
+    def cell_text(record, col):
+        value = record.get(col, '')
+        return str(value).strip() if value is not None else ''
+    
+    def text_width(text):
+        # 中文字符宽度系数 1.8
+        ascii_count = sum(1 for c in text if ord(c) < 128)
+        return ascii_count + (len(text) - ascii_count) * 1.8
+    
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_title)
+    
+    records = iter(records)
+    sample = list(islice(records, EXPORT_WIDTH_SAMPLE))
+    for col_idx, col in enumerate(columns, 1):
+        max_length = max([text_width(str(col))] + [text_width(cell_text(record, col)) for record in sample])
+        header_length = len(str(col)) * 1.2
+        ws.column_dimensions[get_column_letter(col_idx)].width = max(10, min(max(max_length + 4, header_length + 2), 60))
+    
+    ws.row_dimensions[1].height = 45
+    ws.sheet_format.defaultRowHeight = 28
+    ws.sheet_format.customHeight = True
+    ws.freeze_panes = "A2"
+    ws.page_setup.fitToWidth = 1
+    ws.page_setup.fitToHeight = False
+    ws.page_setup.orientation = 'landscape'
+    ws.page_margins.left = 0.5
+    ws.page_margins.right = 0.5
+    ws.page_margins.top = 0.75
+    ws.page_margins.bottom = 0.75
+    
+    header = []
+    for col, is_source in zip(columns, source_columns):
+        cell = WriteOnlyCell(ws, value=col)
+        cell.font = header_font
+        cell.fill = source_fill if is_source else header_fill
+        cell.alignment = header_alignment
+        cell.border = header_border
+        header.append(cell)
+    ws.append(header)
+    
+    count = 0
+    for record in chain(sample, records):
+        count += 1
+        row_fill = even_fill if (count + 1) % 2 == 0 else odd_fill
+        row = []
+        for col, is_source in zip(columns, source_columns):
+            value = cell_text(record, col)
+            cell = WriteOnlyCell(ws, value=value)
+            cell.font = data_font
+            if value and (value.replace('.', '').replace('-', '').replace('+', '').isdigit() or
+                          any(char in value for char in ['¥', '$', '元', '%'])):
+                cell.alignment = number_alignment
+            else:
+                cell.alignment = data_alignment
+            cell.border = thin_border
+            cell.fill = source_fill if is_source else row_fill
+            row.append(cell)
+        ws.append(row)
+    
+    wb.save(export_path)
+    return count
+
 @app.route('/api/export-global-search', methods=['POST'])
 def export_global_search_results():
-    """导出全局搜索结果"""
+    """导出全局搜索结果
+    
+    请求体传入全局搜索返回的 result_handle 时，按句柄中的查询在服务端重新读取全部结果，
+    逐行写入工作簿，不经过浏览器中转；搜索后参与搜索的分组被写入、新增或删除时提示重新搜索。
+    模糊搜索的句柄按同样的编辑距离重新执行模糊搜索，导出最多 FuzzySearch.MAX_RESULTS 条。
+    只传 search_term（或句柄无法解析）时按当前数据导出；兼容旧版直接传入 data 和 schema 的请求。
+    """
     try:
         data = request.get_json()
         search_term = data.get('search_term', '')
-        search_data = data.get('data', [])
+        result_handle = data.get('result_handle')
+        search_data = data.get('data')
         search_schema = data.get('schema', [])
         
-        if not search_data:
-            return jsonify({'success': False, 'message': '没有搜索结果可导出'})
-        
-        print(f"[系统] 开始导出全局搜索结果: '{search_term}'，共 {len(search_data)} 条记录")
-        
         # 系统字段列表（不应该出现在导出中）
         system_fields = {'id', 'source_file', 'created_at', 'updated_at', 'table_group_id'}
         
+        if search_data is None:
+            entry = SearchResultCache.parse_handle(result_handle) if result_handle else None
+            if result_handle and entry is None:
+                print(f"[警告] 无法解析全局搜索结果句柄，按查询文本导出: '{search_term}'")
+            max_distance = None
+            if entry is not None:
+                search_term, digest, max_distance = entry
+                search = GlobalSearch(search_term) if max_distance is None else FuzzySearch(search_term, max_distance)
+                if SearchResultCache.version_digest(search.versions) != digest:
+                    return jsonify({'success': False, 'message': '搜索后数据已发生变化，请重新搜索后导出'})
+            elif search_term.strip():
+                search = GlobalSearch(search_term.strip())
+            else:
+                return jsonify({'success': False, 'message': '没有搜索结果可导出'})
+            
+            if max_distance is None:
+                columns, records = search.stream()
+            else:
+                records, columns, _, _ = search.run()
+            if not columns:
+                return jsonify({'success': False, 'message': '没有搜索结果可导出'})
+            search_schema = sorted(columns) + ['_source_table', '_source_file']
+            print(f"[系统] 开始导出全局搜索结果: '{search_term}'，从数据库逐行写入")
+        else:
+            if not search_data:
+                return jsonify({'success': False, 'message': '没有搜索结果可导出'})
+            print(f"[系统] 开始导出全局搜索结果: '{search_term}'，共 {len(search_data)} 条记录")
+            
+            # 只保留有有效数据（除来源信息字段外）的记录；包含来源信息列时全部保留
+            keep_all = any(col.startswith('_source_') for col in search_schema)
+            records = [item for item in search_data if keep_all or any(
+                item.get(col) is not None and str(item.get(col)).strip()
+                for col in search_schema if col not in system_fields
+            )]
+            if not records:
+                return jsonify({'success': False, 'message': '没有有效数据可导出'})
+        
         # 过滤掉系统字段，但保留来源信息字段
         business_columns = [col for col in search_schema if col not in system_fields and col.strip()]
         
         if not business_columns:
             return jsonify({'success': False, 'message': '没有可导出的数据列'})
         
-        # 准备导出数据
-        rows = []
-        for item in search_data:
-            row = {}
-            has_data = False
-            
-            for col in business_columns:
-                value = item.get(col, '')
-                if value is not None:
-                    value = str(value).strip()
-                else:
-                    value = ''
-                row[col] = value
-                
-                # 检查是否有有效数据（除了来源信息字段）
-                if value and value != '' and not col.startswith('_source_'):
-                    has_data = True
-            
-            if has_data or any(col.startswith('_source_') for col in business_columns):
-                rows.append(row)
-        
-        if not rows:
-            return jsonify({'success': False, 'message': '没有有效数据可导出'})
-        
-        # 创建DataFrame
-        if HAS_PANDAS:
-            df = pd.DataFrame(rows, columns=business_columns)
-        else:
-            df = {"rows": rows, "columns": business_columns}
-        
         # 生成导出文件名
-        safe_search_term = search_term.replace(' ', '_').replace('/', '_').replace('\\', '_')
+        # 查询语言中的 : < > " 等字符不能出现在文件名和工作表名称中
+        safe_search_term = re.sub(r'[\s/\\:*?"<>|\[\]]', '_', search_term)
         current_time = dt.datetime.now()
         date_str = current_time.strftime("%Y%m%d_%H%M%S")
         
-        export_filename = f'全局搜索结果_{safe_search_term}_{len(rows)}条_{date_str}.xlsx'
-        export_path = os.path.join('static/uploads', export_filename)
+        # 记录数在写入完成后才能确定，先写入临时文件再按记录数命名
+        partial_path = os.path.join('static/uploads', f'全局搜索结果_{safe_search_term}_{date_str}.xlsx.part')
+        os.makedirs(os.path.dirname(partial_path), exist_ok=True)
         
-        # 确保导出目录存在
-        os.makedirs(os.path.dirname(export_path), exist_ok=True)
+        sheet_title = f"搜索结果_{safe_search_term}"[:31]  # Excel工作表名称长度限制
+        count = save_search_results_workbook(partial_path, sheet_title, business_columns, records)
         
-        # 使用openpyxl写入Excel
-        from openpyxl import Workbook
-        from openpyxl.utils.dataframe import dataframe_to_rows
-        from openpyxl.styles import Font, PatternFill
-        
-        wb = Workbook()
-        ws = wb.active
-        ws.title = f"搜索结果_{safe_search_term}"[:31]  # Excel工作表名称长度限制
-        
-        # 写入数据
-        for r in dataframe_to_rows(df, index=False, header=True):
-            ws.append(r)
-        
-        # 应用样式
-        apply_enhanced_excel_styling(ws, len(business_columns), len(rows))
-        
-        # 特殊处理：为来源信息列添加特殊颜色
-        for col_idx, col_name in enumerate(business_columns, 1):
-            if col_name.startswith('_source_'):
-                # 为来源信息列设置浅绿色背景
-                source_fill = PatternFill(start_color="e6f3ff", end_color="e6f3ff", fill_type="solid")
-                # 设置表头
-                ws.cell(row=1, column=col_idx).fill = source_fill
-                # 设置所有数据行
-                for row_idx in range(2, len(rows) + 2):
-                    ws.cell(row=row_idx, column=col_idx).fill = source_fill
-        
-        # 保存文件
-        wb.save(export_path)
+        export_filename = f'全局搜索结果_{safe_search_term}_{count}条_{date_str}.xlsx'
+        export_path = os.path.join('static/uploads', export_filename)
+        os.replace(partial_path, export_path)
         
-        print(f"[系统] 全局搜索结果导出成功: {export_filename}, 共导出 {len(rows)} 条记录")
+        print(f"[系统] 全局搜索结果导出成功: {export_filename}, 共导出 {count} 条记录")
         
-        return send_file(export_path, as_attachment=True, download_name=export_filename)
+        response = send_file(export_path, as_attachment=True, download_name=export_filename)
+        response.headers['X-Record-Count'] = str(count)
+        return response
         
     except Exception as e:
         print(f"[错误] 导出全局搜索结果时出错: {str(e)}")
@@ -2150,18 +2809,21 @@ def generate_pivot_table():
         
         # 获取数据
         from models.database import TableGroup
-        group = TableGroup.query.get(group_id)
+        group = TableGroup.get_live(group_id)
         if not group:
             return jsonify({'success': False, 'message': '数据源不存在'})
         
         # 获取该分组的数据
-        data_records = TableData.query.filter_by(table_group_id=group_id).all()
+        data_records = TableData.live_in_group(group_id).all()
         
         if not data_records:
             return jsonify({'success': False, 'message': '数据源没有数据'})
         
-        # 转换为字典列表
-        raw_data = [record.to_dict() for record in data_records]
+        # 转换为字典列表，字典编码的分组字段保留编码
+        codec = RowCodec.for_group(group_id)
+        code_fields = [field for field in set(row_fields + column_fields) - set(value_fields)
+                       if codec.is_dictionary(field)]
+        raw_data = [record.to_dict(codec, keep_codes=code_fields) for record in data_records]
         
         print(f"[透视分析] 获取到 {len(raw_data)} 条数据记录")
         
@@ -2172,6 +2834,24 @@ def generate_pivot_table():
         # 创建DataFrame
         df = pd.DataFrame(raw_data)
         
+        # 字典编码的分组字段以编码构造分类列，分组聚合直接在整数编码上进行
+        for field in code_fields:
+            if field in df.columns:
+                codes = df[field].map(lambda value, field=field: codec.code_of(field, value))
+                categories = codec.dictionary_values(field)
+                if pd.Index(categories).is_unique:
+                    df[field] = pd.Categorical.from_codes(codes.fillna(-1).astype(int), categories=categories)
+                else:
+                    # 取值在 pandas 中相等（如 3 与 3.0）时不能作为分类，还原为取值
+                    df[field] = codes.map(lambda code, categories=categories: None if pd.isna(code) else categories[int(code)])
+        
+        def _decategorize(frame):
+            """分类列转回普通列，便于填充缺失值"""
+            for col in frame.columns:
+                if isinstance(frame[col].dtype, pd.CategoricalDtype):
+                    frame[col] = frame[col].astype(object)
+            return frame
+        
         # 验证字段是否存在
         all_fields = row_fields + column_fields + value_fields
         missing_fields = [field for field in all_fields if field not in df.columns]
@@ -2200,7 +2880,7 @@ def generate_pivot_table():
             if (row_fields or column_fields) and not value_fields:
                 group_fields = row_fields + column_fields
                 if group_fields:
-                    grouped = df.groupby(group_fields).size().reset_index(name='计数')
+                    grouped = df.groupby(group_fields, observed=True).size().reset_index(name='计数')
                     result_data = grouped.to_dict('records')
                     print(f"[透视分析] 计数透视完成，共 {len(result_data)} 行")
             
@@ -2222,7 +2902,7 @@ def generate_pivot_table():
                         group_keys.extend(row_fields)
                     if column_fields:
                         group_keys.extend(column_fields)
-                    grouped = df.groupby(group_keys, dropna=False)
+                    grouped = df.groupby(group_keys, dropna=False, observed=True)
 
                     result_df = None
 
@@ -2271,7 +2951,7 @@ def generate_pivot_table():
                         pass
 
                     # 将缺失填 0 并转原生类型
-                    result_df = result_df.fillna(0)
+                    result_df = _decategorize(result_df).fillna(0)
                     def _to_native(v):
                         if hasattr(v, 'item'):
                             try:
@@ -2291,7 +2971,8 @@ def generate_pivot_table():
                         'data': df,
                         'values': value_fields,
                         'aggfunc': 'sum',
-                        'fill_value': 0
+                        'fill_value': 0,
+                        'observed': True
                     }
                     if row_fields:
                         pivot_params['index'] = row_fields
@@ -2309,7 +2990,7 @@ def generate_pivot_table():
                             return '_'.join(parts) if parts else str(col[0])
                         return str(col)
                     pivot_reset.columns = [_flat_col(c) for c in pivot_reset.columns]
-                    pivot_reset = pivot_reset.fillna(0)
+                    pivot_reset = _decategorize(pivot_reset).fillna(0)
                     def _to_native(v):
                         if hasattr(v, 'item'):
                             try:
@@ -2349,9 +3030,9 @@ def generate_pivot_table():
                     group_fields = row_fields + column_fields
                     if value_fields:
                         agg_dict = {field: 'sum' for field in value_fields}
-                        grouped = df.groupby(group_fields).agg(agg_dict).reset_index()
+                        grouped = df.groupby(group_fields, observed=True).agg(agg_dict).reset_index()
                     else:
-                        grouped = df.groupby(group_fields).size().reset_index(name='计数')
+                        grouped = df.groupby(group_fields, observed=True).size().reset_index(name='计数')
                     
                     result_data = grouped.to_dict('records')
                     import json
@@ -2467,11 +3148,30 @@ def export_pivot_table():
         return jsonify({'success': False, 'message': str(e)})
 
 
+@app.cli.command('encode-dictionaries')
+def encode_dictionaries_command():
+    """为已有数据中的低基数列启用字典编码（flask --app app_v2 encode-dictionaries）"""
+    UniversalExcelProcessor.dictionary_encode_all()
+
+@app.cli.command('repair-counters')
+def repair_counters_command():
+    """根据实际数据重建分组计数（flask --app app_v2 repair-counters）"""
+    UniversalExcelProcessor.repair_group_counters()
+
 def create_app():
     """应用程序工厂函数"""
     with app.app_context():
         # 创建数据库表
+        enable_incremental_vacuum()
         db.create_all()
+        upgrade_schema()
+        SearchIndex.setup()
+        SearchIndex.check_grams()
+        UniversalExcelProcessor.migrate_dictionary_codes()
+        UniversalExcelProcessor.migrate_legacy_rows()
+        UniversalExcelProcessor.backfill_sort_keys()
+        if TableGroup.query.filter(TableGroup.record_count.is_(None)).first():
+            UniversalExcelProcessor.repair_group_counters()
         print("[系统] 数据库初始化完成")
         
         # 确保上传目录存在
@@ -2479,6 +3179,9 @@ def create_app():
             os.makedirs(app.config['UPLOAD_FOLDER'])
             print("[系统] 上传目录创建完成")
     
+    if app.config.get('MAINTENANCE_INTERVAL'):
+        maintenance_worker.start()
+    
     return app
 
 if __name__ == '__main__':
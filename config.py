@@ -22,6 +22,33 @@ class Config:
     
     # 确保上传目录存在
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    
+    # 后台维护任务间隔（秒），0 表示不启动后台维护线程
+    MAINTENANCE_INTERVAL = int(os.environ.get('MAINTENANCE_INTERVAL', 60))
+    
+    # 维护任务租约时长（秒）：多进程部署时每个任务执行前在数据库中取得租约，
+    # 持有租约的进程异常退出后，超过该时长其他进程才能接管；应大于单个任务的最长耗时
+    MAINTENANCE_LEASE_SECONDS = int(os.environ.get('MAINTENANCE_LEASE_SECONDS', 3600))
+    
+    # 超过该天数未访问的表格分组由后台任务归档，0 表示不自动归档
+    ARCHIVE_IDLE_DAYS = int(os.environ.get('ARCHIVE_IDLE_DAYS', 30))
+    
+    # 分组快照保留天数，过期的快照由后台任务删除，0 表示永久保留
+    SNAPSHOT_RETENTION_DAYS = int(os.environ.get('SNAPSHOT_RETENTION_DAYS', 7))
+    
+    # 表格数据接口单页最多返回的行数（请求 limit 参数的上限）
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 5000))
+    
+    # 分组数据响应缓存的总字节数上限，0 表示不缓存
+    RESPONSE_CACHE_BYTES = int(os.environ.get('RESPONSE_CACHE_BYTES', 64 * 1024 * 1024))
+    
+    # 全局搜索结果缓存的条目数和记录总数上限，条目数为 0 表示不缓存
+    SEARCH_CACHE_ENTRIES = int(os.environ.get('SEARCH_CACHE_ENTRIES', 64))
+    SEARCH_CACHE_RECORDS = int(os.environ.get('SEARCH_CACHE_RECORDS', 200000))
+    
+    # 完整全局搜索（未分页）的并行线程数和时限秒数，线程数为 1 时串行搜索，时限为 0 表示不限时
+    SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS', 4))
+    SEARCH_TIMEOUT_SECONDS = float(os.environ.get('SEARCH_TIMEOUT_SECONDS', 30))
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -0,0 +1,130 @@
+"""
+Arrow 导出
+将分组数据（可带列投影、过滤和排序）转换为带类型的 Arrow 表并以 IPC 流格式输出，
+pandas / pyarrow 及浏览器端的 Arrow 读取器可直接加载，无需解析 JSON 再转换类型
+"""
+
+import re
+
+from models.database import RowCodec
+
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    pa = None
+    HAS_PYARROW = False
+
+
+class ArrowExport:
+    """分组查询结果到 Arrow IPC 流的转换
+
+    列类型按取值推断：全部为整数的列为 int64，全部为数值的列为 float64，其余为 string，
+    空字符串在数值列中视为空值；字典编码列直接以编码构建 dictionary<int32, string> 列，
+    不逐行解码。以 0 开头的数字串（如编号 "007"）按文本处理，避免丢失前导零。
+    """
+
+    MIME_TYPE = 'application/vnd.apache.arrow.stream'
+    BATCH_SIZE = 10000              # 读取和写出的批次行数
+
+    _INTEGER_PATTERN = re.compile(r'^[-+]?(0|[1-9]\d{0,17})$')
+    _FLOAT_PATTERN = re.compile(r'^[-+]?(0|[1-9]\d*)?(\.\d+)?([eE][-+]?\d+)?$')
+
+    @classmethod
+    def write_stream(cls, query, metadata=None):
+        """读取 GroupDataQuery 的全部结果，返回 Arrow IPC 流的字节内容"""
+        table = cls.to_table(query, metadata)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=cls.BATCH_SIZE)
+        return sink.getvalue().to_pybytes()
+
+    @classmethod
+    def to_table(cls, query, metadata=None):
+        """读取 GroupDataQuery 的全部结果并转换为 Arrow 表（按列累积，不保留行字典）"""
+        codec = query.codec
+        dictionary_columns = [column for column in query.columns if codec.is_dictionary(column)]
+        values = {column: [] for column in query.columns}
+        ids, source_files, created, updated = [], [], [], []
+
+        for record_id, source_file, created_at, updated_at, data in query.iter_records(
+            cls.BATCH_SIZE, keep_codes=dictionary_columns
+        ):
+            ids.append(record_id)
+            source_files.append(source_file)
+            created.append(created_at)
+            updated.append(updated_at)
+            for column in query.columns:
+                values[column].append(data.get(column))
+
+        arrays = [pa.array(ids, pa.int64())]
+        names = ['id']
+        for column in query.columns:
+            if column in dictionary_columns:
+                arrays.append(cls._dictionary_array(values[column], codec.dictionary_values(column)))
+            else:
+                arrays.append(cls._typed_array(values[column]))
+            names.append(column)
+            values[column] = None
+        arrays.append(pa.array(source_files, pa.string()).dictionary_encode())
+        arrays.append(pa.array(created, pa.timestamp('us')))
+        arrays.append(pa.array(updated, pa.timestamp('us')))
+        names.extend(['source_file', 'created_at', 'updated_at'])
+
+        table = pa.Table.from_arrays(arrays, names=names)
+        if metadata:
+            table = table.replace_schema_metadata({str(key): str(value) for key, value in metadata.items()})
+        return table
+
+    @classmethod
+    def _dictionary_array(cls, codes, dictionary):
+        """字典编码列：编码直接作为索引；含有未编码的取值时退回按文本编码"""
+        def encoded(code):
+            return RowCodec.is_code(code) and 0 <= code[0] < len(dictionary)
+
+        if all(code is None or encoded(code) for code in codes):
+            return pa.DictionaryArray.from_arrays(
+                pa.array([None if code is None else code[0] for code in codes], pa.int32()),
+                pa.array([cls._text(value) for value in dictionary], pa.string())
+            )
+        texts = [cls._text(dictionary[code[0]] if encoded(code) else code) for code in codes]
+        return pa.array(texts, pa.string()).dictionary_encode()
+
+    @classmethod
+    def _typed_array(cls, values):
+        """按取值推断列类型：int64、float64 或 string"""
+        kind = 'int'
+        for value in values:
+            if value is None or value == '':
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                kind = 'str'
+                break
+            if isinstance(value, int):
+                continue
+            if isinstance(value, float):
+                kind = 'float'
+                continue
+            text = value.strip()
+            if cls._INTEGER_PATTERN.match(text):
+                continue
+            if text and text not in ('+', '-', '.') and cls._FLOAT_PATTERN.match(text) and not cls._leading_zero(text):
+                kind = 'float'
+                continue
+            kind = 'str'
+            break
+
+        if kind == 'int':
+            return pa.array([None if value is None or value == '' else int(value) for value in values], pa.int64())
+        if kind == 'float':
+            return pa.array([None if value is None or value == '' else float(value) for value in values], pa.float64())
+        return pa.array([cls._text(value) for value in values], pa.string())
+
+    @staticmethod
+    def _leading_zero(text):
+        digits = text.lstrip('+-')
+        return len(digits) > 1 and digits[0] == '0' and digits[1].isdigit()
+
+    @staticmethod
+    def _text(value):
+        return None if value is None else str(value)
@@ -0,0 +1,230 @@
+"""
+分组冷存储
+长期未访问的分组将行数据按块压缩为归档段移出在线表，分组元数据和计数保留在线，
+首次读取时自动恢复
+"""
+
+import json
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from models.database import db, TableData, TableGroup, TableSchema, GroupFileStats, GroupArchive, GroupSnapshot, RowCodec, incremental_vacuum
+
+
+class ColdStorage:
+    """分组归档与恢复"""
+
+    CHUNK_SIZE = 5000                        # 每个归档段的行数
+    COMPRESS_LEVEL = 6                       # zlib 压缩级别
+    TOUCH_INTERVAL = timedelta(hours=1)      # 访问时间的更新粒度，避免每次读取都写库
+    ARCHIVE_PAUSE_SECONDS = 0.05             # 后台归档每个分组之间的停顿
+
+    _ROW_FIELDS = ('id', 'source_file', 'row_data', 'row_format', 'sort_key', 'created_at', 'updated_at')
+
+    @staticmethod
+    def archive_group(group_id, commit=True):
+        """将分组的在线行数据压缩为归档段并从在线表删除，返回归档的行数
+
+        已标记删除的行不归档，由后台清理任务物理删除。
+
+        Raises:
+            ValueError: 分组有快照（快照按行ID记录变更，恢复归档时行ID可能改变）
+        """
+        group = TableGroup.get_live(group_id)
+        if group is None:
+            return 0
+        if db.session.query(GroupSnapshot.id).filter(GroupSnapshot.table_group_id == group_id).first() is not None:
+            raise ValueError('表格有快照，不能归档；请先删除快照')
+
+        chunk_index = db.session.query(
+            db.func.coalesce(db.func.max(GroupArchive.chunk_index), -1)
+        ).filter(GroupArchive.table_group_id == group_id).scalar() + 1
+
+        columns = [getattr(TableData, field) for field in ColdStorage._ROW_FIELDS]
+        archived = 0
+        last_id = 0
+        while True:
+            rows = db.session.query(*columns).filter(
+                TableData.table_group_id == group_id,
+                TableData.deleted_at.is_(None),
+                TableData.id > last_id
+            ).order_by(TableData.id).limit(ColdStorage.CHUNK_SIZE).all()
+            if not rows:
+                break
+
+            packed = [ColdStorage._pack_row(row) for row in rows]
+            raw = json.dumps(packed, ensure_ascii=False).encode('utf-8')
+            db.session.add(GroupArchive(
+                table_group_id=group_id,
+                chunk_index=chunk_index,
+                row_count=len(packed),
+                raw_size=len(raw),
+                payload=zlib.compress(raw, ColdStorage.COMPRESS_LEVEL)
+            ))
+            TableData.query.filter(
+                TableData.table_group_id == group_id,
+                TableData.id.in_([row.id for row in rows])
+            ).delete(synchronize_session=False)
+
+            last_id = rows[-1].id
+            chunk_index += 1
+            archived += len(rows)
+
+        if archived or group.archived_at is not None:
+            group.archived_at = datetime.utcnow()
+            group.version = (group.version or 0) + 1
+        if commit:
+            db.session.commit()
+        return archived
+
+    @staticmethod
+    def restore_group(group_id, commit=True):
+        """将分组的归档段恢复到在线表，返回恢复的行数
+
+        归档后行ID可能被新插入的记录占用，冲突的行会分配新ID；
+        归档期间被删除的列在恢复时一并剔除，旧格式的字典编码转为当前格式。
+        """
+        chunks = GroupArchive.query.filter_by(table_group_id=group_id).order_by(GroupArchive.chunk_index).all()
+        schemas = db.session.query(TableSchema.id, TableSchema.is_dictionary).filter(
+            TableSchema.table_group_id == group_id
+        ).all()
+        column_ids = {str(schema_id) for schema_id, _ in schemas}
+        dictionary_ids = {str(schema_id) for schema_id, is_dictionary in schemas if is_dictionary}
+
+        restored = 0
+        reassigned = 0
+        for chunk in chunks:
+            rows = json.loads(zlib.decompress(chunk.payload).decode('utf-8'))
+            if rows:
+                row_ids = [row['id'] for row in rows]
+                taken = {row_id for (row_id,) in db.session.query(TableData.id).filter(
+                    TableData.id.between(min(row_ids), max(row_ids))
+                ).all()}
+                mappings = [ColdStorage._unpack_row(row, group_id, column_ids, dictionary_ids, taken) for row in rows]
+                # 先插入保留原ID的行，再插入需要重新分配ID的行，避免新分配的ID与待恢复的ID冲突
+                db.session.bulk_insert_mappings(TableData, [m for m in mappings if 'id' in m])
+                db.session.bulk_insert_mappings(TableData, [m for m in mappings if 'id' not in m])
+                restored += len(mappings)
+                reassigned += sum(1 for m in mappings if 'id' not in m)
+            db.session.delete(chunk)
+
+        now = datetime.utcnow()
+        # 恢复时行ID可能改变，递增数据版本；有行分配了新ID时搜索索引需要重建
+        values = {
+            TableGroup.archived_at: None,
+            TableGroup.last_accessed_at: now,
+            TableGroup.version: db.func.coalesce(TableGroup.version, 0) + 1
+        }
+        if reassigned:
+            values[TableGroup.search_indexed] = False
+        TableGroup.query.filter_by(id=group_id).update(values, synchronize_session=False)
+        if commit:
+            db.session.commit()
+        if chunks:
+            print(f"[系统] 分组 {group_id} 已从归档恢复 {restored} 条记录")
+        return restored
+
+    @staticmethod
+    def ensure_online(group_id, touch=True):
+        """读取分组前调用：已归档则恢复，否则按需更新访问时间"""
+        if group_id is None:
+            return
+        state = db.session.query(TableGroup.archived_at, TableGroup.last_accessed_at).filter(
+            TableGroup.id == group_id
+        ).first()
+        if state is None:
+            return
+
+        archived_at, last_accessed_at = state
+        now = datetime.utcnow()
+        if archived_at is not None:
+            ColdStorage.restore_group(group_id)
+        elif touch and (last_accessed_at is None or now - last_accessed_at > ColdStorage.TOUCH_INTERVAL):
+            # 只记录访问时间，不改变分组的更新时间
+            TableGroup.query.filter_by(id=group_id).update(
+                {TableGroup.last_accessed_at: now, TableGroup.updated_at: TableGroup.updated_at},
+                synchronize_session=False
+            )
+            db.session.commit()
+
+    @staticmethod
+    def ensure_file_online(source_file):
+        """读取或修改某来源文件的记录前调用：恢复包含该文件记录的已归档分组"""
+        for group_id in GroupFileStats.group_ids_for_file(source_file):
+            ColdStorage.ensure_online(group_id, touch=False)
+
+    @staticmethod
+    def restore_all():
+        """恢复所有已归档的分组（全表读取前调用），返回恢复的行数"""
+        group_ids = [group_id for (group_id,) in db.session.query(TableGroup.id).filter(
+            TableGroup.archived_at.isnot(None),
+            TableGroup.deleted_at.is_(None)
+        ).all()]
+        return sum(ColdStorage.restore_group(group_id) for group_id in group_ids)
+
+    @staticmethod
+    def archive_idle_groups(idle_days):
+        """后台任务：按最近最少使用归档超过 idle_days 天未访问的分组，返回归档的分组数
+        
+        有快照的分组不自动归档，快照按行ID记录变更，恢复归档时行ID可能改变。
+        """
+        if not idle_days:
+            return 0
+
+        cutoff = datetime.utcnow() - timedelta(days=idle_days)
+        last_used = db.func.coalesce(TableGroup.last_accessed_at, TableGroup.last_import_at, TableGroup.created_at)
+        snapshot_groups = db.session.query(GroupSnapshot.table_group_id).filter(GroupSnapshot.table_group_id.isnot(None))
+        group_ids = [group_id for (group_id,) in db.session.query(TableGroup.id).filter(
+            TableGroup.deleted_at.is_(None),
+            TableGroup.archived_at.is_(None),
+            ~TableGroup.id.in_(snapshot_groups),
+            last_used < cutoff
+        ).order_by(last_used).all()]
+
+        archived_groups = 0
+        archived_rows = 0
+        for group_id in group_ids:
+            try:
+                rows = ColdStorage.archive_group(group_id)
+            except ValueError:
+                # 筛选后创建了快照
+                continue
+            if rows:
+                archived_groups += 1
+                archived_rows += rows
+            time.sleep(ColdStorage.ARCHIVE_PAUSE_SECONDS)
+
+        if archived_groups:
+            print(f"[系统] 归档 {archived_groups} 个超过 {idle_days} 天未访问的分组，共 {archived_rows} 条记录")
+            incremental_vacuum()
+        return archived_groups
+
+    @staticmethod
+    def _pack_row(row):
+        packed = dict(zip(ColdStorage._ROW_FIELDS, row))
+        for field in ('created_at', 'updated_at'):
+            if packed[field] is not None:
+                packed[field] = packed[field].isoformat()
+        return packed
+
+    @staticmethod
+    def _unpack_row(row, group_id, column_ids, dictionary_ids, taken_ids):
+        mapping = dict(row)
+        mapping['table_group_id'] = group_id
+        if mapping['id'] in taken_ids:
+            del mapping['id']
+        legacy_codes = mapping.get('row_format') == TableData.ROW_FORMAT_COLUMN_ID
+        if legacy_codes:
+            mapping['row_format'] = TableData.ROW_FORMAT_MARKED_CODES
+        if mapping.get('row_data'):
+            data = json.loads(mapping['row_data'])
+            if legacy_codes:
+                RowCodec.mark_codes(data, dictionary_ids)
+            mapping['row_data'] = json.dumps(
+                {key: value for key, value in data.items() if key in column_ids}, ensure_ascii=False
+            )
+        for field in ('created_at', 'updated_at'):
+            if mapping[field] is not None:
+                mapping[field] = datetime.fromisoformat(mapping[field])
+        return mapping
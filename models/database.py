@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from datetime import datetime
 import json
 from difflib import SequenceMatcher
@@ -15,6 +16,14 @@ class TableGroup(db.Model):
     schema_fingerprint = db.Column(db.String(500)) # 表头指纹用于匹配
     column_count = db.Column(db.Integer)           # 列数
     confidence_score = db.Column(db.Float, default=1.0) # 置信度分数 (0.0-1.0)
+    record_count = db.Column(db.Integer, default=0)      # 记录数（随写入同步维护）
+    source_file_count = db.Column(db.Integer, default=0) # 来源文件数（随写入同步维护）
+    last_import_at = db.Column(db.DateTime)              # 最近一次导入时间
+    deleted_at = db.Column(db.DateTime)                  # 删除标记，非空表示已删除，等待后台清理
+    archived_at = db.Column(db.DateTime, index=True)     # 归档时间，非空表示行数据已移入归档段
+    last_accessed_at = db.Column(db.DateTime)            # 最近一次读取时间，用于按最近最少使用归档
+    version = db.Column(db.Integer, default=0)           # 数据版本，分组的行、表结构或名称每次变化时递增
+    search_indexed = db.Column(db.Boolean, default=True) # 全局搜索索引是否完整，否则搜索时扫描该分组，由后台任务重建
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -22,6 +31,40 @@ class TableGroup(db.Model):
     data_records = db.relationship('TableData', backref='table_group', lazy=True)
     schemas = db.relationship('TableSchema', backref='table_group', lazy=True)
     
+    @classmethod
+    def live(cls):
+        """未被删除的分组"""
+        return cls.query.filter(cls.deleted_at.is_(None))
+    
+    @classmethod
+    def get_live(cls, group_id):
+        """按ID获取未被删除的分组"""
+        return cls.live().filter(cls.id == group_id).first()
+    
+    @classmethod
+    def bump_version(cls, group_id):
+        """递增分组的数据版本（不提交事务），分组的行、表结构或名称变化时调用"""
+        if group_id is None:
+            return
+        cls.query.filter_by(id=group_id).update(
+            {cls.version: db.func.coalesce(cls.version, 0) + 1}, synchronize_session=False
+        )
+    
+    @classmethod
+    def version_tag(cls, group_id):
+        """未删除分组的版本标识，分组不存在时返回 None
+        
+        标识由分组ID、创建时间和数据版本组成，分组被物理删除后ID被复用也不会与旧标识相同；
+        只按主键查询一行，用于条件请求和响应缓存。
+        """
+        row = db.session.query(cls.id, cls.created_at, cls.version).filter(
+            cls.id == group_id,
+            cls.deleted_at.is_(None)
+        ).first()
+        if row is None:
+            return None
+        return f"{row.id}.{row.created_at.strftime('%Y%m%d%H%M%S%f')}.{row.version or 0}"
+    
     def to_dict(self):
         confidence_percent = int((self.confidence_score or 1.0) * 100)
         return {
@@ -29,9 +72,12 @@ class TableGroup(db.Model):
             'group_name': self.group_name,
             'description': self.description,
             'column_count': self.column_count,
-            'record_count': len(self.data_records),
+            'record_count': self.record_count or 0,
+            'source_file_count': self.source_file_count or 0,
+            'last_import_at': self.last_import_at.strftime('%Y-%m-%d %H:%M:%S') if self.last_import_at else None,
             'confidence_score': self.confidence_score or 1.0,
             'confidence_percent': confidence_percent,
+            'is_archived': self.archived_at is not None,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
             'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S')
         }
@@ -40,23 +86,118 @@ class TableData(db.Model):
     """通用表格数据模型，支持任意列结构"""
     __tablename__ = 'table_data_v2'
     
+    __table_args__ = (
+        db.Index('ix_table_data_group_order', 'table_group_id', 'sort_key'),
+    )
+    
+    # 行数据格式：ROW_FORMAT_MARKED_CODES 表示以列ID为键、字典编码存为 [编码]；
+    # ROW_FORMAT_COLUMN_ID 为字典编码存为裸整数的旧格式，NULL 为更早的以列名为键的数据
+    ROW_FORMAT_COLUMN_ID = 2
+    ROW_FORMAT_MARKED_CODES = 3
+    
+    # 排序键间隔：相邻行之间预留空位，插入时取中间值，空位用尽时重新分配
+    SORT_KEY_GAP = 1 << 16
+    
     id = db.Column(db.Integer, primary_key=True)
-    source_file = db.Column(db.String(200))        # 来源文件名
-    row_data = db.Column(db.Text)                  # JSON格式存储行数据
+    source_file = db.Column(db.String(200), index=True) # 来源文件名
+    row_data = db.Column(db.Text)                  # JSON格式存储行数据，键为列ID（TableSchema.id）
+    row_format = db.Column(db.Integer, default=ROW_FORMAT_MARKED_CODES) # 行数据格式版本
     table_group_id = db.Column(db.Integer, db.ForeignKey('table_groups.id')) # 关联表格分组
+    sort_key = db.Column(db.BigInteger)            # 分组内排序键
+    deleted_at = db.Column(db.DateTime, index=True) # 删除标记，非空表示已删除，等待后台清理
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def get_data(self):
-        """获取行数据"""
+    @classmethod
+    def live(cls):
+        """对读取可见的记录：未被删除，且所属分组未被删除"""
+        deleted_groups = db.session.query(TableGroup.id).filter(TableGroup.deleted_at.isnot(None))
+        return cls.query.filter(
+            cls.deleted_at.is_(None),
+            db.or_(cls.table_group_id.is_(None), ~cls.table_group_id.in_(deleted_groups))
+        )
+    
+    @classmethod
+    def live_in_group(cls, table_group_id, touch=True):
+        """分组内未被删除的记录（分组本身是否已删除由调用方检查）
+        
+        分组已归档时先将归档段恢复到在线表，调用方无需关心分组是否归档。
+        touch 为 False 时不更新分组的访问时间，用于全局扫描。
+        """
+        from models.cold_storage import ColdStorage
+        ColdStorage.ensure_online(table_group_id, touch=touch)
+        return cls.query.filter(cls.table_group_id == table_group_id, cls.deleted_at.is_(None))
+    
+    @classmethod
+    def get_live(cls, record_id):
+        """按ID获取对读取可见的记录"""
+        return cls.live().filter(cls.id == record_id).first()
+    
+    @classmethod
+    def ordering(cls):
+        """行的显示顺序：排序键，键相同时按ID"""
+        return (cls.sort_key.asc(), cls.id.asc())
+    
+    @classmethod
+    def keyset_query(cls, query, cursor=None):
+        """按显示顺序排序，并从游标之后开始读取"""
+        if cursor:
+            sort_key, record_id = cls.parse_cursor(cursor)
+            query = query.filter(db.or_(
+                cls.sort_key > sort_key,
+                db.and_(cls.sort_key == sort_key, cls.id > record_id)
+            ))
+        return query.order_by(*cls.ordering())
+    
+    @classmethod
+    def keyset_page(cls, query, limit=None, cursor=None):
+        """按显示顺序做游标分页，返回 (记录列表, 下一页游标)
+        
+        游标为上一页最后一行的 "排序键:ID"，从游标之后继续读取，不使用 OFFSET，
+        翻页开销与页码无关。limit 为空时返回游标之后的全部记录。
+        """
+        query = cls.keyset_query(query, cursor)
+        if not limit:
+            return query.all(), None
+        
+        records = query.limit(limit + 1).all()
+        if len(records) <= limit:
+            return records, None
+        records = records[:limit]
+        return records, records[-1].cursor()
+    
+    @staticmethod
+    def parse_cursor(cursor):
+        """解析分页游标，格式错误时抛出 ValueError"""
+        sort_key, _, record_id = str(cursor).rpartition(':')
+        try:
+            return int(sort_key), int(record_id)
+        except ValueError:
+            raise ValueError(f"无效的分页游标: {cursor}")
+    
+    def cursor(self):
+        """当前行的分页游标"""
+        return f"{self.sort_key or 0}:{self.id}"
+    
+    def get_raw_data(self):
+        """获取原始存储的行数据（以列ID为键）"""
         return json.loads(self.row_data) if self.row_data else {}
     
-    def set_data(self, data):
-        """设置行数据"""
-        self.row_data = json.dumps(data, ensure_ascii=False)
+    def get_data(self, codec=None, keep_codes=()):
+        """获取行数据（以列名为键），keep_codes 中的字典编码列保留编码（[编码]）"""
+        if codec is None:
+            codec = RowCodec.for_group(self.table_group_id)
+        return codec.decode(self.get_raw_data(), keep_codes)
     
-    def to_dict(self):
-        data = self.get_data()
+    def set_data(self, data, codec=None):
+        """设置行数据，data 以列名为键，不属于当前表结构的字段会被忽略"""
+        if codec is None:
+            codec = RowCodec.for_group(self.table_group_id)
+        self.row_data = json.dumps(codec.encode(data), ensure_ascii=False)
+        self.row_format = self.ROW_FORMAT_MARKED_CODES
+    
+    def to_dict(self, codec=None, keep_codes=()):
+        data = self.get_data(codec, keep_codes)
         data['id'] = self.id
         data['source_file'] = self.source_file
         data['created_at'] = self.created_at.strftime('%Y-%m-%d %H:%M:%S')
@@ -72,6 +213,7 @@ class TableSchema(db.Model):
     column_type = db.Column(db.String(50))         # 列类型
     column_order = db.Column(db.Integer)           # 列顺序
     is_active = db.Column(db.Boolean, default=True) # 是否激活
+    is_dictionary = db.Column(db.Boolean, default=False) # 是否字典编码（行数据中存储 [编码]）
     table_group_id = db.Column(db.Integer, db.ForeignKey('table_groups.id')) # 关联表格分组
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -82,9 +224,187 @@ class TableSchema(db.Model):
             'column_type': self.column_type,
             'column_order': self.column_order,
             'is_active': self.is_active,
+            'is_dictionary': bool(self.is_dictionary),
             'table_group_id': self.table_group_id
         }
 
+class ColumnDictionary(db.Model):
+    """列值字典 - 低基数列的取值与整数编码，编码按列从 0 开始连续分配，分配后不再改变"""
+    __tablename__ = 'column_dictionaries'
+    __table_args__ = (
+        db.Index('ix_column_dictionaries_column_code', 'column_id', 'code', unique=True),
+        db.Index('ix_column_dictionaries_column_value', 'column_id', 'value', unique=True),
+    )
+    
+    # 取值格式：VALUE_FORMAT_JSON 表示 value 为取值的 JSON 文本，NULL 为旧版转成文本保存的取值
+    VALUE_FORMAT_JSON = 1
+    
+    id = db.Column(db.Integer, primary_key=True)
+    column_id = db.Column(db.Integer, db.ForeignKey('table_schema.id')) # 关联列（TableSchema.id）
+    code = db.Column(db.Integer)                   # 整数编码
+    value = db.Column(db.Text)                     # 取值（JSON 文本，保留数值等类型）
+    value_format = db.Column(db.Integer)           # 取值格式版本
+    
+    def get_value(self):
+        """取值的 JSON 文本（旧版文本取值按字符串处理）"""
+        if self.value_format == self.VALUE_FORMAT_JSON:
+            return self.value
+        return json.dumps(self.value, ensure_ascii=False)
+
+class RowCodec:
+    """行数据编解码器
+    
+    行数据以列ID为键存储，列的重命名和删除只需修改 TableSchema，
+    读写时由编解码器在列名与列ID之间转换。已删除（非活跃）列的数据在解码时直接忽略，
+    物理清理由后台压缩任务完成。
+    
+    字典编码列的值在行数据中存储为单元素列表 [编码]，与取值本身为整数的情况区分开；
+    编码与取值的对应关系保存在 ColumnDictionary，取值按 JSON 文本区分（整数 3 与字符串 "3"
+    是不同的取值）。编码时遇到新取值会分配新编码（随当前事务提交）。
+    """
+    
+    def __init__(self, schemas):
+        self.names = {}   # 列ID -> 列名
+        self.ids = {}     # 列名 -> 列ID
+        self.values = {}  # 字典编码列ID -> 按编码排列的取值列表
+        self.codes = {}   # 字典编码列ID -> {取值的 JSON 文本: 编码}
+        for schema in schemas:
+            key = str(schema.id)
+            if schema.is_active:
+                self.names[key] = schema.column_name
+                self.ids[schema.column_name] = key
+            if getattr(schema, 'is_dictionary', False):
+                self.values[key] = []
+                self.codes[key] = {}
+        
+        if self.values:
+            entries = ColumnDictionary.query.filter(
+                ColumnDictionary.column_id.in_([int(key) for key in self.values])
+            ).order_by(ColumnDictionary.column_id, ColumnDictionary.code).all()
+            for entry in entries:
+                key = str(entry.column_id)
+                text = entry.get_value()
+                self.values[key].append(json.loads(text))
+                self.codes[key][text] = entry.code
+    
+    @classmethod
+    def for_group(cls, table_group_id):
+        """为指定分组（None 表示未分组的旧数据）构建编解码器"""
+        schemas = TableSchema.query.filter_by(
+            table_group_id=table_group_id,
+            is_active=True
+        ).all()
+        return cls(schemas)
+    
+    @classmethod
+    def for_records(cls, records):
+        """为一批记录涉及的所有分组构建编解码器，返回 {分组ID: 编解码器}"""
+        group_ids = {record.table_group_id for record in records}
+        codecs = {group_id: cls([]) for group_id in group_ids}
+        
+        query = TableSchema.query.filter(TableSchema.is_active == True)
+        non_null_ids = [group_id for group_id in group_ids if group_id is not None]
+        if None in group_ids:
+            query = query.filter(db.or_(
+                TableSchema.table_group_id.in_(non_null_ids),
+                TableSchema.table_group_id.is_(None)
+            ))
+        else:
+            query = query.filter(TableSchema.table_group_id.in_(non_null_ids))
+        
+        schemas_by_group = {}
+        for schema in query.all():
+            schemas_by_group.setdefault(schema.table_group_id, []).append(schema)
+        for group_id, schemas in schemas_by_group.items():
+            codecs[group_id] = cls(schemas)
+        return codecs
+    
+    @staticmethod
+    def is_code(value):
+        """行数据中的值是否为字典编码（[编码]）"""
+        return (isinstance(value, list) and len(value) == 1
+                and isinstance(value[0], int) and not isinstance(value[0], bool))
+    
+    @staticmethod
+    def value_key(value):
+        """取值在字典中的键（JSON 文本）"""
+        return json.dumps(value, ensure_ascii=False)
+    
+    def decode(self, raw, keep_codes=()):
+        """列ID键 -> 列名键，字典编码列还原为取值（keep_codes 中的列名保留 [编码]）"""
+        data = {}
+        for key, value in raw.items():
+            name = self.names.get(key)
+            if name is None:
+                continue
+            if key in self.values and name not in keep_codes and self.is_code(value):
+                values = self.values[key]
+                value = values[value[0]] if 0 <= value[0] < len(values) else None
+            data[name] = value
+        return data
+    
+    def encode(self, data):
+        """列名键 -> 列ID键，字典编码列的取值转为 [编码]"""
+        raw = {}
+        for name, value in data.items():
+            key = self.ids.get(name)
+            if key is None:
+                continue
+            if key in self.values and value is not None:
+                value = [self.code_for(key, value)]
+            raw[key] = value
+        return raw
+    
+    def is_dictionary(self, name):
+        """列是否字典编码"""
+        return self.ids.get(name) in self.values
+    
+    def dictionary_values(self, name):
+        """字典编码列按编码排列的取值列表"""
+        return self.values.get(self.ids.get(name), [])
+    
+    def code_of(self, name, value):
+        """字典编码列中取值对应的编码（[编码] 时取出编码），取值不在字典中时返回 None"""
+        if self.is_code(value):
+            return value[0]
+        if value is None:
+            return None
+        return self.codes.get(self.ids.get(name), {}).get(self.value_key(value))
+    
+    def encode_codes(self, raw):
+        """将列ID键行数据中字典编码列尚未编码的取值转为 [编码]（用于写回旧格式的行）"""
+        for key, value in raw.items():
+            if key in self.values and value is not None and not self.is_code(value):
+                raw[key] = [self.code_for(key, value)]
+        return raw
+    
+    @staticmethod
+    def mark_codes(raw, dictionary_keys):
+        """将 ROW_FORMAT_COLUMN_ID 格式行数据中字典编码列的裸整数编码转为 [编码]
+
+        dictionary_keys 为字典编码列ID（字符串）的集合。
+        """
+        for key, value in raw.items():
+            if key in dictionary_keys and isinstance(value, int) and not isinstance(value, bool):
+                raw[key] = [value]
+        return raw
+    
+    def matching_codes(self, name, predicate):
+        """字典编码列中取值满足条件的编码集合，用于在编码上直接过滤"""
+        return {code for code, value in enumerate(self.dictionary_values(name)) if predicate(value)}
+    
+    def code_for(self, key, value):
+        """取值对应的编码，新取值分配新编码（不提交事务）"""
+        text = self.value_key(value)
+        code = self.codes[key].get(text)
+        if code is None:
+            code = len(self.values[key])
+            self.values[key].append(json.loads(text))
+            self.codes[key][text] = code
+            db.session.add(ColumnDictionary(column_id=int(key), code=code, value=text,
+                                            value_format=ColumnDictionary.VALUE_FORMAT_JSON))
+        return code
+
 class ColumnMapping(db.Model):
     """列名映射表 - 处理相似列名的映射关系"""
     __tablename__ = 'column_mappings'
@@ -110,6 +430,269 @@ class ColumnMapping(db.Model):
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
         }
 
+class GroupFileStats(db.Model):
+    """分组内各来源文件的记录数，用于同步维护 TableGroup 的计数字段"""
+    __tablename__ = 'group_file_stats'
+    __table_args__ = (
+        db.Index('ix_group_file_stats_group_file', 'table_group_id', 'source_file', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    table_group_id = db.Column(db.Integer, db.ForeignKey('table_groups.id')) # 关联表格分组，旧版未分组数据为空
+    source_file = db.Column(db.String(200), index=True) # 来源文件名
+    record_count = db.Column(db.Integer, default=0)     # 记录数
+    last_import_at = db.Column(db.DateTime)             # 最近一次导入时间
+    
+    @classmethod
+    def count_for_file(cls, source_file):
+        """来源文件的记录数（包括已归档分组中的记录）"""
+        return db.session.query(db.func.coalesce(db.func.sum(cls.record_count), 0)).filter(
+            cls.source_file == source_file
+        ).scalar()
+    
+    @classmethod
+    def group_ids_for_file(cls, source_file):
+        """包含该来源文件记录的分组ID"""
+        return [group_id for (group_id,) in db.session.query(cls.table_group_id).filter(
+            cls.source_file == source_file,
+            cls.table_group_id.isnot(None)
+        ).all()]
+
+class DataStats(db.Model):
+    """全局数据统计 - 单行表，随来源文件统计同步增量维护，读取统计时不再扫描"""
+    __tablename__ = 'data_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    total_records = db.Column(db.Integer, default=0)      # 记录总数（包括已归档分组）
+    source_file_count = db.Column(db.Integer, default=0)  # 有记录的有效来源文件数
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    ROW_ID = 1
+    
+    @staticmethod
+    def counts_file(filename):
+        """来源文件是否计入文件数 - 排除空值和只有扩展名的情况（如"xlsx", "xls"等）"""
+        if not filename or not filename.strip():
+            return False
+        if '.' in filename and len(filename.split('.')[0]) > 0:
+            return True
+        return filename not in ['xlsx', 'xls', '手动添加']
+    
+    @classmethod
+    def current(cls):
+        """读取统计行，不存在时（新库或旧版本升级）根据来源文件统计重建"""
+        stats = cls.query.get(cls.ROW_ID)
+        if stats is None:
+            stats = cls.rebuild()
+            db.session.commit()
+        return stats
+    
+    @classmethod
+    def adjust(cls, records=0, files=0):
+        """增量调整统计（不提交事务）"""
+        if not records and not files:
+            return
+        updated = cls.query.filter_by(id=cls.ROW_ID).update({
+            cls.total_records: db.func.coalesce(cls.total_records, 0) + records,
+            cls.source_file_count: db.func.coalesce(cls.source_file_count, 0) + files,
+            cls.updated_at: datetime.utcnow()
+        }, synchronize_session=False)
+        if not updated:
+            # 统计行尚未建立：来源文件统计已包含本次变更，直接重建
+            cls.rebuild()
+    
+    @classmethod
+    def adjust_file(cls, table_group_id, source_file, before, after):
+        """某分组中来源文件的记录数由 before 变为 after 时调整统计（不提交事务）
+        
+        来源文件只在所有分组中的记录数从无到有、从有到无时才改变文件数。
+        """
+        files = 0
+        if (before > 0) != (after > 0) and cls.counts_file(source_file):
+            if table_group_id is None:
+                other_groups = GroupFileStats.table_group_id.isnot(None)
+            else:
+                other_groups = db.or_(GroupFileStats.table_group_id != table_group_id,
+                                      GroupFileStats.table_group_id.is_(None))
+            in_other_groups = db.session.query(GroupFileStats.id).filter(
+                GroupFileStats.source_file == source_file,
+                GroupFileStats.record_count > 0,
+                other_groups
+            ).first() is not None
+            if not in_other_groups:
+                files = 1 if after > 0 else -1
+        cls.adjust(after - before, files)
+    
+    @classmethod
+    def rebuild(cls):
+        """根据来源文件统计重建（不提交事务）"""
+        total = db.session.query(db.func.coalesce(db.func.sum(GroupFileStats.record_count), 0)).scalar()
+        source_files = db.session.query(GroupFileStats.source_file).filter(
+            GroupFileStats.record_count > 0
+        ).distinct().all()
+        stats = cls.query.get(cls.ROW_ID)
+        if stats is None:
+            stats = cls(id=cls.ROW_ID)
+            db.session.add(stats)
+        stats.total_records = total
+        stats.source_file_count = sum(1 for (filename,) in source_files if cls.counts_file(filename))
+        stats.updated_at = datetime.utcnow()
+        return stats
+    
+    @classmethod
+    def reset(cls):
+        """清空数据后归零（不提交事务）"""
+        stats = cls.query.get(cls.ROW_ID)
+        if stats is None:
+            stats = cls(id=cls.ROW_ID)
+            db.session.add(stats)
+        stats.total_records = 0
+        stats.source_file_count = 0
+        stats.updated_at = datetime.utcnow()
+
+class SearchDocument(db.Model):
+    """全局搜索索引文档 - 每行数据一条，内容为各单元格取值（小写）逐行拼接
+    
+    SQLite 支持 FTS5 trigram 分词时由触发器同步到全文索引 search_fts（见 SearchIndex）。
+    行数据删除后文档由后台清理任务删除，搜索结果按在线数据校验，过期文档不影响结果。
+    """
+    __tablename__ = 'search_documents'
+    
+    row_id = db.Column(db.Integer, primary_key=True, autoincrement=False) # 对应 TableData.id
+    table_group_id = db.Column(db.Integer, index=True)  # 所属分组，分组合并时随行迁移
+    content = db.Column(db.Text)                        # 单元格取值（小写），每个取值一行
+
+class SearchGram(db.Model):
+    """全局搜索二元组倒排表 - 搜索文档中每个相邻两字符组合（含换行分隔符）对应的行
+    
+    每个 (组合, 行) 一条，按组合查找即得到该组合的倒排列表。
+    """
+    __tablename__ = 'search_grams'
+    
+    gram = db.Column(db.String(2), primary_key=True)                       # 两字符组合
+    row_id = db.Column(db.Integer, primary_key=True, autoincrement=False, index=True) # 对应 TableData.id
+
+class SearchTerm(db.Model):
+    """模糊搜索词表 - 单元格取值（小写）及比较用的键
+    
+    键为取值本身，安装 pypinyin 时含中文的取值另有一条以拼音为键的词条。词表只增不减，
+    已不存在的取值在查找所在行时被过滤。
+    """
+    __tablename__ = 'search_terms'
+    __table_args__ = (
+        db.Index('ix_search_terms_value_key', 'value', 'term_key', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    term_key = db.Column(db.String(64), nullable=False)  # 比较用的键：取值或其拼音
+    value = db.Column(db.Text, nullable=False)           # 单元格取值（小写），按全局搜索索引查找所在行
+    length = db.Column(db.Integer, index=True)           # 键的字符数，按编辑距离的长度差过滤
+
+class SearchTermGram(db.Model):
+    """模糊搜索词表的二元组倒排表 - 词条的键首尾补齐后每个相邻两字符组合对应的词条"""
+    __tablename__ = 'search_term_grams'
+    
+    gram = db.Column(db.String(2), primary_key=True)                        # 两字符组合
+    term_id = db.Column(db.Integer, primary_key=True, autoincrement=False, index=True) # 对应 SearchTerm.id
+
+class GroupArchive(db.Model):
+    """分组归档段 - 冷分组的行数据按块压缩存放，分组元数据和计数仍保留在线"""
+    __tablename__ = 'group_archives'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    table_group_id = db.Column(db.Integer, db.ForeignKey('table_groups.id'), index=True) # 关联表格分组
+    chunk_index = db.Column(db.Integer)            # 块序号
+    row_count = db.Column(db.Integer)              # 块内行数
+    raw_size = db.Column(db.Integer)               # 压缩前字节数
+    payload = db.Column(db.LargeBinary)            # zlib 压缩的 JSON 行数据
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class GroupSnapshot(db.Model):
+    """分组快照 - 写时复制的检查点
+    
+    创建时只保存分组元数据、表结构和来源文件统计；行在快照之后第一次被修改或删除时，
+    才把修改前的内容复制到 SnapshotRow。快照之后新增的行按创建时间识别。
+    """
+    __tablename__ = 'group_snapshots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    table_group_id = db.Column(db.Integer, db.ForeignKey('table_groups.id'), index=True) # 关联表格分组
+    name = db.Column(db.String(200))               # 快照名称
+    metadata_json = db.Column(db.Text)             # JSON格式存储分组信息、表结构和来源文件统计
+    checkpoint_at = db.Column(db.DateTime)         # 检查点时间，此后创建的行不属于快照
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def get_metadata(self):
+        """获取快照保存的分组元数据"""
+        return json.loads(self.metadata_json) if self.metadata_json else {}
+    
+    def set_metadata(self, metadata):
+        """设置快照保存的分组元数据"""
+        self.metadata_json = json.dumps(metadata, ensure_ascii=False)
+    
+    def to_dict(self):
+        metadata = self.get_metadata()
+        return {
+            'id': self.id,
+            'table_group_id': self.table_group_id,
+            'group_name': metadata.get('group', {}).get('group_name'),
+            'name': self.name,
+            'record_count': metadata.get('group', {}).get('record_count', 0),
+            'checkpoint_at': self.checkpoint_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+class SnapshotRow(db.Model):
+    """快照行 - 行在快照之后第一次变更前的内容"""
+    __tablename__ = 'snapshot_rows'
+    __table_args__ = (
+        db.Index('ix_snapshot_rows_snapshot_row', 'snapshot_id', 'row_id', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_id = db.Column(db.Integer, db.ForeignKey('group_snapshots.id')) # 关联快照
+    row_id = db.Column(db.Integer)                 # 原记录ID
+    existed = db.Column(db.Boolean, default=True)  # False 表示该行在快照之后才移入分组
+    source_file = db.Column(db.String(200))
+    row_data = db.Column(db.Text)
+    row_format = db.Column(db.Integer)
+    sort_key = db.Column(db.BigInteger)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+
+class MaintenanceLease(db.Model):
+    """维护任务租约 - 多进程部署时同一维护任务同一时间只由一个进程执行，
+    持有者异常退出时租约到期后由其他进程接管"""
+    __tablename__ = 'maintenance_leases'
+    
+    name = db.Column(db.String(100), primary_key=True) # 维护任务名称
+    holder = db.Column(db.String(200))             # 持有者标识（主机名:进程号:随机串）
+    expires_at = db.Column(db.DateTime)            # 租约到期时间
+    acquired_at = db.Column(db.DateTime)
+
+class WorkspaceFile(db.Model):
+    """工作台文件索引 - 记录工作台文件夹中 Excel 文件的元数据，按修改时间增量刷新"""
+    __tablename__ = 'workspace_files'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(500), unique=True)   # 相对路径（文件夹/文件名）
+    folder = db.Column(db.String(100))              # 所在文件夹
+    file_name = db.Column(db.String(255), index=True) # 文件名，对应数据记录的来源文件
+    file_size = db.Column(db.Integer)               # 文件大小（字节）
+    mtime = db.Column(db.Float)                     # 文件修改时间戳，与文件系统不一致时重新索引
+    ctime = db.Column(db.Float)                     # 文件创建时间戳
+    content_hash = db.Column(db.String(64))         # 文件内容的 SHA-256
+    header_json = db.Column(db.Text)                # JSON格式存储表头列名
+    indexed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def get_header(self):
+        """获取文件的表头列名"""
+        return json.loads(self.header_json) if self.header_json else []
+    
+    def set_header(self, columns):
+        """设置文件的表头列名"""
+        self.header_json = json.dumps(columns, ensure_ascii=False)
+
 class UploadHistory(db.Model):
     """上传历史记录"""
     __tablename__ = 'upload_history_v2'
@@ -139,4 +722,52 @@ class UploadHistory(db.Model):
             'columns_detected': self.get_columns(),
             'status': self.status,
             'error_message': self.error_message
-        }
\ No newline at end of file
+        }
+
+def enable_incremental_vacuum():
+    """SQLite 新建数据库时启用增量回收，便于后台清理后通过 incremental_vacuum 归还空间
+    
+    auto_vacuum 只能在建表前设置，对已有的数据库不生效。
+    """
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def _set_auto_vacuum(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.close()
+
+def incremental_vacuum():
+    """SQLite 下归还已释放的页面，数据库未启用增量回收时不产生效果"""
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute('PRAGMA incremental_vacuum')
+        db.session.commit()
+
+def upgrade_schema():
+    """为已有数据库补齐新增的列和索引
+    
+    db.create_all() 只会创建缺失的表，已存在的表需要在这里通过 ALTER TABLE 补齐新字段。
+    """
+    engine = db.engine
+    inspector = db.inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        
+        existing_columns = {col['name'] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            engine.execute(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+            print(f"[系统] 数据库升级: {table.name} 新增字段 {column.name}")
+        
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=engine)
+                print(f"[系统] 数据库升级: {table.name} 新增索引 {index.name}")
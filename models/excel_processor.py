@@ -10,9 +10,13 @@ import threading
 from datetime import datetime
 from difflib import SequenceMatcher
 import hashlib
+import json
 from functools import lru_cache
 from contextlib import contextmanager
-from models.database import db, TableData, TableSchema, UploadHistory, TableGroup, ColumnMapping
+from models.database import db, TableData, TableSchema, UploadHistory, TableGroup, ColumnMapping, RowCodec, GroupFileStats, DataStats, GroupArchive, ColumnDictionary, incremental_vacuum
+from models.cold_storage import ColdStorage
+from models.snapshots import GroupSnapshots
+from models.search_index import SearchIndex
 from models.deepseek_api import DeepSeekAPIClient
 from models.api_manager import APIManager, NonLLMNameGenerator
 from models.config_storage import get_api_config
@@ -25,6 +29,15 @@ class UniversalExcelProcessor:
     HIGH_SIMILARITY_THRESHOLD = 0.95 # 高相似度 - 提高阈值以便更好地合并相似表格
     MIN_SIMILARITY_THRESHOLD = 0.85  # 最低相似度 - 提高阈值避免错误合并
     
+    # 后台压缩配置（分批处理，避免长时间持有写锁）
+    COMPACTION_BATCH_SIZE = 500
+    COMPACTION_PAUSE_SECONDS = 0.05
+    
+    # 字典编码配置：行数足够多、不同取值少且重复率高的列使用整数编码存储
+    DICTIONARY_MIN_ROWS = 50
+    DICTIONARY_MAX_VALUES = 1000
+    DICTIONARY_MAX_RATIO = 0.2
+    
     # 并发安全控制
     _creation_lock = threading.Lock()
     _fingerprint_cache = {}
@@ -137,8 +150,8 @@ class UniversalExcelProcessor:
         print(f"[系统] 更新表格结构，共 {len(columns)} 列")
         
         for i, col_name in enumerate(columns):
-            # 检查列是否已存在
-            existing = TableSchema.query.filter_by(column_name=col_name).first()
+            # 检查列是否已存在（未分组的旧版表结构）
+            existing = TableSchema.query.filter_by(column_name=col_name, table_group_id=None, is_active=True).first()
             if not existing:
                 schema = TableSchema(
                     column_name=col_name,
@@ -156,9 +169,12 @@ class UniversalExcelProcessor:
             db.session.rollback()
     
     @staticmethod
-    def get_current_schema():
-        """获取当前表格结构"""
-        schema = TableSchema.query.filter_by(is_active=True).order_by(TableSchema.column_order).all()
+    def get_current_schema(table_group_id=None):
+        """获取当前表格结构，指定分组时只返回该分组的列"""
+        query = TableSchema.query.filter_by(is_active=True)
+        if table_group_id is not None:
+            query = query.filter_by(table_group_id=table_group_id)
+        schema = query.order_by(TableSchema.column_order).all()
         return [s.column_name for s in schema]
     
     @staticmethod
@@ -196,6 +212,8 @@ class UniversalExcelProcessor:
             
             # 更新表格结构
             UniversalExcelProcessor.update_table_schema(df.columns)
+            codec = RowCodec.for_group(None)
+            next_sort_key = UniversalExcelProcessor.next_sort_key(None)
             
             # 导入数据
             imported_count = 0
@@ -220,7 +238,9 @@ class UniversalExcelProcessor:
                 # 创建数据记录
                 table_data = TableData()
                 table_data.source_file = filename
-                table_data.set_data(row_dict)
+                table_data.sort_key = next_sort_key
+                table_data.set_data(row_dict, codec)
+                next_sort_key += TableData.SORT_KEY_GAP
                 
                 try:
                     db.session.add(table_data)
@@ -229,6 +249,7 @@ class UniversalExcelProcessor:
                     print(f"[错误] 导入第 {index+1} 行数据时出错: {str(e)}")
                     continue
             
+            UniversalExcelProcessor._adjust_file_stats(None, filename, imported_count, imported=True)
             db.session.commit()
             print(f"[系统] 成功导入 {imported_count} 条数据")
             
@@ -263,96 +284,288 @@ class UniversalExcelProcessor:
     @staticmethod
     def get_all_data():
         """获取所有数据，按创建时间排序"""
-        data = TableData.query.order_by(TableData.created_at.asc()).all()
-        return [item.to_dict() for item in data]
+        ColdStorage.restore_all()
+        data = TableData.live().order_by(*TableData.ordering()).all()
+        codecs = RowCodec.for_records(data)
+        return [item.to_dict(codecs[item.table_group_id]) for item in data]
     
     @staticmethod
     def get_data_stats():
-        """获取数据统计"""
-        total_count = TableData.query.count()
-        
-        # 统计来源文件数 - 改进逻辑，排除空值和只有扩展名的情况
-        source_files = db.session.query(TableData.source_file).distinct().all()
-        valid_files = []
-        for f in source_files:
-            filename = f[0]
-            if filename and filename.strip():
-                # 排除只有扩展名的情况（如"xlsx", "xls"等）
-                if '.' in filename and len(filename.split('.')[0]) > 0:
-                    valid_files.append(filename)
-                elif filename not in ['xlsx', 'xls', '手动添加']:
-                    valid_files.append(filename)
-        
-        file_count = len(valid_files)
+        """获取数据统计 - 读取随写入增量维护的统计行，已归档分组的记录同样计入"""
+        stats = DataStats.current()
         
         # 统计列数 - 优先使用分组数据
         schema_count = 0
-        groups = TableGroup.query.all()
-        if groups:
+        latest_group = TableGroup.live().order_by(TableGroup.id.desc()).first()
+        if latest_group:
             # 使用最新分组的列数
-            latest_group = groups[-1]
             schema_count = latest_group.column_count
         else:
             # 兼容旧数据
             schema_count = TableSchema.query.filter_by(is_active=True).count()
         
         return {
-            'total_records': total_count,
-            'source_files': file_count,
+            'total_records': stats.total_records or 0,
+            'source_files': stats.source_file_count or 0,
             'total_columns': schema_count,
             'last_update': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
     
     @staticmethod
     def update_record(record_id, data):
-        """更新记录"""
-        record = TableData.query.get(record_id)
+        """更新记录
+        
+        Raises:
+            ValueError: 更新的列不在记录所属分组的活跃列中
+        """
+        record = TableData.get_live(record_id)
         if record:
-            current_data = record.get_data()
+            codec = RowCodec.for_group(record.table_group_id)
+            unknown = [str(name) for name in data if name not in codec.ids]
+            if unknown:
+                raise ValueError(f"表格中不存在列: {', '.join(unknown)}")
+            GroupSnapshots.capture_rows(TableData.id == record_id)
+            current_data = record.get_data(codec)
             current_data.update(data)
-            record.set_data(current_data)
+            record.set_data(current_data, codec)
             record.updated_at = datetime.utcnow()
+            SearchIndex.index_records([record], codec)
+            TableGroup.bump_version(record.table_group_id)
             db.session.commit()
             return True
         return False
     
     @staticmethod
     def delete_record(record_id):
-        """删除记录"""
-        record = TableData.query.get(record_id)
+        """删除记录 - 只写入删除标记，物理删除由后台清理任务完成"""
+        record = TableData.get_live(record_id)
         if record:
-            db.session.delete(record)
+            GroupSnapshots.capture_rows(TableData.id == record_id)
+            UniversalExcelProcessor._adjust_file_stats(record.table_group_id, record.source_file, -1)
+            record.deleted_at = datetime.utcnow()
             db.session.commit()
             return True
         return False
     
+    @staticmethod
+    def delete_source_file_records(filename):
+        """标记删除指定来源文件的所有数据记录（不提交事务），返回删除的记录数"""
+        ColdStorage.ensure_file_online(filename)
+        GroupSnapshots.capture_rows(TableData.source_file == filename)
+        records_query = TableData.live().filter_by(source_file=filename)
+        UniversalExcelProcessor._remove_records_stats(records_query)
+        return TableData.query.filter(
+            TableData.source_file == filename,
+            TableData.deleted_at.is_(None)
+        ).update({TableData.deleted_at: datetime.utcnow()}, synchronize_session=False)
+    
+    @staticmethod
+    def rename_source_file(old_name, new_name):
+        """修改数据记录的来源文件名（不提交事务），返回受影响的记录数"""
+        ColdStorage.ensure_file_online(old_name)
+        GroupSnapshots.capture_rows(TableData.source_file == old_name)
+        old_stats = GroupFileStats.query.filter_by(source_file=old_name).all()
+        for stats in old_stats:
+            UniversalExcelProcessor._adjust_file_stats(stats.table_group_id, new_name, stats.record_count or 0)
+            UniversalExcelProcessor._adjust_file_stats(stats.table_group_id, old_name, -(stats.record_count or 0))
+        
+        return TableData.query.filter_by(source_file=old_name).update(
+            {TableData.source_file: new_name}, synchronize_session=False
+        )
+    
+    @staticmethod
+    def delete_table_group(group_id):
+        """标记删除表格分组（不提交事务）
+        
+        分组及其数据、表结构、列映射对读取立即不可见，物理删除由后台清理任务完成。
+        """
+        for stats in GroupFileStats.query.filter_by(table_group_id=group_id).all():
+            DataStats.adjust_file(group_id, stats.source_file, stats.record_count or 0, 0)
+        GroupFileStats.query.filter_by(table_group_id=group_id).delete(synchronize_session=False)
+        TableGroup.query.filter_by(id=group_id).update({
+            TableGroup.deleted_at: datetime.utcnow(),
+            TableGroup.version: db.func.coalesce(TableGroup.version, 0) + 1
+        }, synchronize_session=False)
+    
     @staticmethod
     def clear_all_data():
-        """清空所有数据"""
-        TableData.query.delete()
-        TableSchema.query.delete()
+        """清空所有数据、表格分组和上传历史 - 只写入删除标记，物理删除由后台清理任务完成"""
+        now = datetime.utcnow()
+        TableGroup.query.filter(TableGroup.deleted_at.is_(None)).update(
+            {TableGroup.deleted_at: now}, synchronize_session=False
+        )
+        # 未分组的旧版数据没有分组可以标记，逐行标记
+        TableData.query.filter(
+            TableData.table_group_id.is_(None),
+            TableData.deleted_at.is_(None)
+        ).update({TableData.deleted_at: now}, synchronize_session=False)
+        TableSchema.query.filter_by(table_group_id=None).delete(synchronize_session=False)
+        GroupFileStats.query.delete()
+        DataStats.reset()
+        UploadHistory.query.delete()
         db.session.commit()
     
     @staticmethod
-    def add_column(column_name, insert_position=None):
+    def purge_deleted_data():
+        """后台清理任务：分批物理删除已标记删除的记录和分组，并回收 SQLite 空间
+        
+        有快照的已删除分组保留，以便从快照恢复；快照过期删除后再清理。
+        """
+        batch_size = UniversalExcelProcessor.COMPACTION_BATCH_SIZE
+        deleted_groups = db.session.query(TableGroup.id).filter(
+            TableGroup.deleted_at.isnot(None),
+            ~TableGroup.id.in_(GroupSnapshots.group_ids_query())
+        )
+        purged_rows = 0
+        
+        while True:
+            row_ids = [row_id for (row_id,) in db.session.query(TableData.id).filter(db.or_(
+                TableData.deleted_at.isnot(None),
+                TableData.table_group_id.in_(deleted_groups)
+            )).limit(batch_size).all()]
+            if not row_ids:
+                break
+            TableData.query.filter(TableData.id.in_(row_ids)).delete(synchronize_session=False)
+            SearchIndex.remove_rows(row_ids)
+            db.session.commit()
+            purged_rows += len(row_ids)
+            time.sleep(UniversalExcelProcessor.COMPACTION_PAUSE_SECONDS)
+        
+        # 数据已清空的分组，删除其表结构、列映射和分组本身
+        group_ids = [group_id for (group_id,) in deleted_groups.all()]
+        for group_id in group_ids:
+            UniversalExcelProcessor._delete_column_dictionaries(group_id)
+            TableSchema.query.filter_by(table_group_id=group_id).delete(synchronize_session=False)
+            ColumnMapping.query.filter_by(table_group_id=group_id).delete(synchronize_session=False)
+            GroupFileStats.query.filter_by(table_group_id=group_id).delete(synchronize_session=False)
+            GroupArchive.query.filter_by(table_group_id=group_id).delete(synchronize_session=False)
+            SearchIndex.remove_group(group_id)
+            TableGroup.query.filter_by(id=group_id).delete(synchronize_session=False)
+        db.session.commit()
+        
+        if purged_rows or group_ids:
+            print(f"[系统] 后台清理完成，删除 {purged_rows} 条记录，{len(group_ids)} 个分组")
+            incremental_vacuum()
+        return purged_rows
+    
+    # ==================== 分组计数维护 ====================
+    
+    @staticmethod
+    def _adjust_file_stats(table_group_id, source_file, delta, imported=False):
+        """调整来源文件及所属分组的记录数（不提交事务，随数据写入一起提交）"""
+        if not delta and not imported:
+            return
+        
+        stats = GroupFileStats.query.filter_by(table_group_id=table_group_id, source_file=source_file).first()
+        if stats is None:
+            stats = GroupFileStats(table_group_id=table_group_id, source_file=source_file, record_count=0)
+            db.session.add(stats)
+        
+        before = stats.record_count or 0
+        after = max(before + delta, 0)
+        stats.record_count = after
+        DataStats.adjust_file(table_group_id, source_file, before, after)
+        now = datetime.utcnow()
+        if imported:
+            stats.last_import_at = now
+        if after == 0:
+            if stats in db.session.new:
+                db.session.expunge(stats)
+            else:
+                db.session.delete(stats)
+        
+        if table_group_id is None:
+            return
+        
+        values = {
+            TableGroup.record_count: db.func.coalesce(TableGroup.record_count, 0) + (after - before),
+            TableGroup.version: db.func.coalesce(TableGroup.version, 0) + 1
+        }
+        if before == 0 and after > 0:
+            values[TableGroup.source_file_count] = db.func.coalesce(TableGroup.source_file_count, 0) + 1
+        elif before > 0 and after == 0:
+            values[TableGroup.source_file_count] = db.func.coalesce(TableGroup.source_file_count, 0) - 1
+        if imported:
+            values[TableGroup.last_import_at] = now
+            values[TableGroup.last_accessed_at] = now
+        TableGroup.query.filter_by(id=table_group_id).update(values, synchronize_session=False)
+    
+    @staticmethod
+    def _remove_records_stats(records_query):
+        """按即将删除的记录扣减计数（不提交事务）"""
+        counts = records_query.with_entities(
+            TableData.table_group_id, TableData.source_file, db.func.count(TableData.id)
+        ).group_by(TableData.table_group_id, TableData.source_file).all()
+        for group_id, source_file, count in counts:
+            UniversalExcelProcessor._adjust_file_stats(group_id, source_file, -count)
+    
+    @staticmethod
+    def repair_group_counters():
+        """根据实际数据重建分组计数和来源文件统计"""
+        print("[系统] 开始重建分组计数...")
+        ColdStorage.restore_all()
+        GroupFileStats.query.delete()
+        
+        file_counts = TableData.live().with_entities(
+            TableData.table_group_id,
+            TableData.source_file,
+            db.func.count(TableData.id),
+            db.func.max(TableData.created_at)
+        ).group_by(TableData.table_group_id, TableData.source_file).all()
+        
+        group_counters = {}
+        for group_id, source_file, count, last_created in file_counts:
+            db.session.add(GroupFileStats(
+                table_group_id=group_id,
+                source_file=source_file,
+                record_count=count,
+                last_import_at=last_created
+            ))
+            counters = group_counters.setdefault(group_id, {'records': 0, 'files': 0, 'last_import_at': None})
+            counters['records'] += count
+            counters['files'] += 1
+            if last_created and (counters['last_import_at'] is None or last_created > counters['last_import_at']):
+                counters['last_import_at'] = last_created
+        
+        for group in TableGroup.live().all():
+            counters = group_counters.get(group.id, {'records': 0, 'files': 0, 'last_import_at': None})
+            group.record_count = counters['records']
+            group.source_file_count = counters['files']
+            group.last_import_at = counters['last_import_at']
+        
+        DataStats.rebuild()
+        db.session.commit()
+        print(f"[系统] 分组计数重建完成，共 {len(file_counts)} 条来源文件统计")
+        return len(file_counts)
+    
+    @staticmethod
+    def _active_columns_query(table_group_id=None):
+        """活跃列查询，指定分组时限定在该分组内"""
+        query = TableSchema.query.filter_by(is_active=True)
+        if table_group_id is not None:
+            query = query.filter_by(table_group_id=table_group_id)
+        return query
+    
+    @staticmethod
+    def add_column(column_name, insert_position=None, table_group_id=None):
         """添加新列，支持指定位置插入"""
-        existing = TableSchema.query.filter_by(column_name=column_name).first()
+        columns_query = UniversalExcelProcessor._active_columns_query(table_group_id)
+        existing = columns_query.filter_by(column_name=column_name).first()
         if existing:
             return False, "列名已存在"
         
         try:
             if insert_position is None:
                 # 添加到末尾
-                max_order = db.session.query(db.func.max(TableSchema.column_order)).scalar() or 0
+                max_order = columns_query.with_entities(db.func.max(TableSchema.column_order)).scalar() or 0
                 new_order = max_order + 1
             else:
                 # 在指定位置插入，需要调整后续列的顺序
                 new_order = insert_position
                 
                 # 将指定位置及之后的列的order都加1
-                columns_to_update = TableSchema.query.filter(
-                    TableSchema.column_order >= insert_position,
-                    TableSchema.is_active == True
+                columns_to_update = columns_query.filter(
+                    TableSchema.column_order >= insert_position
                 ).all()
                 
                 for col in columns_to_update:
@@ -363,10 +576,12 @@ class UniversalExcelProcessor:
                 column_name=column_name,
                 column_type='text',
                 column_order=new_order,
-                is_active=True
+                is_active=True,
+                table_group_id=table_group_id
             )
             
             db.session.add(new_column)
+            TableGroup.bump_version(table_group_id)
             db.session.commit()
             print(f"[系统] 成功添加列: {column_name} 在位置 {new_order}")
             return True, "列添加成功"
@@ -376,29 +591,29 @@ class UniversalExcelProcessor:
             return False, str(e)
     
     @staticmethod
-    def delete_column(column_name):
-        """删除列"""
-        # 检查是否是最后一列
-        active_columns = TableSchema.query.filter_by(is_active=True).count()
-        if active_columns <= 1:
-            return False, "不能删除最后一列"
+    def delete_column(column_name, table_group_id=None):
+        """删除列 - 仅修改表结构，行数据中的旧值由后台压缩任务清理"""
+        columns_query = UniversalExcelProcessor._active_columns_query(table_group_id)
         
-        # 找到要删除的列
-        column = TableSchema.query.filter_by(column_name=column_name, is_active=True).first()
-        if not column:
+        # 找到要删除的列（未指定分组时删除所有同名列，与旧版行为一致）
+        columns = columns_query.filter_by(column_name=column_name).all()
+        if not columns:
             return False, "列不存在"
         
+        # 检查是否是最后一列
+        for column in columns:
+            remaining = TableSchema.query.filter_by(
+                table_group_id=column.table_group_id,
+                is_active=True
+            ).count()
+            if remaining <= 1:
+                return False, "不能删除最后一列"
+        
         try:
-            # 软删除：设置为非活跃状态
-            column.is_active = False
-            
-            # 从所有数据记录中删除该列的数据
-            all_records = TableData.query.all()
-            for record in all_records:
-                data = record.get_data()
-                if column_name in data:
-                    del data[column_name]
-                    record.set_data(data)
+            # 软删除：设置为非活跃状态，读取时该列数据立即不可见
+            for column in columns:
+                column.is_active = False
+                TableGroup.bump_version(column.table_group_id)
             
             db.session.commit()
             print(f"[系统] 成功删除列: {column_name}")
@@ -409,29 +624,30 @@ class UniversalExcelProcessor:
             return False, str(e)
     
     @staticmethod
-    def rename_column(old_name, new_name):
-        """重命名列"""
+    def rename_column(old_name, new_name, table_group_id=None):
+        """重命名列 - 行数据以列ID为键，只需修改表结构"""
+        columns_query = UniversalExcelProcessor._active_columns_query(table_group_id)
+        
         # 检查旧列是否存在
-        old_column = TableSchema.query.filter_by(column_name=old_name, is_active=True).first()
-        if not old_column:
+        old_columns = columns_query.filter_by(column_name=old_name).all()
+        if not old_columns:
             return False, "原列名不存在"
         
         # 检查新列名是否已存在
-        existing = TableSchema.query.filter_by(column_name=new_name, is_active=True).first()
-        if existing:
-            return False, "新列名已存在"
+        for old_column in old_columns:
+            existing = TableSchema.query.filter_by(
+                table_group_id=old_column.table_group_id,
+                column_name=new_name,
+                is_active=True
+            ).first()
+            if existing:
+                return False, "新列名已存在"
         
         try:
             # 更新列结构
-            old_column.column_name = new_name
-            
-            # 更新所有数据记录中的字段名
-            all_records = TableData.query.all()
-            for record in all_records:
-                data = record.get_data()
-                if old_name in data:
-                    data[new_name] = data.pop(old_name)
-                    record.set_data(data)
+            for old_column in old_columns:
+                old_column.column_name = new_name
+                TableGroup.bump_version(old_column.table_group_id)
             
             db.session.commit()
             print(f"[系统] 成功重命名列: {old_name} -> {new_name}")
@@ -442,11 +658,368 @@ class UniversalExcelProcessor:
             return False, str(e)
     
     @staticmethod
-    def add_row(insert_after_id=None, row_data=None):
+    def compact_deleted_columns():
+        """后台压缩任务：从行数据中物理清除已删除列的值，完成后移除列定义
+        
+        有快照的分组跳过，快照恢复时需要保留已删除列的值和定义。
+        """
+        snapshot_groups = GroupSnapshots.group_ids_query()
+        deleted_columns = TableSchema.query.filter(
+            TableSchema.is_active == False,
+            db.or_(TableSchema.table_group_id.is_(None), ~TableSchema.table_group_id.in_(snapshot_groups))
+        ).all()
+        if not deleted_columns:
+            return 0
+        
+        columns_by_group = {}
+        for column in deleted_columns:
+            columns_by_group.setdefault(column.table_group_id, []).append(column)
+        
+        compacted_rows = 0
+        for group_id, columns in columns_by_group.items():
+            deleted_keys = {str(column.id) for column in columns}
+            column_ids = [column.id for column in columns]
+            last_id = 0
+            
+            while True:
+                records = TableData.query.filter(
+                    TableData.table_group_id == group_id,
+                    TableData.id > last_id
+                ).order_by(TableData.id.asc()).limit(UniversalExcelProcessor.COMPACTION_BATCH_SIZE).all()
+                if not records:
+                    break
+                
+                for record in records:
+                    raw = record.get_raw_data()
+                    if deleted_keys.intersection(raw):
+                        for key in deleted_keys:
+                            raw.pop(key, None)
+                        record.row_data = json.dumps(raw, ensure_ascii=False)
+                        compacted_rows += 1
+                last_id = records[-1].id
+                db.session.commit()
+                time.sleep(UniversalExcelProcessor.COMPACTION_PAUSE_SECONDS)
+            
+            # 列数据已清理完毕，删除列定义和列值字典（期间被恢复的列保留）
+            removed_ids = [column_id for (column_id,) in db.session.query(TableSchema.id).filter(
+                TableSchema.id.in_(column_ids),
+                TableSchema.is_active == False
+            ).all()]
+            if removed_ids:
+                ColumnDictionary.query.filter(ColumnDictionary.column_id.in_(removed_ids)).delete(synchronize_session=False)
+                TableSchema.query.filter(TableSchema.id.in_(removed_ids)).delete(synchronize_session=False)
+            db.session.commit()
+        
+        print(f"[系统] 列压缩完成，清理了 {len(deleted_columns)} 个已删除列，涉及 {compacted_rows} 行")
+        return compacted_rows
+    
+    # ==================== 字典编码 ====================
+    
+    @staticmethod
+    def _dictionary_candidate(distinct_count, row_count):
+        """按行数和不同取值数判断列是否适合字典编码"""
+        cls = UniversalExcelProcessor
+        return (row_count >= cls.DICTIONARY_MIN_ROWS
+                and distinct_count <= cls.DICTIONARY_MAX_VALUES
+                and distinct_count <= row_count * cls.DICTIONARY_MAX_RATIO)
+    
+    @staticmethod
+    def prepare_dictionary_columns(table_group_id, column_values, row_count):
+        """导入前准备字典编码列（提交事务）
+        
+        分组还没有数据时，按本次导入的取值分布选出低基数列启用字典编码；
+        随后为所有字典编码列预先登记本次导入的取值，分批写入行时不再新增字典项。
+        
+        Args:
+            table_group_id: 分组ID
+            column_values (dict): {列名: 本次导入该列的取值集合}
+            row_count (int): 本次导入的行数
+        """
+        cls = UniversalExcelProcessor
+        schemas = cls._active_columns_query(table_group_id).all()
+        
+        # 已归档分组的行不在在线表中，同样视为已有数据
+        has_rows = (TableData.query.filter_by(table_group_id=table_group_id).first() is not None
+                    or GroupArchive.query.filter_by(table_group_id=table_group_id).first() is not None)
+        if not has_rows:
+            for schema in schemas:
+                values = column_values.get(schema.column_name)
+                if values is not None and not schema.is_dictionary and cls._dictionary_candidate(len(values), row_count):
+                    schema.is_dictionary = True
+                    print(f"[系统] 列 {schema.column_name} 启用字典编码，{len(values)} 个不同取值")
+        
+        codec = RowCodec(schemas)
+        for name, values in column_values.items():
+            if codec.is_dictionary(name):
+                key = codec.ids[name]
+                for value in sorted(values):
+                    codec.code_for(key, value)
+        db.session.commit()
+    
+    @staticmethod
+    def dictionary_encode_group(table_group_id):
+        """为已有数据的分组选出低基数列并将其行数据改写为 [编码]，返回启用字典编码的列数"""
+        cls = UniversalExcelProcessor
+        schemas = cls._active_columns_query(table_group_id).all()
+        plain_keys = {str(schema.id): schema for schema in schemas if not schema.is_dictionary}
+        if not plain_keys:
+            return 0
+        
+        # 第一遍：统计各列不同取值
+        distinct_values = {key: set() for key in plain_keys}
+        row_count = 0
+        last_id = 0
+        while True:
+            rows = db.session.query(TableData.id, TableData.row_data).filter(
+                TableData.table_group_id == table_group_id,
+                TableData.id > last_id
+            ).order_by(TableData.id.asc()).limit(cls.COMPACTION_BATCH_SIZE).all()
+            if not rows:
+                break
+            for row_id, row_data in rows:
+                raw = json.loads(row_data) if row_data else {}
+                for key, values in list(distinct_values.items()):
+                    value = raw.get(key)
+                    if value is not None:
+                        values.add(RowCodec.value_key(value))
+                        if len(values) > cls.DICTIONARY_MAX_VALUES:
+                            del distinct_values[key]
+            row_count += len(rows)
+            last_id = rows[-1][0]
+        
+        selected = [plain_keys[key] for key, values in distinct_values.items()
+                    if cls._dictionary_candidate(len(values), row_count)]
+        if not selected:
+            return 0
+        
+        for schema in selected:
+            schema.is_dictionary = True
+        codec = RowCodec.for_group(table_group_id)
+        for schema in selected:
+            for text in sorted(distinct_values[str(schema.id)]):
+                codec.code_for(str(schema.id), json.loads(text))
+        db.session.commit()
+        
+        # 第二遍：分批改写行数据
+        selected_keys = [str(schema.id) for schema in selected]
+        last_id = 0
+        while True:
+            records = TableData.query.filter(
+                TableData.table_group_id == table_group_id,
+                TableData.id > last_id
+            ).order_by(TableData.id.asc()).limit(cls.COMPACTION_BATCH_SIZE).all()
+            if not records:
+                break
+            for record in records:
+                raw = record.get_raw_data()
+                changed = False
+                for key in selected_keys:
+                    value = raw.get(key)
+                    if value is not None and not RowCodec.is_code(value):
+                        raw[key] = [codec.code_for(key, value)]
+                        changed = True
+                if changed:
+                    record.row_data = json.dumps(raw, ensure_ascii=False)
+            last_id = records[-1].id
+            db.session.commit()
+            time.sleep(cls.COMPACTION_PAUSE_SECONDS)
+        
+        print(f"[系统] 分组 {table_group_id} 启用字典编码: {[schema.column_name for schema in selected]}")
+        return len(selected)
+    
+    @staticmethod
+    def dictionary_encode_all():
+        """为所有分组的已有数据启用字典编码，返回启用字典编码的列数"""
+        total = 0
+        for group in TableGroup.live().all():
+            ColdStorage.ensure_online(group.id, touch=False)
+            total += UniversalExcelProcessor.dictionary_encode_group(group.id)
+        print(f"[系统] 字典编码完成，共 {total} 列")
+        return total
+    
+    @staticmethod
+    def _delete_column_dictionaries(table_group_id):
+        """删除分组所有列的列值字典（不提交事务）"""
+        column_ids = db.session.query(TableSchema.id).filter(TableSchema.table_group_id == table_group_id)
+        ColumnDictionary.query.filter(ColumnDictionary.column_id.in_(column_ids)).delete(synchronize_session=False)
+    
+    @staticmethod
+    def migrate_dictionary_codes():
+        """将字典编码的旧存储格式转换为当前格式，返回转换的行数
+        
+        旧版字典取值一律转成文本保存，改为保存为 JSON 文本；行数据中的裸整数编码改为 [编码]，
+        与取值本身为整数的情况区分开。归档段和快照中的旧格式行在恢复或读取时再转换。
+        """
+        for entry in ColumnDictionary.query.filter(ColumnDictionary.value_format.is_(None)).all():
+            entry.value = entry.get_value()
+            entry.value_format = ColumnDictionary.VALUE_FORMAT_JSON
+        db.session.commit()
+        
+        legacy_query = TableData.query.filter(TableData.row_format == TableData.ROW_FORMAT_COLUMN_ID)
+        if legacy_query.first() is None:
+            return 0
+        
+        print("[系统] 开始转换字典编码格式...")
+        dictionary_keys = {}
+        for schema_id, group_id in db.session.query(TableSchema.id, TableSchema.table_group_id).filter(
+            TableSchema.is_dictionary == True
+        ).all():
+            dictionary_keys.setdefault(group_id, set()).add(str(schema_id))
+        
+        migrated = 0
+        for group_id, keys in dictionary_keys.items():
+            group_query = legacy_query.filter(TableData.table_group_id == group_id)
+            while True:
+                records = group_query.order_by(TableData.id.asc()).limit(UniversalExcelProcessor.COMPACTION_BATCH_SIZE).all()
+                if not records:
+                    break
+                for record in records:
+                    raw = RowCodec.mark_codes(record.get_raw_data(), keys)
+                    record.row_data = json.dumps(raw, ensure_ascii=False)
+                    record.row_format = TableData.ROW_FORMAT_MARKED_CODES
+                migrated += len(records)
+                db.session.commit()
+        
+        # 其余行所在分组没有字典编码列，行数据不变
+        legacy_query.update({TableData.row_format: TableData.ROW_FORMAT_MARKED_CODES}, synchronize_session=False)
+        db.session.commit()
+        print(f"[系统] 字典编码格式转换完成，共 {migrated} 行")
+        return migrated
+    
+    @staticmethod
+    def migrate_legacy_rows():
+        """将旧版以列名为键的行数据转换为以列ID为键
+        
+        旧版中新增的列可能没有关联分组、重命名也只修改了其中一个分组的列，行数据中的列名
+        在所属分组中找不到活跃列时先为该分组补建列，不丢弃数据。
+        """
+        legacy_query = TableData.query.filter(TableData.row_format.is_(None))
+        if legacy_query.first() is None:
+            return 0
+        
+        print("[系统] 开始转换旧版行数据格式...")
+        codecs = {}
+        migrated = 0
+        while True:
+            records = legacy_query.order_by(TableData.id.asc()).limit(UniversalExcelProcessor.COMPACTION_BATCH_SIZE).all()
+            if not records:
+                break
+            for record in records:
+                group_id = record.table_group_id
+                if group_id not in codecs:
+                    codecs[group_id] = RowCodec.for_group(group_id)
+                # 旧数据以列名为键，直接按列名编码
+                raw_data = record.get_raw_data()
+                missing = [name for name in raw_data if name not in codecs[group_id].ids]
+                if missing:
+                    codecs[group_id] = UniversalExcelProcessor._add_legacy_columns(group_id, missing)
+                record.set_data(raw_data, codecs[group_id])
+                migrated += 1
+            db.session.commit()
+        
+        print(f"[系统] 旧版行数据转换完成，共 {migrated} 行")
+        return migrated
+    
+    @staticmethod
+    def _add_legacy_columns(table_group_id, column_names):
+        """为分组补建旧版行数据中出现、但分组没有的活跃列（追加到末尾，不提交事务），返回新的编解码器"""
+        max_order = db.session.query(db.func.max(TableSchema.column_order)).filter(
+            TableSchema.table_group_id == table_group_id,
+            TableSchema.is_active == True
+        ).scalar() or 0
+        for offset, column_name in enumerate(column_names, 1):
+            db.session.add(TableSchema(
+                column_name=column_name,
+                column_type='text',
+                column_order=max_order + offset,
+                is_active=True,
+                table_group_id=table_group_id
+            ))
+        db.session.flush()
+        print(f"[警告] 分组 {table_group_id} 的旧版行数据包含不存在的列，已补建: {', '.join(column_names)}")
+        return RowCodec.for_group(table_group_id)
+    
+    @staticmethod
+    def next_sort_key(table_group_id):
+        """分组末尾的下一个排序键"""
+        max_key = db.session.query(db.func.max(TableData.sort_key)).filter(
+            TableData.table_group_id == table_group_id
+        ).scalar()
+        return (max_key or 0) + TableData.SORT_KEY_GAP
+    
+    @staticmethod
+    def sort_key_after(ref_row):
+        """紧跟在 ref_row 之后的排序键，空位用尽时先重新分配分组的排序键"""
+        for _ in range(2):
+            next_key = db.session.query(db.func.min(TableData.sort_key)).filter(
+                TableData.table_group_id == ref_row.table_group_id,
+                TableData.sort_key > ref_row.sort_key
+            ).scalar()
+            if next_key is None:
+                return ref_row.sort_key + TableData.SORT_KEY_GAP
+            if next_key - ref_row.sort_key >= 2:
+                return (ref_row.sort_key + next_key) // 2
+            UniversalExcelProcessor.rebalance_sort_keys(ref_row.table_group_id)
+        raise Exception("无法为新行分配排序键")
+    
+    @staticmethod
+    def rebalance_sort_keys(table_group_id):
+        """按当前顺序为分组内所有行重新分配等间隔的排序键（不提交事务）
+
+        分组有快照时先复制各行的旧内容，快照读取和恢复统一使用旧的排序键。
+        """
+        print(f"[系统] 重新分配分组 {table_group_id} 的排序键")
+        GroupSnapshots.capture_rows(TableData.table_group_id == table_group_id)
+        rows = db.session.query(TableData.id).filter(
+            TableData.table_group_id == table_group_id
+        ).order_by(*TableData.ordering()).all()
+        db.session.bulk_update_mappings(TableData, [
+            {'id': row_id, 'sort_key': (index + 1) * TableData.SORT_KEY_GAP}
+            for index, (row_id,) in enumerate(rows)
+        ])
+        db.session.flush()
+        db.session.expire_all()
+    
+    @staticmethod
+    def backfill_sort_keys():
+        """为旧数据补齐排序键，保持原有的创建时间顺序"""
+        missing = db.session.query(TableData.table_group_id).filter(
+            TableData.sort_key.is_(None)
+        ).distinct().all()
+        if not missing:
+            return 0
+        
+        updated = 0
+        for (group_id,) in missing:
+            next_key = UniversalExcelProcessor.next_sort_key(group_id)
+            rows = db.session.query(TableData.id).filter(
+                TableData.table_group_id == group_id,
+                TableData.sort_key.is_(None)
+            ).order_by(TableData.created_at.asc(), TableData.id.asc()).all()
+            mappings = []
+            for (row_id,) in rows:
+                mappings.append({'id': row_id, 'sort_key': next_key})
+                next_key += TableData.SORT_KEY_GAP
+            db.session.bulk_update_mappings(TableData, mappings)
+            db.session.commit()
+            updated += len(mappings)
+        
+        print(f"[系统] 已为 {updated} 行旧数据补齐排序键")
+        return updated
+    
+    @staticmethod
+    def add_row(insert_after_id=None, row_data=None, table_group_id=None):
         """添加新行，支持指定位置插入"""
         try:
+            ref_row = TableData.get_live(insert_after_id) if insert_after_id else None
+            if table_group_id is None and ref_row:
+                # 新行与参考行属于同一分组
+                table_group_id = ref_row.table_group_id
+            # 已归档的分组先恢复，否则排序键只参照在线的行
+            ColdStorage.ensure_online(table_group_id, touch=False)
+            
             # 获取当前表格结构
-            schema = UniversalExcelProcessor.get_current_schema()
+            schema = UniversalExcelProcessor.get_current_schema(table_group_id)
             
             if not schema:
                 return False, "没有可用的表格结构", None
@@ -455,25 +1028,24 @@ class UniversalExcelProcessor:
             if row_data is None:
                 row_data = {col: '' for col in schema}
             
-            # 创建新的数据记录
+            # 创建新的数据记录，指定了插入位置时排序键取参考行与下一行之间的值
             table_data = TableData()
             table_data.source_file = '手动添加'
-            table_data.set_data(row_data)
+            table_data.table_group_id = table_group_id
+            if ref_row and ref_row.table_group_id == table_group_id:
+                table_data.sort_key = UniversalExcelProcessor.sort_key_after(ref_row)
+            else:
+                table_data.sort_key = UniversalExcelProcessor.next_sort_key(table_group_id)
+            codec = RowCodec.for_group(table_group_id)
+            table_data.set_data(row_data, codec)
             
             # 提交到数据库
             db.session.add(table_data)
+            db.session.flush()
+            SearchIndex.index_records([table_data], codec)
+            UniversalExcelProcessor._adjust_file_stats(table_group_id, table_data.source_file, 1)
             db.session.commit()
             
-            # 如果指定了插入位置，我们通过设置创建时间来影响排序
-            if insert_after_id:
-                # 获取参考行的时间
-                ref_row = TableData.query.get(insert_after_id)
-                if ref_row:
-                    # 设置新行的创建时间稍晚于参考行，但早于后续行
-                    from datetime import datetime, timedelta
-                    table_data.created_at = ref_row.created_at + timedelta(microseconds=1)
-                    db.session.commit()
-            
             print(f"[系统] 成功添加新行，ID: {table_data.id}, 插入在ID {insert_after_id} 之后")
             return True, "新行添加成功", table_data.id
             
@@ -698,7 +1270,7 @@ class UniversalExcelProcessor:
         print(f"[系统] 生成的指纹: {current_fingerprint}")
         
         # 首先查找完全匹配的分组 - 使用指纹和列数双重验证
-        exact_matches = TableGroup.query.filter_by(
+        exact_matches = TableGroup.live().filter_by(
             schema_fingerprint=current_fingerprint,
             column_count=len(cleaned_columns)
         ).all()
@@ -712,13 +1284,8 @@ class UniversalExcelProcessor:
                     duplicate_group = exact_matches[i]
                     print(f"[系统] 合并重复分组 {duplicate_group.id} 到 {main_group.id}")
                     
-                    # 迁移数据
-                    data_records = TableData.query.filter_by(table_group_id=duplicate_group.id).all()
-                    for record in data_records:
-                        record.table_group_id = main_group.id
-                    
-                    # 删除重复分组
-                    db.session.delete(duplicate_group)
+                    # 迁移数据并删除重复分组
+                    cls._merge_group_into(duplicate_group, main_group)
                 
                 db.session.commit()
                 print(f"[系统] 重复分组合并完成，使用分组: {main_group.group_name}")
@@ -733,6 +1300,7 @@ class UniversalExcelProcessor:
             TableSchema, TableGroup.id == TableSchema.table_group_id
         ).filter(
             TableGroup.column_count == len(cleaned_columns),
+            TableGroup.deleted_at.is_(None),
             TableSchema.is_active == True
         ).order_by(TableGroup.id, TableSchema.column_order).all()
         
@@ -785,7 +1353,7 @@ class UniversalExcelProcessor:
             # 使用事务确保原子性
             with cls.database_transaction() as session:
                 # 再次检查是否已存在相同指纹的分组（防止并发创建）
-                fingerprint_group = TableGroup.query.filter_by(
+                fingerprint_group = TableGroup.live().filter_by(
                     schema_fingerprint=new_fingerprint,
                     column_count=len(cleaned_columns)
                 ).first()
@@ -803,7 +1371,7 @@ class UniversalExcelProcessor:
                 import re
                 merge_table_pattern = re.compile(r'^合并表(\d+)$')
                 while True:
-                    existing_group = TableGroup.query.filter_by(group_name=group_name).first()
+                    existing_group = TableGroup.live().filter_by(group_name=group_name).first()
                     if not existing_group:
                         break
 
@@ -812,7 +1380,7 @@ class UniversalExcelProcessor:
                     if m:
                         try:
                             # 收集所有已存在的“合并表<number>”序号
-                            all_names = [g.group_name for g in TableGroup.query.all() if g.group_name]
+                            all_names = [g.group_name for g in TableGroup.live().all() if g.group_name]
                             used = set()
                             for nm in all_names:
                                 mm = merge_table_pattern.match(nm.strip())
@@ -863,6 +1431,36 @@ class UniversalExcelProcessor:
                 print(f"[系统] 创建新表格分组: {group_name}")
                 return group
     
+    @staticmethod
+    def _merge_group_into(source_group, target_group):
+        """将 source_group 的数据迁移到 target_group 并删除 source_group（不提交事务）
+        
+        行数据以列ID为键，两个分组的列ID不同，需要按列名重新编码。
+        """
+        ColdStorage.restore_group(source_group.id, commit=False)
+        GroupSnapshots.drop_for_group(source_group.id)
+        source_codec = RowCodec.for_group(source_group.id)
+        target_codec = RowCodec.for_group(target_group.id)
+        
+        data_records = TableData.query.filter_by(table_group_id=source_group.id).all()
+        GroupSnapshots.mark_rows_added(target_group.id, [record.id for record in data_records])
+        for record in data_records:
+            record.set_data(record.get_data(source_codec), target_codec)
+            record.table_group_id = target_group.id
+        # 源分组从归档恢复时可能被标记为未索引，按数据库中的当前状态合并
+        source_indexed = db.session.query(TableGroup.search_indexed).filter(TableGroup.id == source_group.id).scalar()
+        SearchIndex.move_group(source_group.id, target_group.id)
+        target_group.search_indexed = bool(target_group.search_indexed and source_indexed)
+        
+        for stats in GroupFileStats.query.filter_by(table_group_id=source_group.id).all():
+            UniversalExcelProcessor._adjust_file_stats(target_group.id, stats.source_file, stats.record_count or 0)
+            DataStats.adjust_file(source_group.id, stats.source_file, stats.record_count or 0, 0)
+            db.session.delete(stats)
+        
+        UniversalExcelProcessor._delete_column_dictionaries(source_group.id)
+        TableSchema.query.filter_by(table_group_id=source_group.id).delete(synchronize_session=False)
+        db.session.delete(source_group)
+    
     @staticmethod
     def create_column_mappings(group, original_columns, target_columns, filename, similarity_score):
         """创建列名映射关系"""
@@ -969,7 +1567,7 @@ class UniversalExcelProcessor:
                 
                 # 更新分组的置信度（基于历史平均相似度）
                 current_confidence = group.confidence_score or 1.0
-                current_file_count = len(group.data_records) + 1  # 包括即将添加的文件
+                current_file_count = (group.source_file_count or 0) + 1  # 包括即将添加的文件
                 
                 # 计算新的置信度：加权平均
                 new_confidence = ((current_confidence * (current_file_count - 1)) + similarity) / current_file_count
@@ -999,7 +1597,22 @@ class UniversalExcelProcessor:
             # 更新进度
             cls._update_progress('数据导入', 60, '正在导入数据...')
             
+            # 已归档的分组先恢复，排序键和字典编码都要基于分组的全部行
+            ColdStorage.ensure_online(group.id, touch=False)
+            
+            # 字典编码：新分组按取值分布选列，并预先登记本次导入的取值
+            column_values = {}
+            for orig_col, target_col in zip(original_columns, target_columns):
+                if orig_col in df.columns:
+                    series = df[orig_col]
+                    column_values[target_col] = set(series.dropna().astype(str))
+                    if series.isna().any():
+                        column_values[target_col].add("")
+            cls.prepare_dictionary_columns(group.id, column_values, len(df))
+            
             # 导入数据 - 分批处理优化内存使用
+            codec = RowCodec.for_group(group.id)
+            next_sort_key = cls.next_sort_key(group.id)
             imported_count = 0
             batch_size = 1000  # 每批处理1000条记录
             batch_data = []
@@ -1028,7 +1641,9 @@ class UniversalExcelProcessor:
                 table_data = TableData()
                 table_data.source_file = filename
                 table_data.table_group_id = group.id
-                table_data.set_data(row_dict)
+                table_data.sort_key = next_sort_key
+                table_data.set_data(row_dict, codec)
+                next_sort_key += TableData.SORT_KEY_GAP
                 
                 batch_data.append(table_data)
                 
@@ -1036,6 +1651,9 @@ class UniversalExcelProcessor:
                 if len(batch_data) >= batch_size or index == total_rows - 1:
                     try:
                         db.session.add_all(batch_data)
+                        db.session.flush()
+                        SearchIndex.index_records(batch_data, codec)
+                        cls._adjust_file_stats(group.id, filename, len(batch_data), imported=True)
                         db.session.commit()
                         imported_count += len(batch_data)
                         print(f"[系统] 已导入 {imported_count} 条数据")
@@ -1047,6 +1665,9 @@ class UniversalExcelProcessor:
                         for data in batch_data:
                             try:
                                 db.session.add(data)
+                                db.session.flush()
+                                SearchIndex.index_records([data], codec)
+                                cls._adjust_file_stats(group.id, filename, 1, imported=True)
                                 db.session.commit()
                                 imported_count += 1
                             except Exception as e2:
@@ -1148,7 +1769,7 @@ class UniversalExcelProcessor:
         try:
             from models.database import TableGroup
             import re
-            existing_names = [g.group_name for g in TableGroup.query.all() if g.group_name]
+            existing_names = [g.group_name for g in TableGroup.live().all() if g.group_name]
             pattern = re.compile(r'^合并表(\d+)$')
             used_numbers = set()
             for name in existing_names:
@@ -1199,7 +1820,7 @@ class UniversalExcelProcessor:
         
         try:
             # 获取所有分组，按指纹分组
-            all_groups = TableGroup.query.all()
+            all_groups = TableGroup.live().all()
             fingerprint_groups = {}
             
             for group in all_groups:
@@ -1214,19 +1835,14 @@ class UniversalExcelProcessor:
                     print(f"[系统] 发现指纹 {fingerprint[:10]}... 有 {len(groups)} 个重复分组")
                     
                     # 选择记录数最多的作为主分组
-                    main_group = max(groups, key=lambda g: len(g.data_records))
+                    main_group = max(groups, key=lambda g: g.record_count or 0)
                     
                     for group in groups:
                         if group.id != main_group.id:
                             print(f"[系统] 合并分组 {group.group_name} (ID: {group.id}) 到 {main_group.group_name} (ID: {main_group.id})")
                             
-                            # 迁移数据
-                            data_records = TableData.query.filter_by(table_group_id=group.id).all()
-                            for record in data_records:
-                                record.table_group_id = main_group.id
-                            
-                            # 删除重复分组
-                            db.session.delete(group)
+                            # 迁移数据并删除重复分组
+                            UniversalExcelProcessor._merge_group_into(group, main_group)
                             cleaned_count += 1
             
             if cleaned_count > 0:
@@ -1251,8 +1867,8 @@ class UniversalExcelProcessor:
         
         try:
             # 1. 检查数据库连接
-            total_groups = TableGroup.query.count()
-            total_data = TableData.query.count()
+            total_groups = TableGroup.live().count()
+            total_data = TableData.live().count()
             print(f"✅ [数据库] 连接正常，共 {total_groups} 个分组，{total_data} 条数据")
             
             # 2. 检查重复分组
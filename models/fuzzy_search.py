@@ -0,0 +1,177 @@
+"""
+模糊搜索
+查找单元格取值与关键词的编辑距离不超过 k 的行（容忍错别字和不一致的写法），按相似度排序。
+候选取值来自模糊搜索词表的二元组计数过滤，按编辑距离校验后再由全局搜索索引找到所在行；
+安装 pypinyin 时中文取值和关键词同时按拼音比较
+"""
+
+from models.database import db, TableData, TableSchema, TableGroup, SearchDocument, RowCodec
+from models.cold_storage import ColdStorage
+from models.search_index import SearchIndex
+from models.global_search import GlobalSearch
+
+
+class FuzzySearch(GlobalSearch):
+    """跨分组的模糊搜索
+
+    匹配记录在全局搜索记录的基础上增加 _similarity（1 - 编辑距离 / 较长一方的长度）和
+    _matched_value（最相似的单元格取值），按相似度从高到低排序，相似度相同时按分组顺序和显示顺序。
+    未建立搜索索引的分组（后台任务重建中）不参与模糊搜索。
+    """
+
+    MAX_DISTANCE = 3                 # 允许的最大编辑距离
+    MAX_VALUES = 100                 # 参与查找所在行的最相似取值数
+    MAX_RESULTS = 1000               # 返回的最多记录数
+    MAX_CANDIDATE_ROWS = 20000       # 由索引找到、逐行校验取值的候选行上限
+
+    def __init__(self, search_term, max_distance=None):
+        """
+        Args:
+            search_term (str): 关键词
+            max_distance (int): 最大编辑距离，为空时按关键词长度确定（5 个字符以内 1，10 个以内 2，更长 3）；
+                不超过关键词长度的一半，保证二元组计数过滤有效
+
+        Raises:
+            ValueError: 关键词过长
+        """
+        super().__init__(search_term)
+        self.key = search_term.strip().lower()
+        if len(self.key) > SearchIndex.MAX_TERM_LENGTH:
+            raise ValueError(f"模糊搜索的关键词不能超过 {SearchIndex.MAX_TERM_LENGTH} 个字符")
+        if max_distance is None:
+            max_distance = 1 if len(self.key) <= 5 else 2 if len(self.key) <= 10 else 3
+        self.max_distance = max(0, min(int(max_distance), self.MAX_DISTANCE, len(self.key) // 2))
+        self.incomplete = False
+
+    def matched_values(self):
+        """编辑距离不超过上限的取值，返回 [(取值, 比较键, 编辑距离, 相似度)]，按相似度从高到低"""
+        best = {}
+        for key in SearchIndex.term_keys(self.key):
+            terms, incomplete = SearchIndex.fuzzy_terms(key, self.max_distance)
+            self.incomplete = self.incomplete or incomplete
+            for term_key, value in terms:
+                distance = self.distance(key, term_key, self.max_distance)
+                if distance > self.max_distance:
+                    continue
+                similarity = round(1 - distance / max(len(key), len(term_key), 1), 4)
+                if value not in best or similarity > best[value][3]:
+                    best[value] = (value, term_key, distance, similarity)
+        return sorted(best.values(), key=lambda item: (-item[3], item[0]))
+
+    def run(self, limit=None):
+        """执行模糊搜索，返回 (匹配记录列表, 涉及的列名集合, 命中的分组数, 匹配的取值列表)
+
+        匹配的取值为 [{'value', 'distance', 'similarity'}]，最多 MAX_VALUES 个。
+        """
+        limit = min(limit or self.MAX_RESULTS, self.MAX_RESULTS)
+        values = self.matched_values()
+        if len(values) > self.MAX_VALUES:
+            values = values[:self.MAX_VALUES]
+            self.incomplete = True
+        similarity = {value: score for value, _, _, score in values}
+        matched_terms = [{'value': value, 'distance': distance, 'similarity': score}
+                         for value, _, distance, score in values]
+        if not values:
+            return [], set(), 0, matched_terms
+
+        # 由全局搜索索引找到包含这些取值的行，再按单元格取值校验；按相似度从高到低逐个取值查找，
+        # 候选行在数据库中按剩余额度限量读取，达到 MAX_CANDIDATE_ROWS 时停止
+        rows_by_group = {}
+        seen = set()
+        for value in similarity:
+            remaining = self.MAX_CANDIDATE_ROWS - len(seen)
+            hits = db.session.query(SearchDocument.table_group_id, SearchDocument.row_id).filter(
+                SearchDocument.row_id.in_(SearchIndex.row_ids(value))
+            ).limit(remaining + 1).all()
+            for group_id, row_id in hits[:remaining]:
+                if row_id not in seen:
+                    seen.add(row_id)
+                    rows_by_group.setdefault(group_id, []).append(row_id)
+            if len(hits) > remaining:
+                self.incomplete = True
+                break
+
+        # (相似度, 分组顺序, 排序键, 行ID, 分组业务列, 匹配记录)
+        matches = []
+        for order, group in enumerate(self.groups):
+            if not group.search_indexed or group.id not in rows_by_group:
+                continue
+            try:
+                for score, sort_key, row_id, group_columns, record in self._group_matches(
+                    group, rows_by_group[group.id], similarity
+                ):
+                    matches.append((score, order, sort_key, row_id, group_columns, record))
+            except Exception as e:
+                print(f"[警告] 模糊搜索表格组 {group.group_name} 时出错: {str(e)}")
+
+        matches.sort(key=lambda match: (-match[0],) + match[1:4])
+        if len(matches) > limit:
+            matches = matches[:limit]
+            self.incomplete = True
+        records = []
+        columns = set()
+        for match in matches:
+            records.append(match[5])
+            columns.update(match[4])
+        return records, columns, len({record['_group_id'] for record in records}), matched_terms
+
+    @property
+    def unindexed_groups(self):
+        """未建立搜索索引、不参与模糊搜索的分组名称"""
+        return [group.group_name for group in self.groups if not group.search_indexed]
+
+    def _group_matches(self, group, row_ids, similarity):
+        """分组中单元格取值在 similarity 中的行，返回 [(相似度, 排序键, 行ID, 分组业务列, 匹配记录)]"""
+        if group.archived_at is not None:
+            ColdStorage.ensure_online(group.id, touch=False)
+            # 恢复时行ID可能改变，索引中的行ID不再可靠
+            if not db.session.query(TableGroup.search_indexed).filter(TableGroup.id == group.id).scalar():
+                return []
+
+        schemas = TableSchema.query.filter_by(table_group_id=group.id, is_active=True).order_by(TableSchema.column_order).all()
+        group_columns = [s.column_name for s in schemas if s.column_name not in self.SYSTEM_FIELDS]
+        codec = RowCodec(schemas)
+
+        matches = []
+        for start in range(0, len(row_ids), self.LOAD_CHUNK_SIZE):
+            for record in TableData.query.filter(
+                TableData.id.in_(row_ids[start:start + self.LOAD_CHUNK_SIZE]),
+                TableData.table_group_id == group.id,
+                TableData.deleted_at.is_(None)
+            ).all():
+                record_data = record.to_dict(codec)
+                scores = {col: similarity.get(str(record_data.get(col)).lower())
+                          for col in group_columns if record_data.get(col)}
+                scores = {col: score for col, score in scores.items() if score is not None}
+                if not scores:
+                    continue
+                best_column = max(scores, key=lambda col: scores[col])
+                matched_record = self._record(group, group_columns, record, record_data, list(scores))
+                matched_record['_similarity'] = scores[best_column]
+                matched_record['_matched_value'] = record_data.get(best_column)
+                matches.append((scores[best_column], record.sort_key or 0, record.id, group_columns, matched_record))
+        return matches
+
+    @staticmethod
+    def distance(a, b, limit):
+        """编辑距离（插入、删除、替换），超过 limit 时返回 limit + 1；只计算对角线两侧 limit 宽的带状区域"""
+        if abs(len(a) - len(b)) > limit:
+            return limit + 1
+        if len(a) > len(b):
+            a, b = b, a
+        over = limit + 1
+        previous = [j if j <= limit else over for j in range(len(b) + 1)]
+        for i in range(1, len(a) + 1):
+            current = [over] * (len(b) + 1)
+            if i <= limit:
+                current[0] = i
+            row_best = current[0]
+            for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+                cost = 0 if a[i - 1] == b[j - 1] else 1
+                value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+                current[j] = value if value <= limit else over
+                row_best = min(row_best, current[j])
+            if row_best > limit:
+                return over
+            previous = current
+        return previous[len(b)]
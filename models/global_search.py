@@ -0,0 +1,369 @@
+"""
+全局搜索
+在所有分组中查找包含关键词的行（不区分大小写的子串匹配），已建立搜索索引的分组只读取
+索引给出的候选行并逐行校验，未索引的分组逐行扫描。
+使用查询语言（列限定、比较、AND / OR / NOT，见 SearchQuery）时，查询按分组编译为数据库条件，
+已索引的分组再以索引候选行缩小范围。
+分页搜索按分组顺序逐行产生匹配记录，取满一页即停止，不读取之后的分组和行；
+完整搜索可由线程池并行执行（大分组按行ID区间拆分），超过时限时返回已完成部分的结果
+"""
+
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from models.database import db, TableData, TableSchema, TableGroup, SearchDocument, RowCodec
+from models.cold_storage import ColdStorage
+from models.search_index import SearchIndex
+from models.search_query import SearchQuery
+from models.group_query import GroupDataQuery
+
+
+class GlobalSearch:
+    """跨分组的关键词搜索
+
+    每条匹配记录包含分组的业务列，以及来源信息 _source_table、_source_file，
+    定位信息 _group_id、_row_id 和命中的列 _matched_columns。
+    分组按更新时间倒序，分组内按显示顺序；分页游标为上一页最后一条记录的 "分组ID:排序键:行ID"。
+    """
+
+    SYSTEM_FIELDS = {'id', 'source_file', 'created_at', 'updated_at', 'table_group_id'}  # 不参与搜索和显示
+    LOAD_CHUNK_SIZE = 500            # 读取行数据的批次大小
+    PARTITION_ROWS = 20000           # 并行搜索时单个任务读取的最多行数，更大的分组按行ID区间拆分
+
+    def __init__(self, search_term):
+        self.search_term = search_term
+        self.groups = TableGroup.live().order_by(TableGroup.updated_at.desc(), TableGroup.id.desc()).all()
+        self.query = SearchQuery(search_term, self._column_names())
+        # 单个关键词按索引候选行逐行校验；查询语言按条件在数据库中执行，由索引候选行缩小范围
+        self.term = self.query.plain_term.lower() if self.query.plain_term is not None else None
+        if self.term is not None:
+            self.restriction = SearchDocument.row_id.in_(SearchIndex.row_ids(self.term))
+        else:
+            self.restriction = self.query.index_criterion(SearchDocument.row_id)
+        self._candidates = None
+        self._chunk_size = self.LOAD_CHUNK_SIZE
+
+    @property
+    def versions(self):
+        """参与搜索的各分组的版本 {分组ID: (创建时间, 数据版本, 更新时间)}，任一分组写入后随之改变（结果缓存的校验依据）"""
+        return {group.id: (group.created_at, group.version or 0, group.updated_at) for group in self.groups}
+
+    @property
+    def candidates(self):
+        """各分组的索引候选行数 {分组ID: 候选行数}（首次使用时在数据库中计数，不读取行ID）"""
+        if self._candidates is None:
+            self._candidates = {}
+            if self.groups and self.restriction is not None:
+                self._candidates = dict(db.session.query(
+                    SearchDocument.table_group_id, db.func.count(SearchDocument.row_id)
+                ).filter(self.restriction).group_by(SearchDocument.table_group_id).all())
+        return self._candidates
+
+    def run(self):
+        """执行完整搜索（用于导出），返回 (匹配记录列表, 涉及的列名集合, 命中的分组数)"""
+        records = []
+        columns = set()
+        group_hits = {}
+        for group_columns, record, _ in self.iter_matches():
+            records.append(record)
+            columns.update(group_columns)
+            group_hits[record['_group_id']] = group_hits.get(record['_group_id'], 0) + 1
+        for group in self.groups:
+            if group.id in group_hits:
+                print(f"[系统] 在表格组 '{group.group_name}' 中找到 {group_hits[group.id]} 条匹配记录")
+        return records, columns, len(group_hits)
+
+    def run_parallel(self, app, workers=4, timeout=None):
+        """用线程池执行完整搜索，返回 (匹配记录列表, 涉及的列名集合, 命中的分组数, 未完成的分组名称列表)
+
+        主线程先确定需要读取的分组并恢复其中已归档的分组，再将分组（行数超过 PARTITION_ROWS 的
+        按行ID区间拆分）分给工作线程，每个工作线程在独立的应用上下文中使用自己的数据库会话和连接。
+        结果按分组顺序合并，分组内按显示顺序；超过 timeout 秒仍未完成的任务被放弃，
+        其所在分组列入未完成列表，已完成部分的结果照常返回。
+
+        Args:
+            app: Flask应用，工作线程在其应用上下文中执行
+            workers (int): 工作线程数
+            timeout (float): 时限秒数，None 表示等待全部完成
+        """
+        prepared = []
+        for group in self.groups:
+            try:
+                indexed = self._prepare_group(group)
+            except Exception as e:
+                print(f"[警告] 搜索表格组 {group.group_name} 时出错: {str(e)}")
+                continue
+            if indexed is not None:
+                prepared.append((group.id, group.group_name, indexed))
+        if self._restricted:
+            self.candidates  # 在主线程中统计索引候选行数，工作线程只读取
+
+        tasks = []
+        bounds = {group_id: (count, low, high) for group_id, count, low, high in db.session.query(
+            TableData.table_group_id, db.func.count(TableData.id), db.func.min(TableData.id), db.func.max(TableData.id)
+        ).filter(
+            TableData.table_group_id.in_([group_id for group_id, _, _ in prepared]),
+            TableData.deleted_at.is_(None)
+        ).group_by(TableData.table_group_id).all()} if prepared else {}
+        for order, (group_id, _, indexed) in enumerate(prepared):
+            count, low, high = bounds.get(group_id, (0, None, None))
+            if not count:
+                continue
+            step = math.ceil((high - low + 1) / math.ceil(count / self.PARTITION_ROWS))
+            for start in range(low, high + 1, step):
+                tasks.append((order, group_id, indexed, (start, min(start + step - 1, high))))
+
+        # 超时后置位，工作线程在读取批次之间检查并停止
+        stop = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='global-search')
+        futures = {
+            executor.submit(self._search_partition, app, group_id, indexed, id_range, stop): order
+            for order, group_id, indexed, id_range in tasks
+        }
+        done, pending = wait(futures, timeout=timeout)
+        stop.set()
+        executor.shutdown(wait=False)
+
+        partitions = {}
+        unfinished = {futures[future] for future in pending}
+        for future in done:
+            partitions.setdefault(futures[future], []).extend(future.result())
+
+        records = []
+        columns = set()
+        matched_groups = 0
+        for order, (group_id, group_name, _) in enumerate(prepared):
+            matches = sorted(partitions.get(order, []), key=lambda match: (match[0], match[1]))
+            if matches:
+                matched_groups += 1
+                print(f"[系统] 在表格组 '{group_name}' 中找到 {len(matches)} 条匹配记录")
+            for _, _, group_columns, record in matches:
+                records.append(record)
+                columns.update(group_columns)
+        unfinished_groups = [prepared[order][1] for order in sorted(unfinished)]
+        if unfinished_groups:
+            print(f"[警告] 全局搜索超过时限，{len(unfinished_groups)} 个分组未搜索完成，返回部分结果")
+        return records, columns, matched_groups, unfinished_groups
+
+    def page(self, limit, cursor=None, offset=0):
+        """分页搜索，返回 (本页匹配记录, 本页涉及的列名集合, 下一页游标)
+
+        从游标之后开始，先跳过 offset 条匹配记录；取到第 limit + 1 条匹配即停止。
+        每次读取的行数不超过一页所需，分组内的候选行在数据库中排序和截取。
+
+        Raises:
+            ValueError: 游标格式错误或游标所在的分组已不存在
+        """
+        records = []
+        columns = set()
+        next_cursor = None
+        last_cursor = None
+        skipped = 0
+        self._chunk_size = max(1, min(self.LOAD_CHUNK_SIZE, offset + limit + 1))
+        try:
+            for group_columns, record, sort_key in self.iter_matches(cursor):
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                if len(records) >= limit:
+                    next_cursor = last_cursor
+                    break
+                records.append(record)
+                columns.update(group_columns)
+                last_cursor = f"{record['_group_id']}:{sort_key}:{record['_row_id']}"
+        finally:
+            self._chunk_size = self.LOAD_CHUNK_SIZE
+        return records, columns, next_cursor
+
+    def stream(self):
+        """流式读取完整结果（用于导出），返回 (涉及的列名集合, 逐条产生匹配记录的迭代器)
+
+        先在每个分组中读取到第一条匹配记录以确定全部列（表头），迭代器再按分组顺序
+        只读取有匹配的分组，不在内存中保留整个结果集。
+        """
+        matched = []
+        columns = set()
+        for group in self.groups:
+            try:
+                first = next(self._iter_group(group), None)
+            except Exception as e:
+                print(f"[警告] 搜索表格组 {group.group_name} 时出错: {str(e)}")
+                continue
+            if first is not None:
+                matched.append(group)
+                columns.update(first[0])
+
+        def records():
+            for group in matched:
+                try:
+                    for _, record, _ in self._iter_group(group):
+                        yield record
+                except Exception as e:
+                    print(f"[警告] 导出表格组 {group.group_name} 的搜索结果时出错: {str(e)}")
+
+        return columns, records()
+
+    def group_counts(self):
+        """各分组的命中数，按索引候选行估算，不读取行数据（可能略多于实际命中数）
+
+        返回 [{'group_id', 'group_name', 'hits'}]，只包含可能有命中的分组，顺序与搜索结果一致；
+        未索引的分组和无法由索引确定候选范围的查询（如只有数值比较）无法估算，hits 为 None。
+        """
+        counts = []
+        for group in self.groups:
+            if group.search_indexed and self._restricted:
+                hits = self._candidate_count(group.id)
+                if hits:
+                    counts.append({'group_id': group.id, 'group_name': group.group_name, 'hits': hits})
+            else:
+                counts.append({'group_id': group.id, 'group_name': group.group_name, 'hits': None})
+        return counts
+
+    def iter_matches(self, cursor=None):
+        """按分组顺序逐条产生 (分组业务列, 匹配记录, 排序键)，从游标之后开始"""
+        start = 0
+        cursor_group_id = position = None
+        if cursor:
+            cursor_group_id, _, position = str(cursor).partition(':')
+            try:
+                cursor_group_id = int(cursor_group_id)
+                TableData.parse_cursor(position)
+            except ValueError:
+                raise ValueError(f"无效的分页游标: {cursor}")
+            group_ids = [group.id for group in self.groups]
+            if cursor_group_id not in group_ids:
+                raise ValueError('分页游标所在的表格已不存在，请重新搜索')
+            start = group_ids.index(cursor_group_id)
+
+        for group in self.groups[start:]:
+            try:
+                yield from self._iter_group(group, position if group.id == cursor_group_id else None)
+            except Exception as e:
+                print(f"[警告] 搜索表格组 {group.group_name} 时出错: {str(e)}")
+                continue
+
+    @property
+    def _restricted(self):
+        """搜索索引能否确定候选范围"""
+        return self.restriction is not None
+
+    def _candidate_count(self, group_id):
+        return self.candidates.get(group_id, 0)
+
+    def _column_names(self):
+        """参与搜索的分组的全部业务列名（用于判断查询中的列限定词）"""
+        if not self.groups:
+            return []
+        return [name for (name,) in db.session.query(TableSchema.column_name).filter(
+            TableSchema.table_group_id.in_([group.id for group in self.groups]),
+            TableSchema.is_active == True
+        ).distinct().all() if name not in self.SYSTEM_FIELDS]
+
+    def _search_partition(self, app, group_id, indexed, id_range, stop):
+        """工作线程：在独立的应用上下文（独立的数据库会话）中搜索分组的一个行ID区间，
+        返回 [(排序键, 行ID, 分组业务列, 匹配记录)]"""
+        with app.app_context():
+            matches = []
+            try:
+                group = TableGroup.query.get(group_id)
+                for group_columns, record, sort_key in self._iter_prepared(group, indexed, None, id_range, stop):
+                    matches.append((sort_key, record['_row_id'], group_columns, record))
+            except Exception as e:
+                print(f"[警告] 搜索表格组 {group_id} 的行 {id_range[0]}-{id_range[1]} 时出错: {str(e)}")
+            return matches
+
+    def _iter_group(self, group, position=None):
+        """逐条产生单个分组中位于 position（"排序键:行ID"）之后的匹配记录"""
+        indexed = self._prepare_group(group)
+        if indexed is not None:
+            yield from self._iter_prepared(group, indexed, position)
+
+    def _prepare_group(self, group):
+        """读取分组前调用：返回是否按索引候选行读取，无需读取时返回 None；已归档的分组先恢复"""
+        indexed = bool(group.search_indexed)
+        if indexed and self._restricted and not self._candidate_count(group.id):
+            # 索引中没有候选行，无需读取分组（已归档的分组也不必恢复）
+            return None
+
+        if group.archived_at is not None:
+            ColdStorage.ensure_online(group.id, touch=False)
+            # 恢复时行ID可能改变，此时分组被标记为未索引，改为逐行扫描
+            indexed = bool(db.session.query(TableGroup.search_indexed).filter(TableGroup.id == group.id).scalar())
+        return indexed
+
+    def _iter_prepared(self, group, indexed, position=None, id_range=None, stop=None):
+        """逐条产生在线分组中位于 position 之后、行ID在 id_range（含两端）内的匹配记录，
+        stop 置位后停止读取"""
+        if self.term is None:
+            yield from self._iter_query(group, indexed, position, id_range, stop)
+            return
+
+        schemas = TableSchema.query.filter_by(table_group_id=group.id, is_active=True).order_by(TableSchema.column_order).all()
+        group_columns = [s.column_name for s in schemas if s.column_name not in self.SYSTEM_FIELDS]
+        codec = RowCodec(schemas)
+
+        # 字典编码列先在字典上匹配一次，逐行只需比较整数编码
+        matching_codes = {
+            col: codec.matching_codes(col, lambda value: value and str(value).lower().find(self.term) != -1)
+            for col in group_columns if codec.is_dictionary(col)
+        }
+
+        # 已索引的分组在数据库中按显示顺序读取候选行，取满一页即停止
+        rows = self._rows(group.id, id_range)
+        if indexed:
+            rows = rows.filter(TableData.id.in_(SearchIndex.row_ids(self.term)))
+        for record in self._iter_scan(rows, position, stop):
+            raw_data = record.get_raw_data()
+            matched_columns = []
+            for col in group_columns:
+                value = raw_data.get(codec.ids[col], '')
+                if col in matching_codes and RowCodec.is_code(value):
+                    if value[0] in matching_codes[col]:
+                        matched_columns.append(col)
+                elif value and str(value).lower().find(self.term) != -1:
+                    matched_columns.append(col)
+            if not matched_columns:
+                continue
+            yield group_columns, self._record(group, group_columns, record, record.to_dict(codec), matched_columns), record.sort_key or 0
+
+    def _iter_query(self, group, indexed, position=None, id_range=None, stop=None):
+        """查询语言：在数据库中按编译后的条件读取匹配行，已索引的分组以索引候选行缩小范围"""
+        query = GroupDataQuery(group.id, touch=False)
+        group_columns = [col for col in query.columns if col not in self.SYSTEM_FIELDS]
+        rows = self._rows(group.id, id_range).filter(self.query.criterion(query, group_columns))
+        if indexed and self.restriction is not None:
+            rows = rows.filter(self.query.index_criterion(TableData.id))
+
+        for record in self._iter_scan(rows, position, stop):
+            record_data = record.to_dict(query.codec)
+            matched_columns = self.query.matched_columns(query, group_columns, record_data)
+            yield group_columns, self._record(group, group_columns, record, record_data, matched_columns), record.sort_key or 0
+
+    @staticmethod
+    def _record(group, group_columns, record, record_data, matched_columns):
+        """搜索结果记录：业务列加来源、定位和命中列信息"""
+        matched_record = {col: record_data.get(col, '') for col in group_columns}
+        matched_record['_source_table'] = group.group_name
+        matched_record['_source_file'] = record_data.get('source_file', '')
+        matched_record['_group_id'] = group.id
+        matched_record['_row_id'] = record.id
+        matched_record['_matched_columns'] = matched_columns
+        return matched_record
+
+    @staticmethod
+    def _rows(group_id, id_range=None):
+        """在线分组中未删除的行，可限定行ID区间"""
+        rows = TableData.query.filter(TableData.table_group_id == group_id, TableData.deleted_at.is_(None))
+        if id_range:
+            rows = rows.filter(TableData.id >= id_range[0], TableData.id <= id_range[1])
+        return rows
+
+    def _iter_scan(self, query, position=None, stop=None):
+        """按显示顺序分批读取查询（分组内未删除的行）的结果，stop 置位后停止"""
+        while stop is None or not stop.is_set():
+            records = TableData.keyset_query(query, position).limit(self._chunk_size).all()
+            if not records:
+                return
+            yield from records
+            position = records[-1].cursor()
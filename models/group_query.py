@@ -0,0 +1,360 @@
+"""
+分组数据查询
+在数据库中完成分组数据的列投影、按列过滤和多列排序，只把需要的行和列读出存储层，
+支持与默认显示顺序一致的游标分页
+"""
+
+import base64
+import json
+import re
+
+from models.database import db, TableData, TableSchema, RowCodec
+from models.cold_storage import ColdStorage
+
+
+class GroupDataQuery:
+    """分组数据的投影、过滤、排序与分页
+
+    过滤条件为字典列表，每项 {'column': 列名, 'op': 操作, ...}：
+        eq       取值相等       {'value': 取值}
+        contains 包含子串       {'value': 子串}，不区分大小写
+        range    范围（含边界） {'min': 下限, 'max': 上限}，可只给一侧；边界为数字时按数值比较，否则按文本比较
+        gt / gte / lt / lte  大于、大于等于、小于、小于等于 {'value': 边界}，边界为数字时按数值比较，否则按文本比较
+        date     日期范围       {'min': 起始日期（含）, 'max': 结束日期（不含）}，日期为 YYYY-MM-DD，可只给一侧；
+                 取值中的 / 和 . 视为 -，只比较以四位年份开头的取值
+    排序为 [(列名, 'asc' | 'desc'), ...]，数值排在文本之前，数值按大小、文本按字符顺序；
+    排序值相同的行保持显示顺序。未指定排序时按显示顺序。
+
+    字典编码列的过滤和排序直接作用于整数编码：先在字典中求出满足条件的编码或取值的排序名次，
+    查询时只比较编码，不解码行数据。
+    """
+
+    OPERATORS = ('eq', 'contains', 'range', 'gt', 'gte', 'lt', 'lte', 'date')
+    COMPARISONS = {'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+    MAX_PROJECTED_COLUMNS = 60    # SQLite json_object 的参数个数有限，超过时读取整行再解码
+
+    _NUMBER_PATTERN = re.compile(r'^\s*[-+]?(\d+\.?\d*|\.\d+)')
+    _DATE_PATTERN = re.compile(r'^\d{4}-')
+
+    def __init__(self, group_id, columns=None, filters=None, sort=None, touch=True):
+        """
+        Args:
+            group_id (int): 分组ID
+            columns (list): 需要返回的列名，为空时返回所有列
+            filters (list): 过滤条件
+            sort (list): 排序列及方向
+            touch (bool): 是否更新分组的访问时间，全局扫描时为 False
+
+        Raises:
+            ValueError: 列不存在或条件格式错误
+        """
+        self.group_id = group_id
+        ColdStorage.ensure_online(group_id, touch=touch)
+        schemas = TableSchema.query.filter_by(
+            table_group_id=group_id,
+            is_active=True
+        ).order_by(TableSchema.column_order).all()
+        self.codec = RowCodec(schemas)
+        self.dialect = db.engine.dialect.name
+
+        all_columns = [schema.column_name for schema in schemas]
+        self.columns = list(dict.fromkeys(columns)) if columns else all_columns
+        self._check_columns(self.columns)
+
+        self.filters = filters or []
+        for condition in self.filters:
+            if condition.get('op') not in self.OPERATORS:
+                raise ValueError(f"不支持的过滤操作: {condition.get('op')}")
+            self._check_columns([condition.get('column')])
+
+        self.sort = [(column, 'desc' if str(direction).lower() == 'desc' else 'asc')
+                     for column, direction in (sort or [])]
+        self._check_columns([column for column, _ in self.sort])
+
+        self.projected = bool(columns) and len(self.columns) <= self.MAX_PROJECTED_COLUMNS
+
+    def page(self, limit=None, cursor=None):
+        """读取一页结果，返回 (行数据列表, 下一页游标)"""
+        query = self._query(cursor)
+        if not limit:
+            return [self._to_dict(row) for row in query.all()], None
+
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = self._cursor(rows[-1]) if has_more else None
+        return [self._to_dict(row) for row in rows], next_cursor
+
+    def range_rows(self, offset, limit):
+        """按行号范围读取结果，offset 为排序与过滤后的起始行号（虚拟滚动表格按可视区域读取）"""
+        rows = self._query(None).offset(max(offset, 0)).limit(limit).all()
+        return [self._to_dict(row) for row in rows]
+
+    def iter_rows(self, cursor=None, limit=None, batch_size=1000):
+        """通过服务端游标逐行读取结果（流式返回用）"""
+        query = self._query(cursor)
+        if limit:
+            query = query.limit(limit)
+        for row in query.yield_per(batch_size):
+            yield self._to_dict(row)
+
+    def iter_records(self, batch_size=1000, keep_codes=()):
+        """逐行读取未格式化的结果 (ID, 来源文件, 创建时间, 更新时间, 行数据)，
+        keep_codes 中的字典编码列保留 [编码]（导出为带类型的列式格式时使用）"""
+        for row in self._query(None).yield_per(batch_size):
+            data = self.codec.decode(json.loads(row[4]) if row[4] else {}, keep_codes)
+            yield row[0], row[1], row[2], row[3], data
+
+    def count(self):
+        """满足过滤条件的行数"""
+        return db.session.query(db.func.count(TableData.id)).filter(*self._criteria()).scalar()
+
+    def criterion(self, condition):
+        """单个过滤条件的查询表达式，供调用方以 AND / OR / NOT 组合（全局搜索的查询语言）
+
+        Raises:
+            ValueError: 列不存在或条件格式错误
+        """
+        if condition.get('op') not in self.OPERATORS:
+            raise ValueError(f"不支持的过滤操作: {condition.get('op')}")
+        self._check_columns([condition.get('column')])
+        return self._condition(condition)
+
+    def matches(self, value, condition):
+        """解码后的取值是否满足过滤条件（与 criterion 的数据库语义一致）"""
+        return self._matches('' if value is None else str(value), condition)
+
+    # ========== 查询构建 ==========
+
+    def _query(self, cursor):
+        keys = self._sort_keys()
+        query = db.session.query(
+            TableData.id,
+            TableData.source_file,
+            TableData.created_at,
+            TableData.updated_at,
+            self._payload(),
+            *[key for key, _ in keys]
+        ).filter(*self._criteria())
+
+        if cursor:
+            query = query.filter(self._after(keys, self._parse_cursor(cursor, len(keys))))
+        return query.order_by(*[key.desc() if descending else key.asc() for key, descending in keys])
+
+    def _criteria(self):
+        criteria = [TableData.table_group_id == self.group_id, TableData.deleted_at.is_(None)]
+        for condition in self.filters:
+            criteria.append(self._condition(condition))
+        return criteria
+
+    def _payload(self):
+        """行数据列：指定了列时只在数据库中取出这些列"""
+        if not self.projected:
+            return TableData.row_data
+        keys = [self.codec.ids[column] for column in self.columns]
+        if self.dialect == 'postgresql':
+            document = db.cast(TableData.row_data, db.JSON)
+            return db.func.json_build_object(*[arg for key in keys for arg in (key, document[key])])
+        return db.func.json_object(*[arg for key in keys for arg in (key, self._raw(key))])
+
+    def _condition(self, condition):
+        column = condition['column']
+        op = condition['op']
+        if self.codec.is_dictionary(column):
+            codes = self.codec.matching_codes(column, lambda value: self.matches(value, condition))
+            return self._code(column).in_(sorted(codes)) if codes else db.false()
+
+        text = self._text(column)
+        if op == 'eq':
+            return text == str(condition.get('value', ''))
+        if op == 'contains':
+            term = str(condition.get('value', '')).lower()
+            escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            return db.func.lower(text).like(f'%{escaped}%', escape='\\')
+        if op in self.COMPARISONS:
+            bound = condition.get('value')
+            number = self._number(bound)
+            if number is not None:
+                return db.and_(self._is_number(column), self._numeric(column).op(self.COMPARISONS[op])(number))
+            return db.and_(text.isnot(None), text.op(self.COMPARISONS[op])(str(bound)))
+        if op == 'date':
+            date = self._date(column)
+            criteria = [self._is_date(date)]
+            if self._present(condition.get('min')):
+                criteria.append(date >= str(condition['min']))
+            if self._present(condition.get('max')):
+                criteria.append(date < str(condition['max']))
+            return db.and_(*criteria)
+
+        lower, upper = condition.get('min'), condition.get('max')
+        numeric = all(self._number(bound) is not None for bound in (lower, upper) if self._present(bound))
+        value = self._numeric(column) if numeric else text
+        criteria = [self._is_number(column)] if numeric else [text.isnot(None)]
+        if self._present(lower):
+            criteria.append(value >= (self._number(lower) if numeric else str(lower)))
+        if self._present(upper):
+            criteria.append(value <= (self._number(upper) if numeric else str(upper)))
+        return db.and_(*criteria)
+
+    def _matches(self, value, condition):
+        """字典取值是否满足过滤条件（与 _condition 的数据库语义一致）"""
+        op = condition['op']
+        if op == 'eq':
+            return value == str(condition.get('value', ''))
+        if op == 'contains':
+            return str(condition.get('value', '')).lower() in (value or '').lower()
+        if op in self.COMPARISONS:
+            bound = condition.get('value')
+            if self._number(bound) is not None:
+                number = self._number(value)
+                bound = self._number(bound)
+            else:
+                number, bound = value, str(bound)
+            if number is None:
+                return False
+            return {'gt': number > bound, 'gte': number >= bound,
+                    'lt': number < bound, 'lte': number <= bound}[op]
+        if op == 'date':
+            date = (value or '').strip().replace('/', '-').replace('.', '-')
+            if not self._DATE_PATTERN.match(date):
+                return False
+            return ((not self._present(condition.get('min')) or date >= str(condition['min']))
+                    and (not self._present(condition.get('max')) or date < str(condition['max'])))
+
+        lower, upper = condition.get('min'), condition.get('max')
+        bounds = [bound for bound in (lower, upper) if self._present(bound)]
+        if all(self._number(bound) is not None for bound in bounds):
+            number = self._number(value)
+            if number is None:
+                return False
+            return ((not self._present(lower) or number >= self._number(lower))
+                    and (not self._present(upper) or number <= self._number(upper)))
+        return ((not self._present(lower) or value >= str(lower))
+                and (not self._present(upper) or value <= str(upper)))
+
+    def _sort_keys(self):
+        """排序表达式列表 [(表达式, 是否降序)]，末尾以显示顺序作为唯一的次序"""
+        keys = []
+        for column, direction in self.sort:
+            descending = direction == 'desc'
+            if self.codec.is_dictionary(column):
+                # 按取值的排序名次比较编码
+                values = self.codec.dictionary_values(column)
+                ranked = sorted(range(len(values)), key=lambda code: self._value_key(values[code]))
+                whens = {code: rank for rank, code in enumerate(ranked)}
+                rank = db.case(whens, value=self._code(column), else_=-1) if whens else db.literal(-1)
+                keys.append((rank, descending))
+                continue
+            text = self._text(column)
+            is_number = self._is_number(column)
+            keys.append((db.case([(db.func.coalesce(text, '') == '', 0), (is_number, 1)], else_=2), descending))
+            keys.append((db.case([(is_number, self._numeric(column))], else_=0.0), descending))
+            keys.append((db.func.lower(db.func.coalesce(text, '')), descending))
+        keys.append((TableData.sort_key, False))
+        keys.append((TableData.id, False))
+        return keys
+
+    @staticmethod
+    def _after(keys, values):
+        """游标条件：排序键元组位于游标之后"""
+        alternatives = []
+        for index, (key, descending) in enumerate(keys):
+            criteria = [keys[j][0] == values[j] for j in range(index)]
+            criteria.append(key < values[index] if descending else key > values[index])
+            alternatives.append(db.and_(*criteria))
+        return db.or_(*alternatives)
+
+    # ========== 列值表达式 ==========
+
+    def _raw(self, key):
+        if self.dialect == 'postgresql':
+            return db.cast(TableData.row_data, db.JSON)[key].astext
+        return db.func.json_extract(TableData.row_data, f'$."{key}"')
+
+    def _text(self, column):
+        return db.cast(self._raw(self.codec.ids[column]), db.Text)
+
+    def _code(self, column):
+        """字典编码列的整数编码（行数据中存为 [编码]）"""
+        key = self.codec.ids[column]
+        if self.dialect == 'postgresql':
+            return db.cast(db.cast(TableData.row_data, db.JSON)[key][0].astext, db.Integer)
+        return db.func.json_extract(TableData.row_data, f'$."{key}"[0]')
+
+    def _is_number(self, column):
+        """取值是否以数字开头（与前端 parseFloat 的判断一致）"""
+        text = db.func.trim(self._text(column))
+        if self.dialect == 'postgresql':
+            return text.op('~')(r'^[-+]?(\d|\.\d)')
+        return db.or_(text.op('GLOB')('[0-9]*'), text.op('GLOB')('[-+.][0-9]*'), text.op('GLOB')('[-+].[0-9]*'))
+
+    def _date(self, column):
+        """日期比较用的取值：/ 和 . 替换为 -"""
+        text = db.func.trim(self._text(column))
+        return db.func.replace(db.func.replace(text, '/', '-'), '.', '-')
+
+    def _is_date(self, date):
+        """取值是否以四位年份和 - 开头"""
+        if self.dialect == 'postgresql':
+            return date.op('~')(r'^\d{4}-')
+        return date.op('GLOB')('[0-9][0-9][0-9][0-9]-*')
+
+    def _numeric(self, column):
+        text = db.func.trim(self._text(column))
+        if self.dialect == 'postgresql':
+            text = db.func.substring(text, r'^[-+]?(?:\d+\.?\d*|\.\d+)')
+        return db.cast(text, db.Float)
+
+    # ========== 结果与游标 ==========
+
+    def _to_dict(self, row):
+        decoded = self.codec.decode(json.loads(row[4]) if row[4] else {})
+        data = {column: decoded[column] for column in self.columns if column in decoded}
+        data['id'] = row[0]
+        data['source_file'] = row[1]
+        data['created_at'] = row[2].strftime('%Y-%m-%d %H:%M:%S')
+        data['updated_at'] = row[3].strftime('%Y-%m-%d %H:%M:%S')
+        return data
+
+    def _cursor(self, row):
+        values = list(row[5:])
+        return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _parse_cursor(cursor, length):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(str(cursor).encode('ascii')).decode('utf-8'))
+        except (ValueError, UnicodeError):
+            values = None
+        if not isinstance(values, list) or len(values) != length:
+            raise ValueError(f"无效的分页游标: {cursor}")
+        return values
+
+    # ========== 工具方法 ==========
+
+    def _check_columns(self, columns):
+        unknown = [column for column in columns if column not in self.codec.ids]
+        if unknown:
+            raise ValueError(f"列不存在: {', '.join(str(column) for column in unknown)}")
+
+    @staticmethod
+    def _present(value):
+        return value is not None and str(value).strip() != ''
+
+    @classmethod
+    def _number(cls, value):
+        if isinstance(value, (int, float)):
+            return float(value)
+        match = cls._NUMBER_PATTERN.match(str(value)) if value is not None else None
+        return float(match.group(0)) if match else None
+
+    @classmethod
+    def _value_key(cls, value):
+        """与数据库排序表达式一致的取值排序键"""
+        text = '' if value is None else str(value)
+        if text == '':
+            return (0, 0.0, '')
+        number = cls._number(text)
+        if number is not None:
+            return (1, number, text.lower())
+        return (2, 0.0, text.lower())
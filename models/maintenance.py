@@ -0,0 +1,120 @@
+"""
+后台维护任务
+在守护线程中周期性执行压缩、清理等耗时任务，避免在请求中长时间持有数据库写锁
+"""
+
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+
+class MaintenanceWorker:
+    """后台维护线程，按注册顺序周期性执行维护任务
+
+    gunicorn 等多进程部署中每个进程都会启动维护线程，任务执行前先在数据库中取得该任务的租约
+    （MaintenanceLease），同一任务同一时间只由一个进程执行，未取得租约的进程跳过本轮。
+    """
+
+    def __init__(self, app, interval=60, lease_seconds=3600):
+        """
+        初始化维护线程
+
+        Args:
+            app: Flask应用，任务在其应用上下文中执行
+            interval (int): 两轮任务之间的间隔秒数
+            lease_seconds (int): 任务租约时长，持有者异常退出后超过该时长其他进程才能接管
+        """
+        self.app = app
+        self.interval = interval
+        self.lease_seconds = lease_seconds
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs = []
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._run_lock = threading.Lock()
+
+    def register(self, name, func):
+        """注册维护任务"""
+        self.jobs.append((name, func))
+
+    def start(self):
+        """启动后台线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name='maintenance-worker', daemon=True)
+        self._thread.start()
+        print(f"[维护] 后台维护线程已启动，间隔 {self.interval} 秒")
+
+    def stop(self):
+        """停止后台线程"""
+        self._stop_event.set()
+
+    def run_once(self):
+        """立即执行一轮所有维护任务，其他进程正在执行的任务跳过"""
+        from models.database import db
+        with self._run_lock:
+            for name, func in self.jobs:
+                with self.app.app_context():
+                    if not self._acquire(name):
+                        continue
+                    try:
+                        func()
+                    except Exception as e:
+                        print(f"[维护] 任务 {name} 执行失败: {str(e)}")
+                        db.session.rollback()
+                    finally:
+                        self._release(name)
+
+    def _acquire(self, name):
+        """取得任务租约：租约不存在、已到期或由本进程持有时取得"""
+        from sqlalchemy.exc import IntegrityError
+        from models.database import db, MaintenanceLease
+        now = datetime.utcnow()
+        values = {
+            MaintenanceLease.holder: self.holder,
+            MaintenanceLease.expires_at: now + timedelta(seconds=self.lease_seconds),
+            MaintenanceLease.acquired_at: now
+        }
+        try:
+            # 条件更新在数据库中原子执行，多个进程同时竞争时只有一个更新成功
+            acquired = MaintenanceLease.query.filter(
+                MaintenanceLease.name == name,
+                db.or_(MaintenanceLease.expires_at < now, MaintenanceLease.holder == self.holder)
+            ).update(values, synchronize_session=False)
+            if not acquired and MaintenanceLease.query.get(name) is None:
+                db.session.add(MaintenanceLease(name=name, **{column.key: value for column, value in values.items()}))
+                acquired = 1
+            db.session.commit()
+            return bool(acquired)
+        except IntegrityError:
+            # 其他进程同时插入了租约
+            db.session.rollback()
+            return False
+        except Exception as e:
+            print(f"[维护] 获取任务 {name} 的租约失败: {str(e)}")
+            db.session.rollback()
+            return False
+
+    def _release(self, name):
+        """释放本进程持有的任务租约"""
+        from models.database import db, MaintenanceLease
+        try:
+            MaintenanceLease.query.filter_by(name=name, holder=self.holder).update(
+                {MaintenanceLease.expires_at: datetime.utcnow()}, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception as e:
+            print(f"[维护] 释放任务 {name} 的租约失败: {str(e)}")
+            db.session.rollback()
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            started = time.time()
+            self.run_once()
+            elapsed = time.time() - started
+            if elapsed > 1:
+                print(f"[维护] 本轮维护任务耗时 {elapsed:.1f}s")
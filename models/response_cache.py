@@ -0,0 +1,53 @@
+"""
+响应缓存
+按版本标识（ETag）缓存已生成的响应内容，数据变化后版本标识随之改变，旧条目不再命中并按最近最少使用淘汰
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """按 ETag 缓存响应内容的 LRU 缓存，按条目数和总字节数限制大小"""
+
+    def __init__(self, max_entries=64, max_bytes=64 * 1024 * 1024):
+        """
+        初始化响应缓存
+
+        Args:
+            max_entries (int): 最多缓存的响应数，0 表示不缓存
+            max_bytes (int): 缓存内容的总字节数上限，单个响应超过上限的四分之一时不缓存
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """返回缓存的 (响应内容, MIME类型)，未命中时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, body, mimetype):
+        """缓存响应内容"""
+        if not self.max_entries or len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[0])
+            self._entries[key] = (body, mimetype)
+            self._size += len(body)
+            while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
@@ -0,0 +1,130 @@
+"""
+全局搜索结果缓存
+按规范化的查询缓存搜索结果，并记录搜索时各分组的版本；任一参与搜索的分组被写入（版本或更新时间变化）、
+新增或删除后，相关条目在下次读取时失效，容量超限时按最近最少使用淘汰。
+结果句柄编码查询文本及搜索时分组版本的摘要，不依赖进程内状态，导出时凭句柄在服务端重新读取结果
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+class SearchResultCache:
+    """带分组版本校验的 LRU 缓存，按条目数和缓存的记录总数限制大小，并统计命中、未命中、淘汰和失效次数"""
+
+    def __init__(self, max_entries=64, max_records=200000):
+        """
+        初始化搜索结果缓存
+
+        Args:
+            max_entries (int): 最多缓存的搜索结果数，0 表示不缓存
+            max_records (int): 缓存的记录总数上限，单个结果超过上限的四分之一时不缓存
+        """
+        self.max_entries = max_entries
+        self.max_records = max_records
+        self._entries = OrderedDict()    # 键 -> (分组版本, 结果, 记录数)
+        self._records = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, versions):
+        """返回缓存的结果；未缓存或搜索时的分组版本与当前版本 versions 不一致时返回 None（后者同时移除条目）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != versions:
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, versions, result, records):
+        """缓存搜索结果，versions 为搜索开始时各分组的版本，records 为结果包含的记录数
+
+        同时移除分组版本已过期的其他条目，被写入的分组不再占用缓存容量。
+        """
+        if not self.max_entries or records > self.max_records // 4:
+            return
+        with self._lock:
+            for stale_key in [k for k, entry in self._entries.items() if entry[0] != versions]:
+                self._remove(stale_key)
+                self.invalidations += 1
+            self._remove(key)
+            self._entries[key] = (versions, result, records)
+            self._records += records
+            while self._entries and (len(self._entries) > self.max_entries or self._records > self.max_records):
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._records -= evicted
+                self.evictions += 1
+
+    @staticmethod
+    def version_digest(versions):
+        """分组版本 {分组ID: (创建时间, 数据版本, 更新时间)} 的摘要"""
+        return hashlib.sha1(repr(sorted(versions.items())).encode('utf-8')).hexdigest()[:24]
+
+    @classmethod
+    def handle(cls, search_term, versions, max_distance=None):
+        """结果句柄：查询文本与分组版本摘要（模糊搜索另加最大编辑距离）的 base64 编码
+
+        句柄自身携带全部信息，多进程部署时由任一工作进程解析；句柄只能重放用户本可直接提交的查询，无需签名。
+        """
+        entry = [search_term, cls.version_digest(versions)]
+        if max_distance is not None:
+            entry.append(max_distance)
+        raw = json.dumps(entry, ensure_ascii=False)
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def parse_handle(handle):
+        """解析结果句柄，返回 (查询文本, 分组版本摘要, 最大编辑距离)，非模糊搜索的编辑距离为 None；
+        格式错误时返回 None"""
+        try:
+            entry = json.loads(base64.urlsafe_b64decode(str(handle).encode('ascii')).decode('utf-8'))
+            search_term, digest, *rest = entry
+        except (binascii.Error, UnicodeError, ValueError, TypeError):
+            return None
+        max_distance = rest[0] if len(rest) == 1 else None
+        if not isinstance(search_term, str) or not isinstance(digest, str) or len(rest) > 1:
+            return None
+        if max_distance is not None and (not isinstance(max_distance, int) or isinstance(max_distance, bool)):
+            return None
+        return search_term, digest, max_distance
+
+    def stats(self):
+        """缓存状态和计数"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'records': self._records,
+                'max_entries': self.max_entries,
+                'max_records': self.max_records,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
+
+    def clear(self):
+        """清空缓存（计数保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._records = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._records -= entry[2]
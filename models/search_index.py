@@ -0,0 +1,363 @@
+"""
+全局搜索索引
+每行数据维护一条搜索文档（各单元格取值小写后逐行拼接）及其二元组倒排列表，
+随导入、编辑、合并和清理同步更新。SQLite 支持 FTS5 trigram 分词时在文档表上建立外部内容
+全文索引，三个字符及以上的关键词（含中文）由全文索引查找候选行；较短的关键词和其他数据库
+求关键词各二元组倒排列表的交集，不扫描文档表，也不解码行数据。
+模糊搜索另维护单元格取值的词表及其二元组倒排列表，按共享二元组数过滤出候选词条
+"""
+
+import re
+import time
+
+from sqlalchemy import select, intersect, union_all, table, column, literal_column
+
+from models.database import db, TableData, TableGroup, SearchDocument, SearchGram, SearchTerm, SearchTermGram, RowCodec
+
+try:
+    from pypinyin import lazy_pinyin
+    HAS_PYPINYIN = True
+except ImportError:
+    lazy_pinyin = None
+    HAS_PYPINYIN = False
+
+
+class SearchIndex:
+    """搜索文档的维护与候选行查找
+
+    索引只用于缩小候选范围，搜索结果仍按在线数据逐行校验，过期或多余的文档不影响结果。
+    索引不完整的分组（升级前的旧分组、快照恢复或归档恢复后行ID变化的分组）标记为未索引，
+    搜索时退回逐行扫描，由后台任务重建。
+    """
+
+    FTS_TABLE = 'search_fts'
+    MIN_FTS_LENGTH = 3               # trigram 分词至少需要三个字符
+    MAX_QUERY_GRAMS = 8              # 参与求交集的二元组上限，其余字符由逐行校验保证
+    BATCH_SIZE = 500                 # 写入文档和重建索引的批次行数
+    BUILD_PAUSE_SECONDS = 0.05       # 后台重建每批之间的停顿
+    MAX_TERM_LENGTH = 64             # 进入模糊搜索词表的取值最大字符数
+    FUZZY_MAX_POSTINGS = 20000       # 倒排列表超过该长度的二元组视为常见组合，不参与候选词条计数
+    FUZZY_MAX_CANDIDATES = 2000      # 单次查找返回的候选词条上限（按共享二元组数从多到少）
+
+    _CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+    backend = 'table'                # 'fts5'（全文索引 + 二元组索引）或 'table'（仅二元组索引），由 setup() 检测
+
+    _FTS_TRIGGERS = (
+        """CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+            INSERT INTO search_fts(rowid, content) VALUES (new.row_id, new.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+            INSERT INTO search_fts(search_fts, rowid, content) VALUES ('delete', old.row_id, old.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE OF content ON search_documents BEGIN
+            INSERT INTO search_fts(search_fts, rowid, content) VALUES ('delete', old.row_id, old.content);
+            INSERT INTO search_fts(rowid, content) VALUES (new.row_id, new.content);
+        END""",
+    )
+
+    @classmethod
+    def setup(cls):
+        """应用启动时调用：SQLite 下创建全文索引表和同步触发器，并确定查找方式"""
+        engine = db.engine
+        if engine.dialect.name != 'sqlite':
+            cls.backend = 'table'
+            return
+
+        created = False
+        if engine.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_fts'"
+        ).first() is None:
+            try:
+                engine.execute(
+                    "CREATE VIRTUAL TABLE search_fts USING fts5(content, content='search_documents', "
+                    "content_rowid='row_id', tokenize='trigram')"
+                )
+                created = True
+            except Exception as e:
+                print(f"[警告] 当前 SQLite 不支持 FTS5 trigram 分词，全局搜索使用二元组索引: {str(e)}")
+                cls.backend = 'table'
+                return
+
+        for trigger in cls._FTS_TRIGGERS:
+            engine.execute(trigger)
+        if created and engine.execute('SELECT 1 FROM search_documents LIMIT 1').first() is not None:
+            engine.execute("INSERT INTO search_fts(search_fts) VALUES ('rebuild')")
+            print("[系统] 全局搜索全文索引已按现有搜索文档重建")
+        cls.backend = 'fts5'
+
+    @classmethod
+    def check_grams(cls):
+        """应用启动时调用：已有搜索文档但没有二元组倒排列表或模糊搜索词表（升级前建立的索引）时，
+        将所有分组标记为未索引，由后台任务重建"""
+        if db.session.query(SearchDocument.row_id).first() is None:
+            return
+        if (db.session.query(SearchGram.row_id).first() is not None
+                and db.session.query(SearchTerm.id).first() is not None):
+            return
+        TableGroup.query.update(
+            {TableGroup.search_indexed: False, TableGroup.updated_at: TableGroup.updated_at},
+            synchronize_session=False
+        )
+        db.session.commit()
+        print("[系统] 全局搜索索引缺少二元组倒排列表或模糊搜索词表，将由后台任务重建")
+
+    # ========== 索引维护 ==========
+
+    @staticmethod
+    def document_text(data):
+        """行数据（列名键、已解码）的搜索文档内容，没有可搜索的取值时返回空字符串"""
+        values = dict.fromkeys(str(value).lower() for value in data.values() if value)
+        return '\n'.join(values)
+
+    @staticmethod
+    def document_grams(content):
+        """搜索文档的二元组集合
+
+        末尾补一个换行符，使每个字符都是某个二元组的首字符，单字符关键词可按首字符查找。
+        """
+        content += '\n'
+        return {content[i:i + 2] for i in range(len(content) - 1)}
+
+    @staticmethod
+    def term_grams(key):
+        """词条键的二元组集合，首尾以控制字符补齐，使每个字符都出现在两个二元组中"""
+        key = '\x02' + key + '\x03'
+        return {key[i:i + 2] for i in range(len(key) - 1)}
+
+    @classmethod
+    def term_keys(cls, value):
+        """取值（小写）的比较键：取值本身，安装 pypinyin 时含中文的取值另加拼音"""
+        keys = [value]
+        if HAS_PYPINYIN and cls._CJK_PATTERN.search(value):
+            pinyin = ''.join(lazy_pinyin(value)).lower()
+            if pinyin != value and len(pinyin) <= cls.MAX_TERM_LENGTH:
+                keys.append(pinyin)
+        return keys
+
+    @classmethod
+    def index_records(cls, records, codec):
+        """为一批已分配ID的行写入搜索文档，覆盖同ID的旧文档（不提交事务）
+
+        同ID的旧文档属于其他分组时，说明该分组归档期间行ID被复用，将其标记为未索引。
+        """
+        for start in range(0, len(records), cls.BATCH_SIZE):
+            batch = records[start:start + cls.BATCH_SIZE]
+            groups = {record.id: record.table_group_id for record in batch}
+            stale_groups = {group_id for row_id, group_id in db.session.query(
+                SearchDocument.row_id, SearchDocument.table_group_id
+            ).filter(SearchDocument.row_id.in_(list(groups))).all() if group_id != groups[row_id]}
+            if stale_groups:
+                cls.mark_unindexed(stale_groups)
+
+            cls.remove_rows(list(groups))
+            documents = []
+            grams = []
+            values = set()
+            for record in batch:
+                data = record.get_data(codec)
+                content = cls.document_text(data)
+                if content:
+                    documents.append({'row_id': record.id, 'table_group_id': record.table_group_id, 'content': content})
+                    grams.extend({'gram': gram, 'row_id': record.id} for gram in cls.document_grams(content))
+                    values.update(str(value).lower() for value in data.values() if value)
+            if documents:
+                db.session.bulk_insert_mappings(SearchDocument, documents)
+                db.session.bulk_insert_mappings(SearchGram, grams)
+                cls.index_terms(values)
+
+    @classmethod
+    def index_terms(cls, values):
+        """将取值加入模糊搜索词表（已有的词条跳过，不提交事务）
+
+        并发写入同一词条时以 INSERT OR IGNORE / ON CONFLICT DO NOTHING 忽略重复。
+        """
+        values = [value for value in values if len(value) <= cls.MAX_TERM_LENGTH]
+        existing = set()
+        for start in range(0, len(values), cls.BATCH_SIZE):
+            existing.update(db.session.query(SearchTerm.value, SearchTerm.term_key).filter(
+                SearchTerm.value.in_(values[start:start + cls.BATCH_SIZE])
+            ).all())
+        entries = [{'value': value, 'term_key': key, 'length': len(key)}
+                   for value in values for key in cls.term_keys(value) if (value, key) not in existing]
+        if not entries:
+            return
+
+        db.session.execute(cls._insert_ignore(SearchTerm.__table__), entries)
+        new_values = list({entry['value'] for entry in entries})
+        term_grams = []
+        for start in range(0, len(new_values), cls.BATCH_SIZE):
+            for term_id, value, key in db.session.query(SearchTerm.id, SearchTerm.value, SearchTerm.term_key).filter(
+                SearchTerm.value.in_(new_values[start:start + cls.BATCH_SIZE])
+            ).all():
+                if (value, key) not in existing:
+                    term_grams.extend({'gram': gram, 'term_id': term_id} for gram in cls.term_grams(key))
+        if term_grams:
+            db.session.execute(cls._insert_ignore(SearchTermGram.__table__), term_grams)
+
+    @staticmethod
+    def _insert_ignore(target):
+        """忽略主键或唯一索引冲突的批量插入语句"""
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+            return insert(target).on_conflict_do_nothing()
+        return target.insert().prefix_with('OR IGNORE')
+
+    @staticmethod
+    def remove_rows(row_ids):
+        """删除行的搜索文档和二元组（不提交事务）"""
+        if row_ids:
+            SearchGram.query.filter(SearchGram.row_id.in_(row_ids)).delete(synchronize_session=False)
+            SearchDocument.query.filter(SearchDocument.row_id.in_(row_ids)).delete(synchronize_session=False)
+
+    @staticmethod
+    def remove_group(group_id):
+        """删除分组的全部搜索文档和二元组，包括已归档行的文档（不提交事务）"""
+        group_rows = db.session.query(SearchDocument.row_id).filter(SearchDocument.table_group_id == group_id)
+        SearchGram.query.filter(SearchGram.row_id.in_(group_rows)).delete(synchronize_session=False)
+        SearchDocument.query.filter_by(table_group_id=group_id).delete(synchronize_session=False)
+
+    @staticmethod
+    def move_group(source_group_id, target_group_id):
+        """分组合并时将搜索文档随行迁移到目标分组，二元组按行ID记录无需迁移（不提交事务）"""
+        SearchDocument.query.filter_by(table_group_id=source_group_id).update(
+            {SearchDocument.table_group_id: target_group_id}, synchronize_session=False
+        )
+
+    @staticmethod
+    def mark_unindexed(group_ids):
+        """将分组标记为未索引，搜索时逐行扫描，由后台任务重建（不提交事务，不改变分组的更新时间）"""
+        TableGroup.query.filter(TableGroup.id.in_(list(group_ids))).update(
+            {TableGroup.search_indexed: False, TableGroup.updated_at: TableGroup.updated_at},
+            synchronize_session=False
+        )
+
+    @classmethod
+    def index_group(cls, group_id):
+        """分批重建在线分组的搜索文档，返回索引的行数
+
+        重建期间分组版本变化（如快照恢复）时保持未索引状态，下一轮后台任务再重建。
+        """
+        version = db.session.query(TableGroup.version).filter(TableGroup.id == group_id).scalar()
+        cls.remove_group(group_id)
+        codec = RowCodec.for_group(group_id)
+
+        indexed = 0
+        last_id = 0
+        while True:
+            records = TableData.query.filter(
+                TableData.table_group_id == group_id,
+                TableData.deleted_at.is_(None),
+                TableData.id > last_id
+            ).order_by(TableData.id.asc()).limit(cls.BATCH_SIZE).all()
+            if not records:
+                break
+            cls.index_records(records, codec)
+            db.session.commit()
+            indexed += len(records)
+            last_id = records[-1].id
+            time.sleep(cls.BUILD_PAUSE_SECONDS)
+
+        TableGroup.query.filter(
+            TableGroup.id == group_id,
+            db.func.coalesce(TableGroup.version, 0) == (version or 0)
+        ).update({TableGroup.search_indexed: True, TableGroup.updated_at: TableGroup.updated_at},
+                 synchronize_session=False)
+        db.session.commit()
+        return indexed
+
+    @classmethod
+    def build_pending(cls):
+        """后台任务：重建未索引的在线分组，已归档的分组在恢复后再重建，返回重建的分组数"""
+        group_ids = [group_id for (group_id,) in db.session.query(TableGroup.id).filter(
+            TableGroup.deleted_at.is_(None),
+            TableGroup.archived_at.is_(None),
+            db.or_(TableGroup.search_indexed.is_(None), TableGroup.search_indexed == False)
+        ).order_by(TableGroup.id).all()]
+
+        indexed_rows = 0
+        for group_id in group_ids:
+            indexed_rows += cls.index_group(group_id)
+        if group_ids:
+            print(f"[系统] 全局搜索索引重建完成，{len(group_ids)} 个分组，共 {indexed_rows} 条记录")
+        return len(group_ids)
+
+    # ========== 查找 ==========
+
+    @classmethod
+    def row_ids(cls, term):
+        """关键词可能命中的行ID子查询，可与其他条件组合（全局搜索查询语言）"""
+        term = term.lower()
+        if cls.backend == 'fts5' and len(term) >= cls.MIN_FTS_LENGTH:
+            fts = table(cls.FTS_TABLE, column('rowid'))
+            return select([fts.c.rowid]).where(
+                literal_column(cls.FTS_TABLE).op('MATCH')('"' + term.replace('"', '""') + '"')
+            )
+        return cls._gram_rows(term)
+
+    @classmethod
+    def fuzzy_terms(cls, key, max_distance):
+        """与 key 的编辑距离可能不超过 max_distance 的词条，返回 ([(比较键, 取值)], 是否不完整)
+
+        每次编辑最多破坏两个补齐后的二元组，候选词条至少共享 len(二元组) - 2 * max_distance 个二元组，
+        且长度差不超过 max_distance。倒排列表超过 FUZZY_MAX_POSTINGS 的常见二元组不参与计数，
+        阈值相应降低，计数结果仍然完整；常见二元组过多、阈值降到 0 以下时各二元组只取部分倒排列表，
+        候选词条超过 FUZZY_MAX_CANDIDATES 时只取共享二元组最多的部分，此时结果可能不完整。
+        调用方按编辑距离校验候选词条。
+        """
+        grams_table = SearchTermGram.__table__
+        grams = sorted(cls.term_grams(key))
+        threshold = len(grams) - 2 * max_distance
+
+        def postings(gram, limit):
+            return select([grams_table.c.term_id]).where(grams_table.c.gram == gram).limit(limit).alias()
+
+        selective = [gram for gram in grams if db.session.query(db.func.count()).select_from(
+            postings(gram, cls.FUZZY_MAX_POSTINGS + 1)
+        ).scalar() <= cls.FUZZY_MAX_POSTINGS]
+        incomplete = False
+        if threshold - (len(grams) - len(selective)) >= 1:
+            threshold -= len(grams) - len(selective)
+        else:
+            selective = grams
+            threshold = max(threshold, 1)
+            incomplete = True
+        if not selective:
+            return [], incomplete
+
+        lists = [select([sub.c.term_id]) for sub in (postings(gram, cls.FUZZY_MAX_POSTINGS) for gram in selective)]
+        merged = (union_all(*lists) if len(lists) > 1 else lists[0]).alias('postings')
+        shared = db.func.count().label('shared')
+        counts = select([merged.c.term_id, shared]).group_by(merged.c.term_id).having(
+            db.func.count() >= threshold
+        ).alias('counts')
+        rows = db.session.query(SearchTerm.term_key, SearchTerm.value).join(
+            counts, counts.c.term_id == SearchTerm.id
+        ).filter(
+            SearchTerm.length.between(len(key) - max_distance, len(key) + max_distance)
+        ).order_by(counts.c.shared.desc(), SearchTerm.id).limit(cls.FUZZY_MAX_CANDIDATES + 1).all()
+        if len(rows) > cls.FUZZY_MAX_CANDIDATES:
+            rows = rows[:cls.FUZZY_MAX_CANDIDATES]
+            incomplete = True
+        return [(term_key, value) for term_key, value in rows], incomplete
+
+    @classmethod
+    def _gram_rows(cls, term):
+        """包含关键词全部二元组的行ID子查询（各倒排列表的交集）"""
+        grams = SearchGram.__table__
+        if len(term) == 1:
+            # 以该字符开头的二元组；SQLite 按 UTF-8 字节比较文本，与码点顺序一致，可按范围走索引
+            if db.engine.dialect.name == 'sqlite':
+                condition = grams.c.gram.between(term, term + '\U0010ffff')
+            else:
+                condition = grams.c.gram.like(term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%', escape='\\')
+            return select([grams.c.row_id]).where(condition).distinct()
+
+        term_grams = list(dict.fromkeys(term[i:i + 2] for i in range(len(term) - 1)))
+        if len(term_grams) > cls.MAX_QUERY_GRAMS:
+            # 均匀选取，保留首尾
+            step = (len(term_grams) - 1) / (cls.MAX_QUERY_GRAMS - 1)
+            term_grams = [term_grams[round(i * step)] for i in range(cls.MAX_QUERY_GRAMS)]
+        if len(term_grams) == 1:
+            return select([grams.c.row_id]).where(grams.c.gram == term_grams[0])
+        return intersect(*[select([grams.c.row_id]).where(grams.c.gram == gram) for gram in term_grams])
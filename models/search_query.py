@@ -0,0 +1,311 @@
+"""
+全局搜索查询语言
+支持按列限定的关键词、数值与日期比较以及 AND / OR / NOT 组合，例如
+    部门:研发 金额>10000 日期:2025-03
+    (部门:研发 OR 部门:测试) -状态:离职
+查询按分组编译为数据库条件，关键词部分同时编译为搜索索引的候选行条件，不逐行比较字符串
+"""
+
+import json
+import re
+from datetime import date, timedelta
+
+from models.database import db
+from models.excel_processor import UniversalExcelProcessor
+from models.search_index import SearchIndex
+
+
+class SearchQuery:
+    """查询的解析、列名解析与编译
+
+    语法：
+        关键词            任意列包含该关键词（不区分大小写），可用双引号包含空格，如 "研发 中心"
+        列:取值           该列包含取值；取值为日期（2025-03、2025-03-15、2025年3月）时匹配该月或该日
+        列=取值           该列等于取值
+        列>值 列>=值 列<值 列<=值   数值比较，值为日期时按日期比较，其余按文本比较
+        列:下限..上限     范围（含边界），可只给一侧
+        空格或 AND        同时满足；OR 满足其一；NOT 或前缀 - 表示排除；括号改变优先级
+    列名先按名称（不区分大小写）匹配，再按 _normalize_column_name 的标准化结果匹配（"编号:" 可匹配
+    "ID" 列），最后按标准化结果包含匹配；在所有分组中都匹配不到列时，整个词按普通关键词搜索（如 10:30）。
+    无法解析的查询（如括号不配对）整体按普通关键词搜索。
+    """
+
+    KEYWORDS = ('AND', 'OR', 'NOT')
+
+    _FIELD_PATTERN = re.compile(r'^(?P<field>[^:<>=]+?)(?P<op>>=|<=|:|=|>|<)(?P<value>.*)$', re.S)
+    _DATE_PATTERN = re.compile(r'^(\d{4})[-/.年](\d{1,2})(?:[-/.月](\d{1,2})日?|月)?$')
+    _COMPARISONS = {'>': 'gt', '>=': 'gte', '<': 'lt', '<=': 'lte'}
+
+    def __init__(self, text, column_names=()):
+        """
+        Args:
+            text (str): 查询文本
+            column_names (iterable): 参与搜索的所有分组的列名，用于判断列限定词是否指向实际的列
+        """
+        self.text = text
+        self._names = {}
+        self._column_names = list(column_names)
+        try:
+            self._tokens = self._tokenize(text)
+            self._position = 0
+            tree = self._parse_or()
+            if self._position < len(self._tokens):
+                raise ValueError('多余的右括号')
+        except ValueError:
+            tree = ('term', self._text_term(text))
+        self.tree = tree
+
+    @property
+    def plain_term(self):
+        """只有一个普通关键词时返回该关键词，否则返回 None"""
+        if self.tree[0] == 'term' and self.tree[1]['field'] is None:
+            return self.tree[1]['text']
+        return None
+
+    @property
+    def key(self):
+        """规范化的查询，用作结果缓存的键：只是空白、AND、列名或关键词大小写不同的查询得到相同的键"""
+        return self._key(self.tree)
+
+    def _key(self, node):
+        kind = node[0]
+        if kind in ('and', 'or'):
+            return '(' + f' {kind} '.join(self._key(child) for child in node[1]) + ')'
+        if kind == 'not':
+            return 'not ' + self._key(node[1])
+        term = node[1]
+        condition = dict(term['condition'])
+        if condition['op'] == 'contains':
+            condition['value'] = condition['value'].lower()
+        return json.dumps([term['field'] and term['field'].lower(), condition], ensure_ascii=False, sort_keys=True)
+
+    # ========== 按分组编译 ==========
+
+    def criterion(self, query, columns):
+        """编译为分组内的数据库条件
+
+        Args:
+            query (GroupDataQuery): 分组查询，提供列取值表达式（字典编码列按编码比较）
+            columns (list): 参与搜索的业务列
+        """
+        return self._compile(self.tree, query, columns)
+
+    def index_criterion(self, row_id):
+        """由搜索索引得到的候选行条件（row_id 为行ID列），无法由索引确定候选范围时返回 None
+
+        只有 NOT 之外的包含与相等条件会用到索引；数值、日期比较和 NOT 不缩小候选范围。
+        """
+        return self._index(self.tree, row_id)
+
+    def matched_columns(self, query, columns, data):
+        """解码后的行数据中命中查询条件的列（NOT 中的条件不计入）"""
+        matched = set()
+        self._collect(self.tree, query, columns, data, matched)
+        return [col for col in columns if col in matched]
+
+    def resolve(self, field, columns):
+        """列限定词对应的列：名称相同 > 标准化结果相同 > 标准化结果包含"""
+        lowered = field.lower()
+        exact = [col for col in columns if str(col).lower() == lowered]
+        if exact:
+            return exact
+        normalized = self._normalize(field)
+        if not normalized:
+            return []
+        names = {col: self._normalize(col) for col in columns}
+        equal = [col for col, name in names.items() if name == normalized]
+        if equal or normalized.isdigit():
+            return equal
+        return [col for col, name in names.items() if normalized in name]
+
+    def _compile(self, node, query, columns):
+        kind = node[0]
+        if kind == 'and':
+            return db.and_(*[self._compile(child, query, columns) for child in node[1]])
+        if kind == 'or':
+            return db.or_(*[self._compile(child, query, columns) for child in node[1]])
+        if kind == 'not':
+            # 取值缺失时条件为 NULL，按不满足处理后再取反
+            return db.not_(db.func.coalesce(self._compile(node[1], query, columns), db.false()))
+
+        term = node[1]
+        targets = columns if term['field'] is None else self.resolve(term['field'], columns)
+        if not targets:
+            return db.false()
+        return db.or_(*[query.criterion(dict(term['condition'], column=col)) for col in targets])
+
+    def _index(self, node, row_id):
+        kind = node[0]
+        if kind == 'not':
+            return None
+        if kind == 'term':
+            text = node[1]['index_text']
+            return row_id.in_(SearchIndex.row_ids(text)) if text else None
+
+        parts = [self._index(child, row_id) for child in node[1]]
+        if kind == 'or':
+            return None if any(part is None for part in parts) else db.or_(*parts)
+        parts = [part for part in parts if part is not None]
+        if not parts:
+            return None
+        return parts[0] if len(parts) == 1 else db.and_(*parts)
+
+    def _collect(self, node, query, columns, data, matched):
+        kind = node[0]
+        if kind == 'not':
+            return
+        if kind in ('and', 'or'):
+            for child in node[1]:
+                self._collect(child, query, columns, data, matched)
+            return
+
+        term = node[1]
+        targets = columns if term['field'] is None else self.resolve(term['field'], columns)
+        for col in targets:
+            value = data.get(col)
+            if value not in (None, '') and query.matches(value, dict(term['condition'], column=col)):
+                matched.add(col)
+
+    def _normalize(self, name):
+        if name not in self._names:
+            self._names[name] = UniversalExcelProcessor._normalize_column_name(name)
+        return self._names[name]
+
+    # ========== 解析 ==========
+
+    @staticmethod
+    def _tokenize(text):
+        """切分为括号和词，词为 [(片段, 是否带引号)]；空词（如 ""）被忽略"""
+        tokens = []
+        i = 0
+        while i < len(text):
+            ch = text[i]
+            if ch.isspace():
+                i += 1
+                continue
+            if ch in '()':
+                tokens.append(ch)
+                i += 1
+                continue
+
+            segments = []
+            start = i
+            while i < len(text) and not text[i].isspace() and text[i] not in '()':
+                if text[i] == '"':
+                    if i > start:
+                        segments.append((text[start:i], False))
+                    end = text.find('"', i + 1)
+                    if end == -1:
+                        raise ValueError('引号不配对')
+                    segments.append((text[i + 1:end], True))
+                    i = start = end + 1
+                else:
+                    i += 1
+            if i > start:
+                segments.append((text[start:i], False))
+            if any(segment for segment, _ in segments):
+                tokens.append(segments)
+        return tokens
+
+    def _peek(self):
+        return self._tokens[self._position] if self._position < len(self._tokens) else None
+
+    def _is_keyword(self, token, keyword):
+        return isinstance(token, list) and token == [(keyword, False)]
+
+    def _parse_or(self):
+        children = [self._parse_and()]
+        while self._is_keyword(self._peek(), 'OR'):
+            self._position += 1
+            children.append(self._parse_and())
+        return children[0] if len(children) == 1 else ('or', children)
+
+    def _parse_and(self):
+        children = [self._parse_not()]
+        while self._peek() is not None and self._peek() != ')' and not self._is_keyword(self._peek(), 'OR'):
+            if self._is_keyword(self._peek(), 'AND'):
+                self._position += 1
+            children.append(self._parse_not())
+        return children[0] if len(children) == 1 else ('and', children)
+
+    def _parse_not(self):
+        token = self._peek()
+        if token is None:
+            raise ValueError('查询不完整')
+        self._position += 1
+        if self._is_keyword(token, 'NOT'):
+            return ('not', self._parse_not())
+        if token == '(':
+            node = self._parse_or()
+            if self._peek() != ')':
+                raise ValueError('括号不配对')
+            self._position += 1
+            return node
+        if token == ')' or any(self._is_keyword(token, keyword) for keyword in self.KEYWORDS):
+            raise ValueError('运算符位置错误')
+
+        head, quoted = token[0]
+        if not quoted and len(head) > 1 and head[0] == '-' and not (head[1].isdigit() or head[1] == '.'):
+            return ('not', ('term', self._term([(head[1:], False)] + token[1:])))
+        return ('term', self._term(token))
+
+    def _term(self, segments):
+        """由词构建条件；列限定词指向的列在任何分组中都不存在时按普通关键词处理"""
+        raw = ''.join(segment for segment, _ in segments)
+        head, quoted = segments[0]
+        match = None if quoted else self._FIELD_PATTERN.match(head)
+        if match:
+            field = match.group('field')
+            value = match.group('value') + ''.join(segment for segment, _ in segments[1:])
+            if value and self.resolve(field, self._column_names):
+                return dict(self._condition(match.group('op'), value), field=field, text=raw)
+        return self._text_term(raw)
+
+    @staticmethod
+    def _text_term(text):
+        return {'field': None, 'text': text, 'condition': {'op': 'contains', 'value': text},
+                'index_text': text.lower()}
+
+    @classmethod
+    def _condition(cls, op, value):
+        """列限定词的过滤条件（GroupDataQuery 的条件格式）及可用于索引查找的文本"""
+        dates = cls._date_range(value)
+        if op == ':' and '..' in value:
+            lower, _, upper = value.partition('..')
+            ranges = [cls._date_range(bound) for bound in (lower, upper) if bound]
+            if ranges and all(ranges):
+                condition = {'op': 'date',
+                             'min': cls._date_range(lower)[0] if lower else None,
+                             'max': cls._date_range(upper)[1] if upper else None}
+            else:
+                condition = {'op': 'range', 'min': lower, 'max': upper}
+            return {'condition': condition, 'index_text': None}
+        if op == ':':
+            if dates:
+                return {'condition': {'op': 'date', 'min': dates[0], 'max': dates[1]}, 'index_text': None}
+            return {'condition': {'op': 'contains', 'value': value}, 'index_text': value.lower()}
+        if op == '=':
+            return {'condition': {'op': 'eq', 'value': value}, 'index_text': value.lower()}
+        if dates:
+            bound = {'>': ('min', dates[1]), '>=': ('min', dates[0]),
+                     '<': ('max', dates[0]), '<=': ('max', dates[1])}[op]
+            return {'condition': {'op': 'date', bound[0]: bound[1]}, 'index_text': None}
+        return {'condition': {'op': cls._COMPARISONS[op], 'value': value}, 'index_text': None}
+
+    @classmethod
+    def _date_range(cls, value):
+        """日期取值对应的区间 (起始日期, 结束日期（不含）)，按月或按日；不是日期时返回 None"""
+        match = cls._DATE_PATTERN.match(value.strip())
+        if not match:
+            return None
+        year, month, day = int(match.group(1)), int(match.group(2)), match.group(3)
+        try:
+            if day:
+                start = date(year, month, int(day))
+                end = start + timedelta(days=1)
+            else:
+                start = date(year, month, 1)
+                end = date(year + month // 12, month % 12 + 1, 1)
+        except ValueError:
+            return None
+        return start.isoformat(), end.isoformat()
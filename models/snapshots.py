@@ -0,0 +1,294 @@
+"""
+分组快照
+写时复制的分组检查点：创建快照只保存分组元数据，行在快照之后第一次被修改或删除前才复制，
+快照的开销与变更量成正比，与分组大小无关
+"""
+
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import select, and_, exists, literal
+
+from models.database import db, TableData, TableGroup, TableSchema, GroupFileStats, DataStats, GroupSnapshot, SnapshotRow, RowCodec
+from models.cold_storage import ColdStorage
+
+
+class GroupSnapshots:
+    """分组快照的创建、写时复制、按快照读取与恢复"""
+
+    _ROW_FIELDS = ('source_file', 'row_data', 'row_format', 'sort_key', 'created_at', 'updated_at')
+    _GROUP_FIELDS = ('group_name', 'description', 'schema_fingerprint', 'column_count',
+                     'confidence_score', 'record_count', 'source_file_count')
+    _SCHEMA_FIELDS = ('id', 'column_name', 'column_type', 'column_order', 'is_active')
+
+    @staticmethod
+    def create(group_id, name=None):
+        """为分组创建快照，只保存分组信息、表结构和来源文件统计"""
+        group = TableGroup.get_live(group_id)
+        if group is None:
+            return None
+        # 快照按行ID记录变更，先恢复已归档的分组，使行ID在快照期间保持不变
+        ColdStorage.ensure_online(group_id, touch=False)
+
+        now = datetime.utcnow()
+        schemas = TableSchema.query.filter_by(table_group_id=group_id).all()
+        file_stats = GroupFileStats.query.filter_by(table_group_id=group_id).all()
+
+        group_info = {field: getattr(group, field) for field in GroupSnapshots._GROUP_FIELDS}
+        group_info['last_import_at'] = GroupSnapshots._format_time(group.last_import_at)
+
+        snapshot = GroupSnapshot(
+            table_group_id=group_id,
+            name=name or f"快照 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            checkpoint_at=now
+        )
+        snapshot.set_metadata({
+            'group': group_info,
+            'schemas': [{field: getattr(schema, field) for field in GroupSnapshots._SCHEMA_FIELDS}
+                        for schema in schemas],
+            'file_stats': [{
+                'source_file': stats.source_file,
+                'record_count': stats.record_count,
+                'last_import_at': GroupSnapshots._format_time(stats.last_import_at)
+            } for stats in file_stats]
+        })
+        db.session.add(snapshot)
+        db.session.commit()
+        print(f"[系统] 分组 {group.group_name} 创建快照: {snapshot.name}")
+        return snapshot
+
+    @staticmethod
+    def capture_rows(*criteria):
+        """写时复制：修改或删除满足条件的行之前调用（不提交事务）
+
+        只复制所属分组有快照、在快照检查点之前创建、且尚未被该快照复制过的行。
+        """
+        if db.session.query(GroupSnapshot.id).first() is None:
+            return
+
+        rows = TableData.__table__
+        snapshots = GroupSnapshot.__table__
+        snapshot_rows = SnapshotRow.__table__
+        captured = snapshot_rows.alias()
+
+        query = select(
+            [snapshots.c.id, rows.c.id, literal(True)] + [rows.c[field] for field in GroupSnapshots._ROW_FIELDS]
+        ).select_from(
+            rows.join(snapshots, snapshots.c.table_group_id == rows.c.table_group_id)
+        ).where(and_(
+            *criteria,
+            rows.c.deleted_at.is_(None),
+            rows.c.created_at <= snapshots.c.checkpoint_at,
+            ~exists().where(and_(captured.c.snapshot_id == snapshots.c.id, captured.c.row_id == rows.c.id))
+        ))
+        db.session.execute(snapshot_rows.insert().from_select(
+            ['snapshot_id', 'row_id', 'existed'] + list(GroupSnapshots._ROW_FIELDS), query
+        ))
+
+    @staticmethod
+    def mark_rows_added(group_id, row_ids):
+        """记录在快照之后从其他分组移入的行，恢复和按快照读取时排除（不提交事务）"""
+        if not row_ids:
+            return
+        for snapshot in GroupSnapshot.query.filter_by(table_group_id=group_id).all():
+            for row_id in row_ids:
+                db.session.add(SnapshotRow(snapshot_id=snapshot.id, row_id=row_id, existed=False))
+
+    @staticmethod
+    def read_as_of(snapshot_id):
+        """按快照读取分组数据，返回 (快照, 列名列表, 行数据列表)，快照不存在时返回 None"""
+        snapshot = GroupSnapshot.query.get(snapshot_id)
+        if snapshot is None:
+            return None
+
+        group_id = snapshot.table_group_id
+        ColdStorage.ensure_online(group_id, touch=False)
+        metadata = snapshot.get_metadata()
+        # 字典编码属于存储格式而非数据内容，按列的当前设置解码
+        dictionary_ids = {schema_id for (schema_id,) in db.session.query(TableSchema.id).filter(
+            TableSchema.table_group_id == group_id,
+            TableSchema.is_dictionary == True
+        ).all()}
+        schemas = [SimpleNamespace(is_dictionary=schema['id'] in dictionary_ids, **schema)
+                   for schema in metadata.get('schemas', [])]
+        columns = [schema.column_name for schema in sorted(schemas, key=lambda s: s.column_order or 0)
+                   if schema.is_active]
+        codec = RowCodec(schemas)
+
+        # 快照之后未变更的行直接读取在线表，变更过的行读取复制的旧内容
+        captured_ids = db.session.query(SnapshotRow.row_id).filter(SnapshotRow.snapshot_id == snapshot_id)
+        unchanged = TableData.query.filter(
+            TableData.table_group_id == group_id,
+            TableData.deleted_at.is_(None),
+            TableData.created_at <= snapshot.checkpoint_at,
+            ~TableData.id.in_(captured_ids)
+        ).all()
+        preimages = SnapshotRow.query.filter_by(snapshot_id=snapshot_id, existed=True).all()
+
+        rows = [(record.sort_key or 0, record.id, record.to_dict(codec)) for record in unchanged]
+        for preimage in preimages:
+            raw = json.loads(preimage.row_data) if preimage.row_data else {}
+            if preimage.row_format == TableData.ROW_FORMAT_COLUMN_ID:
+                RowCodec.mark_codes(raw, codec.values)
+            data = codec.decode(raw)
+            data['id'] = preimage.row_id
+            data['source_file'] = preimage.source_file
+            data['created_at'] = GroupSnapshots._format_time(preimage.created_at, '%Y-%m-%d %H:%M:%S')
+            data['updated_at'] = GroupSnapshots._format_time(preimage.updated_at, '%Y-%m-%d %H:%M:%S')
+            rows.append((preimage.sort_key or 0, preimage.row_id, data))
+        rows.sort(key=lambda row: (row[0], row[1]))
+
+        return snapshot, columns, [row[2] for row in rows]
+
+    @staticmethod
+    def restore(snapshot_id):
+        """将分组恢复到快照时的状态，返回快照，快照或分组不存在时返回 None
+
+        快照之后新增的行标记删除，变更过的行写回旧内容，表结构、分组信息和来源文件统计
+        一并恢复；已删除的分组会被重新启用。晚于该快照的快照随之失效并被删除。
+        """
+        snapshot = GroupSnapshot.query.get(snapshot_id)
+        if snapshot is None:
+            return None
+        group = TableGroup.query.get(snapshot.table_group_id)
+        if group is None:
+            return None
+
+        ColdStorage.ensure_online(group.id, touch=False)
+        metadata = snapshot.get_metadata()
+        now = datetime.utcnow()
+
+        newer = GroupSnapshot.query.filter(
+            GroupSnapshot.table_group_id == group.id,
+            GroupSnapshot.checkpoint_at > snapshot.checkpoint_at
+        ).all()
+        for newer_snapshot in newer:
+            GroupSnapshots._delete(newer_snapshot)
+
+        # 快照之后新增或移入的行
+        added_ids = db.session.query(SnapshotRow.row_id).filter(
+            SnapshotRow.snapshot_id == snapshot_id,
+            SnapshotRow.existed == False
+        )
+        TableData.query.filter(
+            TableData.table_group_id == group.id,
+            TableData.deleted_at.is_(None),
+            db.or_(TableData.created_at > snapshot.checkpoint_at, TableData.id.in_(added_ids))
+        ).update({TableData.deleted_at: now}, synchronize_session=False)
+
+        # 快照之后变更或删除的行写回旧内容；原ID已被其他分组的行占用时分配新ID
+        restored_rows = 0
+        codec = RowCodec(TableSchema.query.filter_by(table_group_id=group.id).all())
+        for preimage in SnapshotRow.query.filter_by(snapshot_id=snapshot_id, existed=True).all():
+            record = TableData.query.get(preimage.row_id)
+            if record is None:
+                record = TableData(id=preimage.row_id)
+                db.session.add(record)
+            elif record.table_group_id != group.id:
+                record = TableData()
+                db.session.add(record)
+            for field in GroupSnapshots._ROW_FIELDS:
+                setattr(record, field, getattr(preimage, field))
+            record.table_group_id = group.id
+            record.deleted_at = None
+            if codec.values and record.row_data:
+                # 复制时的旧格式编码转为 [编码]，复制后才启用字典编码的列写回时转为编码
+                raw = json.loads(record.row_data)
+                if record.row_format == TableData.ROW_FORMAT_COLUMN_ID:
+                    RowCodec.mark_codes(raw, codec.values)
+                record.row_data = json.dumps(codec.encode_codes(raw), ensure_ascii=False)
+            record.row_format = TableData.ROW_FORMAT_MARKED_CODES
+            restored_rows += 1
+
+        # 表结构：快照中的列恢复原状，快照之后新增的列停用
+        existing_schemas = {schema.id: schema for schema in TableSchema.query.filter_by(table_group_id=group.id).all()}
+        snapshot_schema_ids = set()
+        for schema_data in metadata.get('schemas', []):
+            schema = existing_schemas.get(schema_data['id'])
+            if schema is None:
+                schema = TableSchema(id=schema_data['id'], table_group_id=group.id)
+                db.session.add(schema)
+            for field in GroupSnapshots._SCHEMA_FIELDS:
+                setattr(schema, field, schema_data[field])
+            snapshot_schema_ids.add(schema_data['id'])
+        for schema_id, schema in existing_schemas.items():
+            if schema_id not in snapshot_schema_ids:
+                schema.is_active = False
+
+        group_info = metadata.get('group', {})
+        for field in GroupSnapshots._GROUP_FIELDS:
+            setattr(group, field, group_info.get(field))
+        group.last_import_at = GroupSnapshots._parse_time(group_info.get('last_import_at'))
+        group.deleted_at = None
+        group.version = (group.version or 0) + 1
+        # 行内容和行ID可能改变，搜索索引由后台任务重建
+        group.search_indexed = False
+
+        GroupFileStats.query.filter_by(table_group_id=group.id).delete(synchronize_session=False)
+        for stats in metadata.get('file_stats', []):
+            db.session.add(GroupFileStats(
+                table_group_id=group.id,
+                source_file=stats['source_file'],
+                record_count=stats['record_count'],
+                last_import_at=GroupSnapshots._parse_time(stats['last_import_at'])
+            ))
+        DataStats.rebuild()
+
+        # 分组已回到快照状态，快照从当前时刻重新开始记录变更
+        SnapshotRow.query.filter_by(snapshot_id=snapshot_id).delete(synchronize_session=False)
+        snapshot.checkpoint_at = now
+        db.session.commit()
+
+        print(f"[系统] 分组 {group.group_name} 已恢复到快照 {snapshot.name}，写回 {restored_rows} 条变更记录")
+        return snapshot
+
+    @staticmethod
+    def delete(snapshot_id):
+        """删除快照及其复制的行"""
+        snapshot = GroupSnapshot.query.get(snapshot_id)
+        if snapshot is None:
+            return False
+        GroupSnapshots._delete(snapshot)
+        db.session.commit()
+        return True
+
+    @staticmethod
+    def drop_for_group(group_id):
+        """删除分组的所有快照（不提交事务）"""
+        for snapshot in GroupSnapshot.query.filter_by(table_group_id=group_id).all():
+            GroupSnapshots._delete(snapshot)
+
+    @staticmethod
+    def expire(retention_days):
+        """后台任务：删除超过保留天数的快照，返回删除的快照数"""
+        if not retention_days:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        expired = GroupSnapshot.query.filter(GroupSnapshot.created_at < cutoff).all()
+        for snapshot in expired:
+            GroupSnapshots._delete(snapshot)
+        db.session.commit()
+        if expired:
+            print(f"[系统] 删除 {len(expired)} 个超过 {retention_days} 天的快照")
+        return len(expired)
+
+    @staticmethod
+    def group_ids_query():
+        """有快照的分组ID子查询，用于后台任务跳过这些分组"""
+        return db.session.query(GroupSnapshot.table_group_id).filter(GroupSnapshot.table_group_id.isnot(None))
+
+    @staticmethod
+    def _delete(snapshot):
+        SnapshotRow.query.filter_by(snapshot_id=snapshot.id).delete(synchronize_session=False)
+        db.session.delete(snapshot)
+
+    @staticmethod
+    def _format_time(value, fmt=None):
+        if value is None:
+            return None
+        return value.strftime(fmt) if fmt else value.isoformat()
+
+    @staticmethod
+    def _parse_time(value):
+        return datetime.fromisoformat(value) if value else None
@@ -0,0 +1,166 @@
+"""
+工作台文件索引
+持久化记录工作台文件夹中 Excel 文件的路径、大小、修改时间、内容哈希和表头列名。
+列出文件时只对比文件系统的大小和修改时间，变化过的文件才重新读取；
+导入记录数和列数来自同步维护的来源文件统计，按所有文件一次聚合查询
+"""
+
+import hashlib
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from models.database import db, WorkspaceFile, TableSchema, GroupFileStats
+from models.excel_processor import UniversalExcelProcessor
+
+
+class WorkspaceIndex:
+    """工作台文件索引的增量刷新与查询"""
+
+    FOLDERS = ('test_files', 'test_files_v2', 'user_files')   # 工作台扫描的文件夹，user_files 为用户上传
+    EXTENSIONS = ('.xlsx', '.xls')
+    HASH_CHUNK_SIZE = 1024 * 1024
+    HEADER_SCAN_ROWS = 5            # 与表头检测的检查行数一致
+
+    _lock = threading.Lock()
+
+    @classmethod
+    def refresh(cls):
+        """对比文件系统刷新索引，返回 (重新索引的文件数, 移除的文件数)"""
+        with cls._lock:
+            on_disk = cls._scan()
+            indexed = {entry.path: entry for entry in WorkspaceFile.query.all()}
+
+            changed = 0
+            for path, (folder, file_name, stat) in on_disk.items():
+                entry = indexed.get(path)
+                if entry is not None and entry.mtime == stat.st_mtime and entry.file_size == stat.st_size:
+                    continue
+                if entry is None:
+                    entry = WorkspaceFile(path=path, folder=folder, file_name=file_name)
+                    db.session.add(entry)
+                try:
+                    cls._index_file(entry, stat)
+                    changed += 1
+                except OSError as e:
+                    # 扫描后被删除或无法读取的文件，下次刷新时再处理
+                    print(f"[警告] 索引文件 {path} 时出错: {str(e)}")
+                    if entry in db.session.new:
+                        db.session.expunge(entry)
+
+            removed = [entry for path, entry in indexed.items() if path not in on_disk]
+            for entry in removed:
+                db.session.delete(entry)
+
+            if changed or removed:
+                db.session.commit()
+                print(f"[系统] 工作台文件索引已刷新，重新索引 {changed} 个文件，移除 {len(removed)} 个文件")
+            return changed, len(removed)
+
+    @classmethod
+    def list_files(cls):
+        """刷新索引并返回所有文件的信息，按修改时间倒序"""
+        cls.refresh()
+        entries = WorkspaceFile.query.all()
+
+        # 来源文件的记录数和包含其记录的第一个分组
+        records = {}
+        first_group = {}
+        for source_file, group_id, count in db.session.query(
+            GroupFileStats.source_file, GroupFileStats.table_group_id, GroupFileStats.record_count
+        ).all():
+            records[source_file] = records.get(source_file, 0) + (count or 0)
+            if group_id is not None and (source_file not in first_group or group_id < first_group[source_file]):
+                first_group[source_file] = group_id
+
+        # 分组的当前列数（分组归档时无需恢复）
+        group_ids = set(first_group.values())
+        column_counts = dict(db.session.query(
+            TableSchema.table_group_id, db.func.count(TableSchema.id)
+        ).filter(
+            TableSchema.table_group_id.in_(group_ids),
+            TableSchema.is_active == True
+        ).group_by(TableSchema.table_group_id).all()) if group_ids else {}
+
+        files = []
+        for entry in entries:
+            records_count = records.get(entry.file_name, 0)
+            group_id = first_group.get(entry.file_name) if records_count > 0 else None
+            files.append({
+                'name': entry.file_name,
+                'path': entry.path,
+                'folder': entry.folder,
+                'size': entry.file_size,
+                'records': records_count,
+                'columns': column_counts.get(group_id, 0) if group_id is not None else 0,
+                'header_columns': entry.get_header(),
+                'content_hash': entry.content_hash,
+                'created_at': datetime.fromtimestamp(entry.ctime).strftime('%Y-%m-%d %H:%M:%S'),
+                'updated_at': datetime.fromtimestamp(entry.mtime).strftime('%Y-%m-%d %H:%M:%S'),
+                # 已导入：文件数据已存在于数据库中；已存在：文件物理存在但没有数据库记录
+                'has_data': records_count > 0
+            })
+        files.sort(key=lambda item: item['updated_at'], reverse=True)
+        return files
+
+    # ========== 扫描与索引 ==========
+
+    @classmethod
+    def _scan(cls):
+        """列出工作台文件夹中的 Excel 文件 {相对路径: (文件夹, 文件名, stat)}"""
+        found = {}
+        for folder in cls.FOLDERS:
+            if not os.path.isdir(folder):
+                continue
+            with os.scandir(folder) as entries:
+                for item in entries:
+                    if not item.name.lower().endswith(cls.EXTENSIONS) or not item.is_file():
+                        continue
+                    try:
+                        found[os.path.join(folder, item.name)] = (folder, item.name, item.stat())
+                    except OSError:
+                        continue
+        return found
+
+    @classmethod
+    def _index_file(cls, entry, stat):
+        """读取文件内容哈希，内容变化时重新读取表头（不提交事务）"""
+        content_hash = cls._hash_file(entry.path)
+        if content_hash != entry.content_hash:
+            entry.set_header(cls._read_header(entry.path))
+            entry.content_hash = content_hash
+        entry.file_size = stat.st_size
+        entry.mtime = stat.st_mtime
+        entry.ctime = stat.st_ctime
+        entry.indexed_at = datetime.utcnow()
+
+    @classmethod
+    def _hash_file(cls, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(cls.HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def _read_header(cls, path):
+        """只读取前几行检测表头，返回清理后的列名，无法读取时返回空列表"""
+        engines = ('openpyxl', 'xlrd') if path.lower().endswith('.xls') else ('openpyxl',)
+        df = None
+        for engine in engines:
+            try:
+                df = pd.read_excel(path, engine=engine, header=None, nrows=cls.HEADER_SCAN_ROWS)
+                break
+            except Exception:
+                continue
+        if df is None:
+            print(f"[警告] 无法读取文件表头: {path}")
+            return []
+
+        df = df.dropna(how='all').dropna(axis=1, how='all')
+        if df.empty:
+            return []
+        header_row = UniversalExcelProcessor.detect_header_row(df, cls.HEADER_SCAN_ROWS)
+        return UniversalExcelProcessor.clean_column_names(list(df.iloc[header_row]))
@@ -8,11 +8,23 @@ let currentGroupId = null;
 // 全局搜索状态变量
 let isGlobalSearchActive = false;
 let currentGlobalSearchTerm = '';
+let currentGlobalSearchHandle = null;   // 全局搜索的结果句柄，导出时由服务器按句柄读取全部结果
 let currentStats = null;
 
 // 新上传文件跟踪变量
 let newUploadedFiles = new Set();
 
+// 分页加载状态：表格数据按页从服务器获取，滚动到底部时加载下一页
+const PAGE_SIZE = 500;
+const RANGE_FETCH_SIZE = 5000;   // 加载全部数据时每次按范围读取的行数（不超过服务端 MAX_PAGE_SIZE）
+let pageState = null;
+let loadMoreObserver = null;
+
+// 虚拟滚动：只渲染可视区域及上下预留的行，分组数据中未加载的行按行号范围向服务端读取
+const ROW_OVERSCAN = 20;
+const DEFAULT_ROW_HEIGHT = 45;
+let virtualGrid = null;
+
 
 // 控制台日志函数 - 修复：处理控制台元素不存在的情况
 function addConsoleLog(message, type = 'system') {
@@ -954,18 +966,17 @@ async function loadData() {
     emptyState.style.display = 'none';
     
     try {
-        const response = await fetch('/data');
-        const result = await response.json();
+        const result = await fetchFirstPage('/data');
         
         if (result.success) {
             currentData = result.data;
-            filteredData = [...currentData];
+            filteredData = currentData.slice();
             currentSchema = result.schema || [];
             
             updateStats(result.stats);
             renderTable();
             
-            addConsoleLog(`数据加载完成，共 ${currentData.length} 条记录，${currentSchema.length} 个列`, 'system');
+            addConsoleLog(`数据加载完成，共 ${pageState.total} 条记录，${currentSchema.length} 个列`, 'system');
         } else {
             addConsoleLog(`加载数据失败: ${result.message}`, 'error');
             showEmptyState();
@@ -978,6 +989,269 @@ async function loadData() {
     }
 }
 
+// 列式响应转为行对象数组（format=columnar：列名只出现一次，重复取值较多的列以下标编码）
+function decodeColumnar(result) {
+    if (!result || result.format !== 'columnar') {
+        return (result && result.data) || [];
+    }
+    
+    const names = Object.keys(result.columns || {});
+    const arrays = names.map(name => {
+        const column = result.columns[name];
+        if (Array.isArray(column)) return column;
+        return column.codes.map(code => code === null ? null : column.values[code]);
+    });
+    
+    const rows = new Array(result.row_count);
+    for (let i = 0; i < result.row_count; i++) {
+        const row = {};
+        for (let k = 0; k < names.length; k++) {
+            const value = arrays[k][i];
+            if (value !== null && value !== undefined) {
+                row[names[k]] = value;
+            }
+        }
+        rows[i] = row;
+    }
+    return rows;
+}
+
+// 构造分页请求地址
+function buildPageUrl(baseUrl, cursor) {
+    const params = new URLSearchParams({ limit: PAGE_SIZE, format: 'columnar' });
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    return `${baseUrl}${baseUrl.includes('?') ? '&' : '?'}${params.toString()}`;
+}
+
+// 获取第一页数据并重置分页状态
+async function fetchFirstPage(baseUrl) {
+    const response = await fetch(buildPageUrl(baseUrl));
+    const result = await response.json();
+    
+    pageState = null;
+    if (result.success) {
+        result.data = decodeColumnar(result);
+        pageState = {
+            baseUrl: baseUrl,
+            nextCursor: result.next_cursor || null,
+            total: result.total != null ? result.total : (result.data || []).length,
+            loading: null,
+            rangeUrl: null,
+            rangeLoads: new Map()
+        };
+        
+        // 分组数据支持按行号范围读取：按总行数建立稀疏数组，滚动到未加载的位置时再读取该范围
+        const groupMatch = baseUrl.match(/^\/table-groups\/\d+\/data/);
+        if (groupMatch && pageState.nextCursor && result.total != null) {
+            pageState.rangeUrl = baseUrl.replace('/data', '/rows');
+            pageState.nextCursor = null;
+            const rows = new Array(pageState.total);
+            result.data.forEach((row, index) => {
+                rows[index] = row;
+            });
+            result.data = rows;
+        }
+    }
+    return result;
+}
+
+// 范围 [start, end) 内是否有尚未加载的行
+function hasMissingRows(start, end) {
+    for (let index = start; index < end; index++) {
+        if (!(index in currentData)) return true;
+    }
+    return false;
+}
+
+// 按行号范围读取分组数据，填入 currentData（以及未经本地过滤的 filteredData）的空位
+async function fetchRowRange(state, offset, limit) {
+    const params = new URLSearchParams({ offset: offset, limit: limit, format: 'columnar' });
+    const response = await fetch(`${state.rangeUrl}${state.rangeUrl.includes('?') ? '&' : '?'}${params.toString()}`);
+    const result = await response.json();
+    if (!result.success) {
+        throw new Error(result.message || '加载失败');
+    }
+    // 加载期间已切换到其他表格，丢弃结果
+    if (pageState !== state) return false;
+    
+    const rows = decodeColumnar(result);
+    const unfiltered = filteredData.length === currentData.length;
+    rows.forEach((row, i) => {
+        const index = offset + i;
+        if (index >= currentData.length || index in currentData) return;
+        currentData[index] = row;
+        if (unfiltered && !(index in filteredData)) {
+            filteredData[index] = row;
+        }
+    });
+    
+    // 服务端的行数少于预期（数据已被其他操作删除），截去末尾的空位
+    if (rows.length < limit && offset + rows.length < currentData.length) {
+        currentData.length = offset + rows.length;
+        if (unfiltered) {
+            filteredData.length = currentData.length;
+        }
+        state.total = currentData.length;
+    }
+    return true;
+}
+
+// 读取 [start, end) 范围内尚未加载的行，按 PAGE_SIZE 对齐分块，同一块不重复请求；返回是否加载了新数据
+async function loadRowRange(start, end) {
+    const state = pageState;
+    if (!state || !state.rangeUrl) return false;
+    
+    end = Math.min(end, currentData.length);
+    const loads = [];
+    for (let block = Math.floor(start / PAGE_SIZE); block * PAGE_SIZE < end; block++) {
+        const blockStart = block * PAGE_SIZE;
+        const blockEnd = Math.min(blockStart + PAGE_SIZE, currentData.length);
+        if (!hasMissingRows(blockStart, blockEnd)) continue;
+        if (!state.rangeLoads.has(block)) {
+            state.rangeLoads.set(block, fetchRowRange(state, blockStart, PAGE_SIZE).finally(() => {
+                state.rangeLoads.delete(block);
+            }));
+        }
+        loads.push(state.rangeLoads.get(block));
+    }
+    if (!loads.length) return false;
+    
+    const results = await Promise.all(loads);
+    return results.some(Boolean) && pageState === state;
+}
+
+// 获取全局搜索结果的下一页
+function fetchGlobalSearchPage(searchTerm, cursor) {
+    return fetch('/api/global-search', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ search_term: searchTerm, limit: PAGE_SIZE, cursor: cursor })
+    });
+}
+
+// 将全局搜索新一页的列并入当前表头（来源信息列保持在末尾），返回表头是否变化
+function mergeGlobalSearchSchema(schema) {
+    const sourceColumns = ['_source_table', '_source_file'];
+    const columns = currentSchema.filter(col => !sourceColumns.includes(col));
+    const added = (schema || []).filter(col => !sourceColumns.includes(col) && !columns.includes(col));
+    if (!added.length) return false;
+    
+    currentSchema = columns.concat(added).sort().concat(sourceColumns);
+    currentData.forEach(row => {
+        if (!row) return;
+        added.forEach(col => {
+            if (!(col in row)) row[col] = '';
+        });
+    });
+    return true;
+}
+
+// 获取下一页并追加到 currentData，返回是否加载了新数据
+async function loadNextPage() {
+    if (!pageState || !pageState.nextCursor) return false;
+    if (pageState.loading) return pageState.loading;
+    
+    const state = pageState;
+    state.loading = (async () => {
+        try {
+            const response = state.searchTerm
+                ? await fetchGlobalSearchPage(state.searchTerm, state.nextCursor)
+                : await fetch(buildPageUrl(state.baseUrl, state.nextCursor));
+            const result = await response.json();
+            if (!result.success) {
+                throw new Error(result.message || '加载失败');
+            }
+            // 加载期间已切换到其他表格，丢弃结果
+            if (pageState !== state) return false;
+            
+            currentData.push(...decodeColumnar(result));
+            if (state.searchTerm && mergeGlobalSearchSchema(result.schema)) {
+                state.schemaChanged = true;
+            }
+            state.nextCursor = result.next_cursor || null;
+            if (result.total != null) {
+                state.total = result.total;
+            }
+            return true;
+        } finally {
+            state.loading = null;
+        }
+    })();
+    return state.loading;
+}
+
+// 加载剩余的全部页（本地搜索、排序需要完整数据），返回是否加载了新数据
+async function loadAllPages() {
+    let loaded = false;
+    const state = pageState;
+    if (state && state.rangeUrl) {
+        for (let offset = 0; offset < currentData.length && pageState === state; offset += RANGE_FETCH_SIZE) {
+            if (hasMissingRows(offset, Math.min(offset + RANGE_FETCH_SIZE, currentData.length))) {
+                loaded = (await fetchRowRange(state, offset, RANGE_FETCH_SIZE)) || loaded;
+            }
+        }
+    }
+    while (pageState && pageState.nextCursor) {
+        if (!(await loadNextPage())) break;
+        loaded = true;
+    }
+    if (loaded) {
+        addConsoleLog(`已加载全部 ${currentData.length} 条记录`, 'system');
+    }
+    return loaded;
+}
+
+// 加载下一页并刷新表格
+async function loadMoreRows() {
+    try {
+        if (await loadNextPage()) {
+            filteredData = currentData.slice();
+            if (pageState && pageState.schemaChanged) {
+                // 全局搜索新一页带来了新的列，重建表头
+                pageState.schemaChanged = false;
+                renderTable();
+                highlightSourceColumns();
+            } else {
+                renderVisibleRows(true);
+            }
+        }
+    } catch (error) {
+        addConsoleLog(`加载更多数据时发生错误: ${error.message}`, 'error');
+    }
+}
+
+// 可视区域内有未加载的行时按范围读取，读取完成后重绘
+async function loadVisibleRows(start, end) {
+    try {
+        if (await loadRowRange(start, end)) {
+            renderVisibleRows(true);
+        }
+    } catch (error) {
+        addConsoleLog(`加载数据时发生错误: ${error.message}`, 'error');
+    }
+}
+
+// 滚动到“加载更多”行时自动加载下一页
+function observeLoadMoreRow(row) {
+    if (loadMoreObserver) {
+        loadMoreObserver.disconnect();
+        loadMoreObserver = null;
+    }
+    if (!row || !('IntersectionObserver' in window)) return;
+    
+    loadMoreObserver = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMoreObserver.disconnect();
+            loadMoreRows();
+        }
+    }, { rootMargin: '200px' });
+    loadMoreObserver.observe(row);
+}
+
 // 显示空状态
 function showEmptyState() {
     const dataTable = document.getElementById('dataTable');
@@ -1145,43 +1419,80 @@ function renderTable() {
     tableHeader.innerHTML = '';
     tableHeader.appendChild(headerRow);
     
-    // 构建表体
+    // 构建表体：只渲染可视区域附近的行
     tableBody.innerHTML = '';
+    virtualGrid = {
+        rowHeight: virtualGrid ? virtualGrid.rowHeight : DEFAULT_ROW_HEIGHT,
+        start: -1,
+        end: -1,
+        frame: null,
+        highlightTerm: null
+    };
+    renderVisibleRows(true);
+    bindVirtualScroll();
     
-    filteredData.forEach((row, rowIndex) => {
-        const tr = document.createElement('tr');
-        
-        // 第一列添加行插入器
-        let firstTd = true;
-        currentSchema.forEach((col, colIndex) => {
-            const td = document.createElement('td');
-            td.className = 'editable';
-            td.setAttribute('data-field', col);
-            td.setAttribute('data-id', row.id);
-            td.textContent = row[col] || '';
-            
-            // 在第一列添加行插入器和行调整器
-            if (firstTd) {
-                td.innerHTML += `
-                    <div class="row-resizer" data-row="${rowIndex}"></div>
-                    <div class="row-inserter" onclick="insertRowAfter(${rowIndex})" title="在此行后插入新行"></div>
-                `;
-                firstTd = false;
-            }
-            
-            tr.appendChild(td);
-        });
-        
-        // 操作列
-        const actionTd = document.createElement('td');
-        actionTd.style.width = actionColumnWidth + 'px';
-        actionTd.innerHTML = `
-            <button class="btn btn-danger" onclick="deleteRecord(${row.id})">删除</button>
-        `;
-        tr.appendChild(actionTd);
-        
-        tableBody.appendChild(tr);
-    });
+    // 添加列宽调整功能
+    addColumnResizeFunctionality();
+    
+    // 确保表头固定功能正常工作
+    ensureHeaderSticky();
+    
+    // 添加表格独立滚动功能
+    addTableScrollControl();
+}
+
+// 渲染可视区域及上下预留的行，其余行以占位高度代替；force 为 true 时可视范围未变化也重绘
+function renderVisibleRows(force = false) {
+    const tableBody = document.getElementById('dataBody');
+    const tableWrapper = document.querySelector('.table-wrapper');
+    if (!virtualGrid || !tableBody) return;
+    // 正在编辑的单元格不被重绘打断，编辑结束后的下一次滚动再重绘
+    if (tableBody.querySelector('input.editing')) return;
+    
+    const rowHeight = virtualGrid.rowHeight;
+    const total = filteredData.length;
+    const scrollTop = tableWrapper ? tableWrapper.scrollTop : 0;
+    const viewportRows = Math.ceil((tableWrapper && tableWrapper.clientHeight ? tableWrapper.clientHeight : 600) / rowHeight);
+    const firstVisible = Math.floor(scrollTop / rowHeight);
+    const start = Math.min(total, Math.max(0, firstVisible - ROW_OVERSCAN));
+    const end = Math.min(total, firstVisible + viewportRows + ROW_OVERSCAN);
+    if (!force && start === virtualGrid.start && end === virtualGrid.end) return;
+    virtualGrid.start = start;
+    virtualGrid.end = end;
+    
+    const fragment = document.createDocumentFragment();
+    fragment.appendChild(createSpacerRow(start * rowHeight));
+    let missing = false;
+    for (let rowIndex = start; rowIndex < end; rowIndex++) {
+        const row = filteredData[rowIndex];
+        if (row) {
+            fragment.appendChild(createDataRow(row, rowIndex));
+        } else {
+            fragment.appendChild(createPlaceholderRow(rowHeight));
+            missing = true;
+        }
+    }
+    fragment.appendChild(createSpacerRow((total - end) * rowHeight));
+    
+    // 还有未加载的数据时，在表格末尾显示“加载更多”行
+    let loadMoreRow = null;
+    if (end === total && pageState && pageState.nextCursor) {
+        loadMoreRow = document.createElement('tr');
+        loadMoreRow.className = 'load-more-row';
+        const loadMoreTd = document.createElement('td');
+        loadMoreTd.colSpan = currentSchema.length + 1;
+        loadMoreTd.style.textAlign = 'center';
+        loadMoreTd.style.cursor = 'pointer';
+        loadMoreTd.style.color = '#667eea';
+        loadMoreTd.textContent = `已加载 ${currentData.length} / ${pageState.total} 条记录，点击或继续滚动加载更多`;
+        loadMoreTd.onclick = loadMoreRows;
+        loadMoreRow.appendChild(loadMoreTd);
+        fragment.appendChild(loadMoreRow);
+    }
+    
+    tableBody.innerHTML = '';
+    tableBody.appendChild(fragment);
+    observeLoadMoreRow(loadMoreRow);
     
     // 添加编辑功能
     addEditFunctionality();
@@ -1189,14 +1500,113 @@ function renderTable() {
     // 添加行高调整功能
     addRowResizeFunctionality();
     
-    // 添加列宽调整功能
-    addColumnResizeFunctionality();
+    // 重绘后恢复搜索高亮和来源列样式
+    if (virtualGrid.highlightTerm) {
+        highlightSearchResults(virtualGrid.highlightTerm);
+    }
+    highlightSourceColumns();
     
-    // 确保表头固定功能正常工作
-    ensureHeaderSticky();
+    // 按实际渲染的行高校正占位高度
+    const sampleRow = tableBody.querySelector('tr.data-row');
+    if (sampleRow && sampleRow.offsetHeight && Math.abs(sampleRow.offsetHeight - rowHeight) > 1) {
+        virtualGrid.rowHeight = sampleRow.offsetHeight;
+        scheduleVisibleRows(true);
+    }
     
-    // 添加表格独立滚动功能
-    addTableScrollControl();
+    if (missing) {
+        loadVisibleRows(start, end);
+    }
+}
+
+// 下一帧重绘可视区域（滚动事件合并为每帧一次）
+function scheduleVisibleRows(force = false) {
+    const grid = virtualGrid;
+    if (!grid) return;
+    grid.force = grid.force || force;
+    if (grid.frame) return;
+    grid.frame = requestAnimationFrame(() => {
+        grid.frame = null;
+        const forceRender = grid.force;
+        grid.force = false;
+        if (grid === virtualGrid) {
+            renderVisibleRows(forceRender);
+        }
+    });
+}
+
+// 表格滚动和窗口大小变化时重绘可视区域（只绑定一次）
+function bindVirtualScroll() {
+    const tableWrapper = document.querySelector('.table-wrapper');
+    if (!tableWrapper || tableWrapper.dataset.virtualScroll) return;
+    tableWrapper.dataset.virtualScroll = 'true';
+    
+    tableWrapper.addEventListener('scroll', () => scheduleVisibleRows(), { passive: true });
+    window.addEventListener('resize', () => scheduleVisibleRows());
+}
+
+// 构建数据行
+function createDataRow(row, rowIndex) {
+    const tr = document.createElement('tr');
+    tr.className = 'data-row';
+    
+    // 第一列添加行插入器
+    let firstTd = true;
+    currentSchema.forEach(col => {
+        const td = document.createElement('td');
+        td.className = 'editable';
+        td.setAttribute('data-field', col);
+        td.setAttribute('data-id', row.id);
+        td.textContent = row[col] || '';
+        
+        // 在第一列添加行插入器和行调整器
+        if (firstTd) {
+            td.innerHTML += `
+                <div class="row-resizer" data-row="${rowIndex}"></div>
+                <div class="row-inserter" onclick="insertRowAfter(${rowIndex})" title="在此行后插入新行"></div>
+            `;
+            firstTd = false;
+        }
+        
+        tr.appendChild(td);
+    });
+    
+    // 操作列
+    const actionTd = document.createElement('td');
+    actionTd.style.width = '100px';
+    actionTd.innerHTML = `
+        <button class="btn btn-danger" onclick="deleteRecord(${row.id})">删除</button>
+    `;
+    tr.appendChild(actionTd);
+    return tr;
+}
+
+// 尚未加载的行显示为占位行
+function createPlaceholderRow(height) {
+    const tr = document.createElement('tr');
+    tr.className = 'placeholder-row';
+    const td = document.createElement('td');
+    td.colSpan = currentSchema.length + 1;
+    td.style.height = height + 'px';
+    td.style.color = '#999';
+    td.textContent = '加载中...';
+    tr.appendChild(td);
+    return tr;
+}
+
+// 代替可视区域外的行的占位行
+function createSpacerRow(height) {
+    const tr = document.createElement('tr');
+    tr.className = 'spacer-row';
+    const td = document.createElement('td');
+    td.colSpan = currentSchema.length + 1;
+    td.style.height = height + 'px';
+    td.style.padding = '0';
+    td.style.border = 'none';
+    if (!height) {
+        tr.style.display = 'none';
+    }
+    tr.appendChild(td);
+    return tr;
 }
 
 // 添加编辑功能
@@ -1254,11 +1664,11 @@ function addEditFunctionality() {
                             addConsoleLog(`字段 ${field} 更新成功`, 'system');
                             
                             // 更新本地数据
-                            const record = currentData.find(r => r.id == id);
+                            const record = currentData.find(r => r && r.id == id);
                             if (record) {
                                 record[field] = newValue;
                             }
-                            const filteredRecord = filteredData.find(r => r.id == id);
+                            const filteredRecord = filteredData.find(r => r && r.id == id);
                             if (filteredRecord) {
                                 filteredRecord[field] = newValue;
                             }
@@ -1291,55 +1701,58 @@ function addEditFunctionality() {
     });
 }
 
+// 行高调整状态；文档级的拖动监听只绑定一次，可视区域重绘时不重复绑定
+let rowResizeState = null;
+
 // 添加行高调整功能
 function addRowResizeFunctionality() {
     const rowResizers = document.querySelectorAll('.row-resizer');
     
     rowResizers.forEach(resizer => {
-        let isResizing = false;
-        let startY = 0;
-        let startHeight = 0;
-        let targetRow = null;
-        
         resizer.addEventListener('mousedown', function(e) {
             e.preventDefault();
-            isResizing = true;
-            startY = e.clientY;
             
             // 找到目标行
-            targetRow = this.closest('tr');
+            const targetRow = this.closest('tr');
             if (targetRow) {
-                startHeight = targetRow.offsetHeight;
+                rowResizeState = {
+                    startY: e.clientY,
+                    startHeight: targetRow.offsetHeight,
+                    targetRow: targetRow
+                };
                 document.body.style.cursor = 'row-resize';
                 document.body.style.userSelect = 'none';
             }
         });
+    });
+    
+    if (document.body.dataset.rowResizeBound) return;
+    document.body.dataset.rowResizeBound = 'true';
+    
+    document.addEventListener('mousemove', function(e) {
+        if (!rowResizeState) return;
         
-        document.addEventListener('mousemove', function(e) {
-            if (!isResizing || !targetRow) return;
-            
-            e.preventDefault();
-            const deltaY = e.clientY - startY;
-            const newHeight = Math.max(36, startHeight + deltaY); // 最小高度36px
-            
-            // 设置行高
-            targetRow.style.height = newHeight + 'px';
-            targetRow.querySelectorAll('td').forEach(td => {
-                td.style.height = newHeight + 'px';
-            });
-        });
-        
-        document.addEventListener('mouseup', function() {
-            if (isResizing) {
-                isResizing = false;
-                targetRow = null;
-                document.body.style.cursor = '';
-                document.body.style.userSelect = '';
-                
-                addConsoleLog('行高调整完成', 'system');
-            }
+        e.preventDefault();
+        const deltaY = e.clientY - rowResizeState.startY;
+        const newHeight = Math.max(36, rowResizeState.startHeight + deltaY); // 最小高度36px
+        
+        // 设置行高
+        const targetRow = rowResizeState.targetRow;
+        targetRow.style.height = newHeight + 'px';
+        targetRow.querySelectorAll('td').forEach(td => {
+            td.style.height = newHeight + 'px';
         });
     });
+    
+    document.addEventListener('mouseup', function() {
+        if (rowResizeState) {
+            rowResizeState = null;
+            document.body.style.cursor = '';
+            document.body.style.userSelect = '';
+            
+            addConsoleLog('行高调整完成', 'system');
+        }
+    });
 }
 
 // 添加列宽调整功能
@@ -1461,12 +1874,12 @@ function updateSearchPlaceholder() {
 }
 
 // 搜索数据
-function searchData() {
+async function searchData() {
     const searchTerm = document.getElementById('searchInput').value.toLowerCase().trim();
     const searchMode = document.getElementById('searchMode').value;
     
     if (!searchTerm) {
-        filteredData = [...currentData];
+        filteredData = currentData.slice();
         addConsoleLog('已清除搜索条件', 'system');
         renderTable();
     } else {
@@ -1474,7 +1887,12 @@ function searchData() {
             // 全局搜索 - 搜索所有表格组
             performGlobalSearch(searchTerm);
         } else {
-            // 当前表格搜索
+            // 当前表格搜索（先加载剩余分页，搜索范围为完整表格）
+            try {
+                await loadAllPages();
+            } catch (error) {
+                addConsoleLog(`加载数据时发生错误: ${error.message}`, 'error');
+            }
             filteredData = currentData.filter(row => {
                 return searchInRow(row, searchTerm);
             });
@@ -1500,13 +1918,13 @@ async function performGlobalSearch(searchTerm) {
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ search_term: searchTerm })
+            body: JSON.stringify({ search_term: searchTerm, limit: PAGE_SIZE })
         });
         
         const result = await response.json();
         
         if (result.success) {
-            // 直接显示搜索结果表格
+            // 直接显示搜索结果表格（第一页，其余结果滚动到末尾时继续加载）
             displayGlobalSearchResults(result);
         } else {
             addConsoleLog('全局搜索失败: ' + result.message, 'error');
@@ -1555,9 +1973,11 @@ function searchInRowGlobal(row, searchTerm, schema) {
 
 // 显示全局搜索结果 - 新版本，直接渲染表格
 function displayGlobalSearchResults(searchResult) {
-    const { data, schema, search_term, total_matches, matched_groups, stats } = searchResult;
+    const { data, schema, search_term, matched_groups, stats } = searchResult;
+    // 分页结果的总数按索引估算，无法估算时显示已加载的条数
+    const total_matches = searchResult.total_matches != null ? searchResult.total_matches : `${data.length}+`;
     
-    if (total_matches === 0) {
+    if (!data || data.length === 0) {
         addConsoleLog(`全局搜索 "${search_term}" 未找到匹配结果`, 'system');
         showNotification('搜索结果', '未找到匹配的数据', 'info');
         hideLoadingState();
@@ -1567,10 +1987,20 @@ function displayGlobalSearchResults(searchResult) {
     // 记录当前搜索状态为全局搜索
     isGlobalSearchActive = true;
     currentGlobalSearchTerm = search_term;
+    currentGlobalSearchHandle = searchResult.result_handle || null;
     
     addConsoleLog(`全局搜索 "${search_term}" 在 ${matched_groups} 个表格中找到 ${total_matches} 条记录`, 'success');
     
     // 设置当前数据为搜索结果
+    pageState = {
+        baseUrl: '/api/global-search',
+        searchTerm: search_term,
+        nextCursor: searchResult.next_cursor || null,
+        total: searchResult.total_matches != null ? searchResult.total_matches : data.length,
+        loading: null,
+        rangeUrl: null,
+        rangeLoads: new Map()
+    };
     currentData = data;
     filteredData = [...data];
     currentSchema = schema;
@@ -1623,6 +2053,7 @@ function updateTableSelector(displayText) {
 function resetGlobalSearchState() {
     isGlobalSearchActive = false;
     currentGlobalSearchTerm = '';
+    currentGlobalSearchHandle = null;
     // 重置导出按钮
     resetExportButton();
     // 移除全局搜索标识
@@ -1895,6 +2326,11 @@ function highlightSearchResults(searchTerm) {
         return;
     }
     
+    // 可视区域重绘时重新高亮
+    if (virtualGrid) {
+        virtualGrid.highlightTerm = searchTerm;
+    }
+    
     // 高亮表头
     highlightTableHeaders(searchTerm);
     
@@ -1949,6 +2385,10 @@ function escapeRegExp(string) {
 
 // 清除搜索高亮
 function clearHighlights() {
+    if (virtualGrid) {
+        virtualGrid.highlightTerm = null;
+    }
+    
     // 清除表格内容高亮
     const tableBody = document.getElementById('dataBody');
     if (tableBody) {
@@ -1981,7 +2421,7 @@ function clearHighlights() {
 // 清除搜索
 function clearSearch() {
     document.getElementById('searchInput').value = '';
-    filteredData = [...currentData];
+    filteredData = currentData.slice();
     clearHighlights(); // 清除高亮
     renderTable();
     addConsoleLog('已清除搜索条件', 'system');
@@ -2006,7 +2446,7 @@ function resetSearch() {
         addConsoleLog('已退出全局搜索模式并重置搜索条件', 'system');
     } else {
         // 普通的重置搜索
-        filteredData = [...currentData];
+        filteredData = currentData.slice();
         clearHighlights(); // 清除高亮
         renderTable();
         addConsoleLog('已重置搜索条件', 'system');
@@ -2116,14 +2556,15 @@ async function exportGlobalSearchResults() {
             headers: {
                 'Content-Type': 'application/json'
             },
+            // 页面上可能只加载了部分结果，由服务器按结果句柄读取全部结果并导出
             body: JSON.stringify({
                 search_term: currentGlobalSearchTerm,
-                data: currentData,
-                schema: currentSchema
+                result_handle: currentGlobalSearchHandle
             })
         });
         
-        if (response.ok) {
+        if (response.ok && !(response.headers.get('Content-Type') || '').includes('application/json')) {
+            const recordCount = response.headers.get('X-Record-Count') || currentData.length;
             const blob = await response.blob();
             const url = window.URL.createObjectURL(blob);
             const a = document.createElement('a');
@@ -2132,15 +2573,15 @@ async function exportGlobalSearchResults() {
             // 构造文件名
             const safeSearchTerm = currentGlobalSearchTerm.replace(/[^a-zA-Z0-9\u4e00-\u9fa5]/g, '_');
             const timestamp = new Date().toISOString().slice(0, 19).replace(/[:T]/g, '_');
-            a.download = `全局搜索结果_${safeSearchTerm}_${currentData.length}条_${timestamp}.xlsx`;
+            a.download = `全局搜索结果_${safeSearchTerm}_${recordCount}条_${timestamp}.xlsx`;
             
             document.body.appendChild(a);
             a.click();
             document.body.removeChild(a);
             window.URL.revokeObjectURL(url);
             
-            addConsoleLog(`全局搜索结果导出成功，共 ${currentData.length} 条记录`, 'success');
-            showNotification('导出成功', `全局搜索结果已成功导出，共 ${currentData.length} 条记录`, 'success');
+            addConsoleLog(`全局搜索结果导出成功，共 ${recordCount} 条记录`, 'success');
+            showNotification('导出成功', `全局搜索结果已成功导出，共 ${recordCount} 条记录`, 'success');
         } else {
             const errorData = await response.json().catch(() => ({}));
             const errorMessage = errorData.message || '导出失败';
@@ -2210,13 +2651,17 @@ async function deleteRecord(id) {
         const result = await response.json();
         
         if (result.success) {
-            // 从本地数据中移除
-            currentData = currentData.filter(r => r.id !== id);
-            filteredData = filteredData.filter(r => r.id !== id);
+            // 从本地数据中移除（splice 保留分组数据中未加载行的位置）
+            removeRowById(currentData, id);
+            removeRowById(filteredData, id);
+            
+            if (pageState) {
+                pageState.total = Math.max(0, pageState.total - 1);
+            }
             
             renderTable();
             updateStats({
-                total_records: currentData.length,
+                total_records: pageState ? pageState.total : currentData.length,
                 source_files: new Set(currentData.map(r => r.source_file).filter(f => f)).size,
                 total_columns: currentSchema.length,
                 last_update: new Date().toLocaleString()
@@ -2235,6 +2680,14 @@ async function deleteRecord(id) {
 
 
 
+// 从行数组中移除指定ID的行
+function removeRowById(rows, id) {
+    const index = rows.findIndex(r => r && r.id === id);
+    if (index > -1) {
+        rows.splice(index, 1);
+    }
+}
+
 // 显示重命名列模态框
 function showRenameColumnModal(columnName) {
     const modal = document.getElementById('renameColumnModal');
@@ -2287,7 +2740,8 @@ async function insertRowAfter(rowIndex) {
             },
             body: JSON.stringify({
                 insert_after_id: insertAfterId,  // 传递实际的行ID而不是索引
-                insert_position: rowIndex + 1    // 传递期望的显示位置
+                insert_position: rowIndex + 1,   // 传递期望的显示位置
+                table_group_id: currentGroupId
             })
         });
         
@@ -2341,7 +2795,8 @@ async function addNewColumnWithPosition(columnName, position) {
             },
             body: JSON.stringify({
                 column_name: columnName,
-                insert_position: position  // 传递位置参数
+                insert_position: position,  // 传递位置参数
+                table_group_id: currentGroupId
             })
         });
         
@@ -2405,7 +2860,8 @@ async function renameColumnConfirm() {
             },
             body: JSON.stringify({
                 old_name: oldName,
-                new_name: newName
+                new_name: newName,
+                table_group_id: currentGroupId
             })
         });
         
@@ -2462,7 +2918,8 @@ async function deleteColumnConfirm(columnName) {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({
-                column_name: columnName
+                column_name: columnName,
+                table_group_id: currentGroupId
             })
         });
         
@@ -2704,18 +3161,17 @@ async function loadGroupData(groupId) {
     emptyState.style.display = 'none';
     
     try {
-        const response = await fetch(`/table-groups/${groupId}/data`);
-        const result = await response.json();
+        const result = await fetchFirstPage(`/table-groups/${groupId}/data`);
         
         if (result.success) {
             currentData = result.data;
-            filteredData = [...currentData];
+            filteredData = currentData.slice();
             currentSchema = result.schema || [];
             
             updateStats(result.stats);
             renderTable();
             
-            addConsoleLog(`表格加载完成，共 ${currentData.length} 条记录，${currentSchema.length} 个列`, 'system');
+            addConsoleLog(`表格加载完成，共 ${pageState.total} 条记录，${currentSchema.length} 个列`, 'system');
         } else {
             addConsoleLog(`加载表格数据失败: ${result.message}`, 'error');
             showEmptyState();
@@ -2745,6 +3201,7 @@ async function clearAllData() {
         
         if (result.success) {
             // 重置所有状态
+            pageState = null;
             currentData = [];
             filteredData = [];
             currentSchema = [];
@@ -2925,12 +3382,11 @@ async function loadFileData(fileName) {
     addConsoleLog(`正在加载文件数据: ${fileName}`, 'system');
     
     try {
-        const response = await fetch(`/api/workspace/files/${encodeURIComponent(fileName)}/data`);
-        const result = await response.json();
+        const result = await fetchFirstPage(`/api/workspace/files/${encodeURIComponent(fileName)}/data`);
         
         if (result.success) {
             currentData = result.data || [];
-            filteredData = [...currentData];
+            filteredData = currentData.slice();
             currentSchema = result.schema || [];
             
             // 查找该文件对应的表格分组（通过API直接查询）
@@ -2968,7 +3424,7 @@ async function loadFileData(fileName) {
             document.getElementById('loadingState').style.display = 'none';
             showToolbarButtons();
             
-            addConsoleLog(`文件 ${fileName} 加载完成，共 ${currentData.length} 条记录`, 'system');
+            addConsoleLog(`文件 ${fileName} 加载完成，共 ${pageState.total} 条记录`, 'system');
         } else {
             addConsoleLog(`加载文件数据失败: ${result.message}`, 'error');
             showEmptyState();
@@ -2997,9 +3453,36 @@ function refreshData() {
 }
 
 // 列排序功能
-function sortColumn(columnName, direction) {
+async function sortColumn(columnName, direction) {
     addConsoleLog(`对列"${columnName}"进行${direction === 'asc' ? '升序' : '降序'}排序`, 'system');
     
+    // 浏览分组数据且未在本地搜索时，由服务器排序并重新分页加载
+    const searchTerm = document.getElementById('searchInput').value.trim();
+    if (pageState && pageState.baseUrl.startsWith('/table-groups/') && !isGlobalSearchActive && !searchTerm) {
+        try {
+            const baseUrl = pageState.baseUrl.split('?')[0];
+            const result = await fetchFirstPage(`${baseUrl}?sort=${encodeURIComponent(`${columnName}:${direction}`)}`);
+            if (result.success) {
+                currentData = result.data;
+                filteredData = currentData.slice();
+                renderTable();
+                return;
+            }
+            addConsoleLog(`排序失败: ${result.message}`, 'error');
+        } catch (error) {
+            addConsoleLog(`排序时发生错误: ${error.message}`, 'error');
+        }
+    }
+    
+    // 排序需要完整数据，先加载剩余分页
+    try {
+        if (await loadAllPages()) {
+            filteredData = currentData.slice();
+        }
+    } catch (error) {
+        addConsoleLog(`加载数据时发生错误: ${error.message}`, 'error');
+    }
+    
     filteredData.sort((a, b) => {
         let valueA = a[columnName];
         let valueB = b[columnName];
@@ -3490,20 +3973,19 @@ async function viewFile(filename) {
         addConsoleLog(`正在加载文件 ${filename} 的数据...`, 'system');
         showNotification('正在加载文件数据...', 'info');
         
-        const response = await fetch(`/uploaded-files/${encodeURIComponent(filename)}/data`);
-        const data = await response.json();
+        const data = await fetchFirstPage(`/uploaded-files/${encodeURIComponent(filename)}/data`);
         
         if (data.success) {
             // 更新全局数据
             currentData = data.data || [];
-            filteredData = [...currentData];
+            filteredData = currentData.slice();
             currentSchema = data.schema || [];
             
             // 渲染表格
             renderTable();
             
             // 更新左侧表格标题显示当前查看的文件名
-            updateTableSelectorForSingleFile(filename, currentData.length);
+            updateTableSelectorForSingleFile(filename, pageState.total);
             
             // 滚动到表格区域
             const tableContainer = document.querySelector('.table-container');
@@ -3511,8 +3993,8 @@ async function viewFile(filename) {
                 tableContainer.scrollIntoView({ behavior: 'smooth', block: 'start' });
             }
             
-            addConsoleLog(`文件 ${filename} 加载成功，共 ${currentData.length} 条记录`, 'system');
-            showNotification(`文件加载成功，共 ${currentData.length} 条记录`, 'success');
+            addConsoleLog(`文件 ${filename} 加载成功，共 ${pageState.total} 条记录`, 'system');
+            showNotification(`文件加载成功，共 ${pageState.total} 条记录`, 'success');
         } else {
             throw new Error(data.message || '加载失败');
         }
@@ -3602,6 +4084,7 @@ async function deleteFile(filename) {
             // 如果当前正在查看被删除的文件，需要清空表格显示
             const currentFilename = getCurrentDisplayedFilename();
             if (currentFilename === filename) {
+                pageState = null;
                 currentData = [];
                 filteredData = [];
                 currentSchema = [];